@@ -0,0 +1,93 @@
+"""
+Peak memory of data URL encoding while many uploads are in flight.
+
+Compares the old encoding (read, b64encode, decode, f-string) with
+local_image_to_data_url. Each variant runs in its own process so the peak RSS
+reported by the OS is not shared between them.
+
+Usage: python -m benchmarks.upload_memory [--images 16] [--size-mb 4.5]
+"""
+import argparse
+import base64
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+
+def legacy_data_url(image_path):
+    with open(image_path, "rb") as image_file:
+        base64_encoded_data = base64.b64encode(image_file.read()).decode('utf-8')
+    return f"data:image/jpeg;base64,{base64_encoded_data}"
+
+
+def run_variant(variant, image_paths):
+    """Encode every image at once from its own thread and keep the results alive."""
+    if variant == "legacy":
+        encode = legacy_data_url
+    else:
+        from src.utils.utils import local_image_to_data_url as encode
+
+    results = [None] * len(image_paths)
+    barrier = threading.Barrier(len(image_paths))
+
+    def worker(i, image_path):
+        barrier.wait() # Start all uploads together
+        results[i] = encode(image_path)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i, p)) for i, p in enumerate(image_paths)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 1024
+    print(
+        f"{variant:<10} images={len(image_paths)} time={elapsed:.2f}s "
+        f"traced_peak={traced_peak / 2**20:.1f}MB peak_rss={max_rss / 2**20:.1f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=16, help="Concurrent uploads")
+    parser.add_argument("--size-mb", type=float, default=4.5, help="Size of each image")
+    parser.add_argument("--variant", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--folder", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        image_paths = sorted(
+            os.path.join(args.folder, name) for name in os.listdir(args.folder)
+        )
+        run_variant(args.variant, image_paths)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Random bytes do not compress, like real JPEG data; they stay under the
+        # resize limit so only the encoding path is measured
+        size = int(args.size_mb * 2**20)
+        for i in range(args.images):
+            with open(os.path.join(folder, f"{i:04d}.jpg"), "wb") as f:
+                f.write(os.urandom(size))
+        for variant in ("legacy", "streaming"):
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.upload_memory", "--variant", variant, "--folder", folder],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
+import multiprocessing
+import sys
 import tkinter as tk
 
-from ui import Captioner
-
 
 def main():
+    if len(sys.argv) > 1:
+        from src.cli import run_cli
+        sys.exit(run_cli(sys.argv[1:]))
+
+    from ui import Captioner # Imported here so headless commands skip the model imports
     root = tk.Tk()
     Captioner(root)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Process pools in the packaged app
     main()
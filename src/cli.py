@@ -0,0 +1,102 @@
+import argparse
+
+from src.services.caption_cleanup import DEFAULT_CLEANUP, clean_caption_files
+from src.services.caption_export import export_captions, import_captions
+from src.services.shard_writer import DEFAULT_SAMPLES_PER_SHARD, write_shards
+from src.utils.utils import load_images_from_folder
+
+
+def _print_progress(done, total):
+    if total:
+        print(f"\r{done}/{total}", end="", flush=True)
+    else:
+        print(f"\r{done}", end="", flush=True)
+
+
+def run_export(args):
+    image_paths = list(load_images_from_folder(args.folder).values())
+    count = export_captions(image_paths, args.folder, args.output, progress=_print_progress)
+    print(f"\nExported {count} caption(s) to {args.output}")
+
+
+def run_import(args):
+    imported = import_captions(
+        args.dataset,
+        args.folder,
+        overwrite=not args.keep_existing,
+        progress=_print_progress,
+    )
+    print(f"\nImported {len(imported)} caption(s) from {args.dataset}")
+
+
+def run_shards(args):
+    image_paths = list(load_images_from_folder(args.folder).values())
+    shards = write_shards(
+        image_paths,
+        args.folder,
+        args.output_dir,
+        samples_per_shard=args.samples_per_shard,
+        max_shard_bytes=args.max_shard_mb * 1024 * 1024,
+        max_side=args.max_side,
+        quality=args.quality,
+        progress=_print_progress,
+    )
+    print(f"\nWrote {len(shards)} shard(s) to {args.output_dir}")
+
+
+def run_clean(args):
+    image_paths = list(load_images_from_folder(args.folder).values())
+    settings = dict(
+        DEFAULT_CLEANUP,
+        prefixes=args.prefix or DEFAULT_CLEANUP["prefixes"],
+        max_sentences=args.max_sentences,
+        max_words=args.max_words,
+        dedupe=not args.keep_repeats,
+    )
+    changed = clean_caption_files(image_paths, settings, progress=_print_progress)
+    print(f"\nCleaned {changed} of {len(image_paths)} caption(s)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="yofardev-captioner", description="Headless dataset tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export the captions of a folder to one file.")
+    export_parser.add_argument("folder", help="Image folder")
+    export_parser.add_argument("output", help="Output file (.jsonl, .csv or .parquet)")
+    export_parser.set_defaults(func=run_export)
+
+    import_parser = commands.add_parser("import", help="Import captions from an exported file.")
+    import_parser.add_argument("dataset", help="Dataset file (.jsonl, .csv or .parquet)")
+    import_parser.add_argument("folder", help="Image folder the file names are relative to")
+    import_parser.add_argument("--keep-existing", action="store_true", help="Do not overwrite non-empty captions")
+    import_parser.set_defaults(func=run_import)
+
+    shards_parser = commands.add_parser("shards", help="Pack captioned images into WebDataset tar shards.")
+    shards_parser.add_argument("folder", help="Image folder")
+    shards_parser.add_argument("output_dir", help="Folder receiving the shards and index.jsonl")
+    shards_parser.add_argument("--samples-per-shard", type=int, default=DEFAULT_SAMPLES_PER_SHARD)
+    shards_parser.add_argument("--max-shard-mb", type=int, default=1024)
+    shards_parser.add_argument("--max-side", type=int, default=None, help="Downscale larger images to this side")
+    shards_parser.add_argument("--quality", type=int, default=90, help="JPEG quality of re-encoded images")
+    shards_parser.set_defaults(func=run_shards)
+
+    clean_parser = commands.add_parser("clean", help="Apply the caption cleanup rules to every caption of a folder.")
+    clean_parser.add_argument("folder", help="Image folder")
+    clean_parser.add_argument("--prefix", action="append", help="Prefix to remove, repeatable (default: built-in list)")
+    clean_parser.add_argument("--max-sentences", type=int, default=0, help="Keep at most this many sentences")
+    clean_parser.add_argument("--max-words", type=int, default=0, help="Keep at most this many words")
+    clean_parser.add_argument("--keep-repeats", action="store_true", help="Keep repeated sentences and phrases")
+    clean_parser.set_defaults(func=run_clean)
+    return parser
+
+
+def run_cli(argv):
+    """Run a headless command, returns the exit code."""
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
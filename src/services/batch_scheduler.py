@@ -0,0 +1,44 @@
+import heapq
+import itertools
+import threading
+
+
+class BatchScheduler:
+    """Order in which a batch run captions its images.
+
+    Images come out in list order unless they are promoted: the most recent
+    promotion goes first, so the image the user is looking at (and its
+    neighbours) is captioned next. Promotions only reorder the queue, they
+    never add work. Entries are (boost, rank, sequence) heap items; a promoted
+    image is pushed again and its older entry is skipped when popped.
+    """
+
+    def __init__(self, image_paths):
+        self._heap = [(0, rank, rank, path) for rank, path in enumerate(image_paths)]
+        heapq.heapify(self._heap)
+        self._pending = set(image_paths)
+        self._sequence = itertools.count(len(self._heap))
+        self._boost = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def promote(self, image_paths):
+        """Move the given images, in this order, ahead of everything queued."""
+        with self._lock:
+            self._boost -= 1
+            for rank, path in enumerate(path for path in image_paths if path in self._pending):
+                heapq.heappush(self._heap, (self._boost, rank, next(self._sequence), path))
+
+    def pop(self, count=1):
+        """Take up to count images to caption next, an empty list once the queue is empty."""
+        taken = []
+        with self._lock:
+            while self._heap and len(taken) < count:
+                path = heapq.heappop(self._heap)[3]
+                if path in self._pending: # Stale entries of promoted images are skipped
+                    self._pending.discard(path)
+                    taken.append(path)
+        return taken
@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import CancelledError, Future, wait
+
+# How often a waiting call checks its stop events
+CANCEL_POLL_INTERVAL = 0.05
+
+# Calls given up on by run_cancellable that are still running
+_abandoned = set()
+_abandoned_lock = threading.Lock()
+
+
+def is_cancelled(*events):
+    return any(event is not None and event.is_set() for event in events)
+
+
+def wait_cancelled(timeout, *events):
+    """Wait up to timeout seconds, returning True as soon as any of the events is set."""
+    events = [event for event in events if event is not None]
+    if len(events) == 1:
+        return events[0].wait(timeout)
+    if not events:
+        time.sleep(timeout)
+        return False
+    deadline = time.monotonic() + timeout
+    while not is_cancelled(*events):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(CANCEL_POLL_INTERVAL, remaining))
+    return True
+
+
+def run_cancellable(func, *events):
+    """
+    Runs a blocking call (HTTP request, local inference...) in a worker thread
+    and waits for it, raising CancelledError within CANCEL_POLL_INTERVAL once
+    any of the events is set. A blocking request cannot be interrupted, so the
+    abandoned call finishes in the background (bounded by the request timeout)
+    and its result is dropped; abandoned_calls() counts those still running.
+    Streamed calls also check the events and close their connection at the next chunk.
+    """
+    events = [event for event in events if event is not None]
+    if not events:
+        return func()
+    if is_cancelled(*events):
+        raise CancelledError("Cancelled before the call started")
+
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _abandoned_lock:
+                _abandoned.discard(future)
+
+    threading.Thread(target=run, daemon=True).start()
+    # Waits with wait(), not result(timeout=...): a TimeoutError raised by the call
+    # itself (a read timeout) is the same class as the one result() raises on timeout
+    while not wait([future], timeout=CANCEL_POLL_INTERVAL).done:
+        if is_cancelled(*events):
+            with _abandoned_lock:
+                if not future.done():
+                    _abandoned.add(future)
+            raise CancelledError("Call cancelled")
+    return future.result()
+
+
+def abandoned_calls():
+    """Number of cancelled calls still running in the background (they still use quota or the GPU)."""
+    with _abandoned_lock:
+        return len(_abandoned)
@@ -0,0 +1,189 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+from src.utils.utils import ends_with_abbreviation, extract_sentences, get_caption_path
+
+# Openings that describe the picture instead of its content
+DEFAULT_PREFIXES = (
+    "The image shows",
+    "This image shows",
+    "The image depicts",
+    "This image depicts",
+    "The image features",
+    "This image features",
+    "The picture shows",
+    "This picture shows",
+    "In this image,",
+    "In the image,",
+    "This is an image of",
+    "This is a picture of",
+    "An image of",
+    "A picture of",
+)
+
+DEFAULT_CLEANUP = {
+    "enabled": False, # Clean captions as they are generated
+    "prefixes": list(DEFAULT_PREFIXES),
+    "max_sentences": 0, # 0 keeps every sentence
+    "max_words": 0, # 0 keeps every word
+    "dedupe": True,
+    "normalize": True,
+}
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+SPACE_BEFORE_PUNCTUATION_PATTERN = re.compile(r"\s+([.,;:!?])")
+# Sentences and comma-separated phrases, each with its trailing punctuation
+PHRASE_PATTERN = re.compile(r"[^.!?,;]+[.!?,;]*|[.!?,;]+")
+WORD_PATTERN = re.compile(r"\w+")
+
+# Folders with fewer captions are cleaned in this process, a pool costs more to start
+POOL_MIN_FILES = 2000
+POOL_CHUNK_SIZE = 1000
+CLEANUP_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+class CaptionCleaner:
+    """Post-processing rules applied to a caption, compiled once.
+
+    Rules run in order: whitespace normalization, prefix removal, removal of
+    repeated sentences and phrases, then truncation to max_sentences and
+    max_words. A cleaner is built from settings with compile_cleaner and
+    reused for every caption.
+    """
+
+    def __init__(self, prefixes=(), max_sentences=0, max_words=0, dedupe=True, normalize=True):
+        self.max_sentences = max_sentences
+        self.max_words = max_words
+        self.dedupe = dedupe
+        self.normalize = normalize
+        self.prefix_pattern = None
+        prefixes = [prefix.strip() for prefix in prefixes if prefix.strip()]
+        if prefixes:
+            # Longest first, so "This image shows" wins over "This image"
+            alternatives = "|".join(re.escape(prefix) for prefix in sorted(prefixes, key=len, reverse=True))
+            # Only whole words: "A picture often" is not "A picture of" + "ten"
+            self.prefix_pattern = re.compile(r"^\s*(?:" + alternatives + r")(?!\w)[\s,:;-]*", re.IGNORECASE)
+
+    def _dedupe(self, text):
+        seen = set()
+        kept = []
+        for phrase in PHRASE_PATTERN.findall(text):
+            key = " ".join(WORD_PATTERN.findall(phrase.lower()))
+            # "Dr." ends a phrase of its own here, but repeating it is not repeating a phrase
+            if key and key in seen and not ends_with_abbreviation(phrase.strip().rstrip(".")):
+                continue
+            seen.add(key)
+            kept.append(phrase)
+        deduped = "".join(kept).strip().rstrip(",;").rstrip()
+        if text[-1:] in ".!?" and deduped[-1:] not in ".!?":
+            deduped += text[-1] # A dropped last sentence took the final punctuation with it
+        return deduped
+
+    def _truncate_words(self, text):
+        matches = list(WORD_PATTERN.finditer(text))
+        if len(matches) <= self.max_words:
+            return text
+        return text[:matches[self.max_words - 1].end()]
+
+    def clean(self, caption):
+        """Return the cleaned caption."""
+        text = caption.strip()
+        if self.normalize:
+            text = WHITESPACE_PATTERN.sub(" ", text)
+        if self.prefix_pattern is not None:
+            stripped = self.prefix_pattern.sub("", text, count=1)
+            if stripped != text and stripped:
+                text = stripped[0].upper() + stripped[1:]
+        if self.dedupe and text:
+            text = self._dedupe(text)
+        if self.max_sentences:
+            text = extract_sentences(text, self.max_sentences) or text
+        if self.max_words:
+            text = self._truncate_words(text)
+        if self.normalize:
+            text = SPACE_BEFORE_PUNCTUATION_PATTERN.sub(r"\1", text)
+        return text.strip()
+
+
+def _settings_key(settings):
+    """Hashable form of cleanup settings, as accepted by compile_cleaner."""
+    return (
+        tuple(settings.get("prefixes", ())),
+        int(settings.get("max_sentences", 0)),
+        int(settings.get("max_words", 0)),
+        bool(settings.get("dedupe", True)),
+        bool(settings.get("normalize", True)),
+    )
+
+
+@lru_cache(maxsize=8)
+def _compile(key):
+    return CaptionCleaner(*key)
+
+
+def compile_cleaner(settings):
+    """Return the cleaner of a settings dict (see DEFAULT_CLEANUP), shared between calls."""
+    return _compile(_settings_key(settings))
+
+
+def get_inline_cleaner(settings):
+    """Return the cleaner to apply to new captions, None when inline cleaning is off."""
+    if not settings or not settings.get("enabled"):
+        return None
+    return compile_cleaner(settings)
+
+
+def _clean_files(caption_paths, key):
+    """Clean caption files in place, returns how many changed. Runs in worker processes."""
+    cleaner = _compile(key)
+    changed = 0
+    for caption_path in caption_paths:
+        try:
+            with open(caption_path, "r") as f:
+                caption = f.read()
+        except FileNotFoundError:
+            continue
+        cleaned = cleaner.clean(caption)
+        if cleaned != caption.strip():
+            with open(caption_path, "w") as f:
+                f.write(cleaned)
+            changed += 1
+    return changed
+
+
+def clean_caption_files(image_paths, settings, progress=None, stop_event=None):
+    """
+    Applies the cleanup settings to the caption files of the given images.
+    Large folders are cleaned in a process pool, POOL_CHUNK_SIZE files per task.
+    Returns the number of captions changed, or None if stopped.
+    """
+    key = _settings_key(settings)
+    caption_paths = [get_caption_path(image_path) for image_path in image_paths]
+    total = len(caption_paths)
+    chunks = [caption_paths[start:start + POOL_CHUNK_SIZE] for start in range(0, total, POOL_CHUNK_SIZE)]
+    changed = 0
+    done = 0
+    if total < POOL_MIN_FILES:
+        for chunk in chunks:
+            if stop_event is not None and stop_event.is_set():
+                return None
+            changed += _clean_files(chunk, key)
+            done += len(chunk)
+            if progress:
+                progress(done, total)
+        return changed
+
+    with ProcessPoolExecutor(max_workers=CLEANUP_WORKERS) as executor:
+        futures = {executor.submit(_clean_files, chunk, key): len(chunk) for chunk in chunks}
+        for future in as_completed(futures):
+            changed += future.result()
+            done += futures[future]
+            if progress:
+                progress(done, total)
+            if stop_event is not None and stop_event.is_set():
+                for pending in futures:
+                    pending.cancel()
+                return None
+    return changed
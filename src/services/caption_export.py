@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.image_metadata import get_metadata_batch
+from src.utils.utils import get_caption_path, load_file_as_string
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FORMATS = {".jsonl": "jsonl", ".csv": "csv", ".parquet": "parquet"}
+
+# Columns of an exported dataset, "file_name" is the image path relative to the folder
+EXPORT_COLUMNS = ["file_name", "caption", "width", "height", "format"]
+
+# Records read and written per step
+EXPORT_BATCH_SIZE = 1000
+
+IO_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+# Batches waiting for the writer thread, bounds the memory used when the disk is slow
+WRITE_QUEUE_SIZE = 4
+
+
+def get_export_format(path):
+    """Return the dataset format matching the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported dataset format '{extension}', use .jsonl, .csv or .parquet.")
+    if EXPORT_FORMATS[extension] == "parquet" and pyarrow is None:
+        raise ValueError("Parquet needs the pyarrow package, install it or use .jsonl or .csv.")
+    return EXPORT_FORMATS[extension]
+
+
+class _BatchWriter:
+    """Runs a write function on batches in one background thread."""
+
+    def __init__(self, write_batch):
+        self.write_batch = write_batch
+        self.batches = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            if self.error is None:
+                try:
+                    self.write_batch(batch)
+                except Exception as e:
+                    self.error = e # Keep draining so put() never blocks forever
+
+    def put(self, batch):
+        if self.error is not None:
+            raise self.error
+        self.batches.put(batch)
+
+    def close(self):
+        """Wait for the queued batches to be written, raising the first write error."""
+        self.batches.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _open_dataset_writer(output_path, dataset_format):
+    """Return (write_batch, close) functions writing records to the output file."""
+    if dataset_format == "parquet":
+        schema = pyarrow.schema([
+            ("file_name", pyarrow.string()),
+            ("caption", pyarrow.string()),
+            ("width", pyarrow.int32()),
+            ("height", pyarrow.int32()),
+            ("format", pyarrow.string()),
+        ])
+        writer = parquet.ParquetWriter(output_path, schema)
+        def write_parquet(records):
+            writer.write_table(pyarrow.Table.from_pylist(records, schema=schema))
+        return write_parquet, writer.close
+
+    f = open(output_path, "w", encoding="utf-8", newline="")
+    if dataset_format == "csv":
+        csv_writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+        csv_writer.writeheader()
+        return csv_writer.writerows, f.close
+
+    def write_jsonl(records):
+        f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+    return write_jsonl, f.close
+
+
+def write_dataset(records, output_path):
+    """Write records (see EXPORT_COLUMNS) to a dataset file, through a temporary file."""
+    temp_path = output_path + ".tmp"
+    write_batch, close_output = _open_dataset_writer(temp_path, get_export_format(output_path))
+    try:
+        for start in range(0, len(records), EXPORT_BATCH_SIZE):
+            write_batch(records[start:start + EXPORT_BATCH_SIZE])
+    except BaseException:
+        close_output()
+        os.remove(temp_path)
+        raise
+    close_output()
+    os.replace(temp_path, output_path)
+
+
+def read_caption_file(image_path):
+    return load_file_as_string(get_caption_path(image_path))
+
+
+def export_captions(image_paths, folder_path, output_path, progress=None, stop_event=None, read_caption=read_caption_file):
+    """
+    Writes the caption and metadata of every image to one JSONL, CSV or Parquet file.
+    Captions are read in batches by a thread pool while a single thread writes the
+    output, through a temporary file so an interrupted export leaves nothing behind.
+    read_caption(image_path) gives the captions, the .txt files by default.
+    Returns the number of exported images, or None if the stop event was set.
+    """
+    dataset_format = get_export_format(output_path)
+    metadata = get_metadata_batch(image_paths, stop_event=stop_event)
+    if metadata is None:
+        return None
+
+    temp_path = output_path + ".tmp"
+    write_batch, close_output = _open_dataset_writer(temp_path, dataset_format)
+    writer = _BatchWriter(write_batch)
+    stopped = False
+    try:
+        try:
+            with ThreadPoolExecutor(max_workers=IO_WORKERS) as executor:
+                for start in range(0, len(image_paths), EXPORT_BATCH_SIZE):
+                    if stop_event is not None and stop_event.is_set():
+                        stopped = True
+                        break
+                    batch = image_paths[start:start + EXPORT_BATCH_SIZE]
+                    captions = executor.map(read_caption, batch)
+                    records = []
+                    for image_path, caption in zip(batch, captions):
+                        image_format, width, height = metadata.get(image_path, (None, None, None))
+                        records.append({
+                            "file_name": os.path.relpath(image_path, folder_path).replace(os.sep, "/"),
+                            "caption": caption,
+                            "width": width,
+                            "height": height,
+                            "format": image_format,
+                        })
+                    writer.put(records)
+                    if progress is not None:
+                        progress(start + len(batch), len(image_paths))
+        finally:
+            writer.close()
+    except BaseException:
+        close_output()
+        os.remove(temp_path)
+        raise
+    close_output()
+    if stopped:
+        os.remove(temp_path)
+        return None
+    os.replace(temp_path, output_path)
+    return len(image_paths)
+
+
+def read_dataset_batches(input_path):
+    """Yields lists of records read from a JSONL, CSV or Parquet dataset."""
+    dataset_format = get_export_format(input_path)
+    if dataset_format == "parquet":
+        for record_batch in parquet.ParquetFile(input_path).iter_batches(
+            batch_size=EXPORT_BATCH_SIZE, columns=["file_name", "caption"]
+        ):
+            yield record_batch.to_pylist()
+        return
+
+    with open(input_path, "r", encoding="utf-8", newline="") as f:
+        if dataset_format == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == EXPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def resolve_file_name(folder_path, file_name):
+    """Image path of a dataset "file_name", None if it points outside the folder."""
+    if os.path.isabs(file_name) or os.path.splitdrive(file_name)[0]:
+        return None
+    image_path = os.path.join(folder_path, *file_name.split("/"))
+    real_folder = os.path.realpath(folder_path)
+    if os.path.commonpath([real_folder, os.path.realpath(image_path)]) != real_folder:
+        return None
+    return image_path
+
+
+def write_caption_file(image_path, caption):
+    with open(get_caption_path(image_path), "w") as f:
+        f.write(caption)
+
+
+def import_captions(
+    input_path, folder_path, overwrite=True, progress=None, stop_event=None,
+    read_caption=read_caption_file, save_caption=write_caption_file,
+):
+    """
+    Reads captions back from a JSONL, CSV or Parquet dataset into the .txt files,
+    or whatever save_caption(image_path, caption) stores them in (see DatasetCaptionStore).
+    Records are matched to images by their "file_name" relative to the folder;
+    records without a caption, without an existing image, or pointing outside the
+    folder are skipped. Captions are written by a single writer thread.
+    Returns {image_path: caption} of the imported captions, or None if the stop
+    event was set (captions already written are kept).
+    """
+    imported = {}
+
+    def write_captions(items):
+        for image_path, caption in items:
+            save_caption(image_path, caption)
+
+    writer = _BatchWriter(write_captions)
+    stopped = False
+    try:
+        for batch in read_dataset_batches(input_path):
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
+                break
+            items = []
+            for record in batch:
+                file_name = record.get("file_name")
+                if not file_name:
+                    continue
+                image_path = resolve_file_name(folder_path, file_name)
+                if image_path is None:
+                    print(f"Skipping {file_name}: outside of the folder")
+                    continue
+                if not os.path.isfile(image_path):
+                    continue
+                caption = (record.get("caption") or "").strip()
+                if not caption:
+                    continue
+                if not overwrite and read_caption(image_path):
+                    continue
+                imported[image_path] = caption
+                items.append((image_path, caption))
+            if items:
+                writer.put(items)
+            if progress is not None:
+                progress(len(imported), None)
+    finally:
+        writer.close()
+    return None if stopped else imported
@@ -0,0 +1,54 @@
+import json
+import re
+
+# Models whose backend accepts several images in one message
+PACKABLE_MODELS = {"GPT-4.1", "Gemini 2.5 Flash", "Gemini 2.5 Pro"}
+
+PACK_SIZES = [1, 2, 4, 8]
+
+JSON_BLOCK_PATTERN = re.compile(r"\{.*\}|\[.*\]", re.DOTALL)
+
+
+def build_packed_prompt(prompts):
+    """
+    Builds one prompt for len(prompts) images sent together, asking for a JSON
+    object with one caption per image, in order.
+    """
+    count = len(prompts)
+    lines = [f"You are given {count} images, numbered 1 to {count} in the order they are attached."]
+    if len(set(prompts)) == 1:
+        lines += ["Apply these instructions to each image separately:", prompts[0]]
+    else:
+        lines.append("Apply the instructions of each image to that image only:")
+        lines += [f"Image {i}: {prompt}" for i, prompt in enumerate(prompts, 1)]
+    lines.append(
+        f'Reply with JSON only, in the form {{"captions": ["caption of image 1", ...]}}, '
+        f"with exactly {count} captions in image order. Never mention the other images."
+    )
+    return "\n".join(lines)
+
+
+def parse_packed_response(text, count):
+    """
+    Returns the list of count captions found in a packed reply.
+    Raises ValueError when the reply cannot be matched to the images.
+    """
+    match = JSON_BLOCK_PATTERN.search(text or "") # Replies may wrap the JSON in a code fence
+    if not match:
+        raise ValueError("No JSON found in the reply")
+    data = json.loads(match.group(0))
+    if isinstance(data, dict):
+        if isinstance(data.get("captions"), list):
+            data = data["captions"]
+        elif all(str(i) in data for i in range(1, count + 1)):
+            data = [data[str(i)] for i in range(1, count + 1)]
+    if not isinstance(data, list) or len(data) != count:
+        raise ValueError(f"Expected {count} captions in the reply")
+    captions = []
+    for caption in data:
+        if isinstance(caption, dict): # e.g. [{"image": 1, "caption": "..."}]
+            caption = caption.get("caption")
+        if not isinstance(caption, str):
+            raise ValueError("Captions must be strings")
+        captions.append(caption.strip())
+    return captions
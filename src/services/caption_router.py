@@ -0,0 +1,184 @@
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.services.latency import latency_tracker
+
+# How often a hedged call checks whether its primary request was sent
+SENT_POLL_INTERVAL = 0.05
+
+# Captions shorter than this are considered failed and sent to the next model
+MIN_CAPTION_LENGTH = 20
+
+REFUSAL_PATTERN = re.compile(
+    r"^\s*(i'?m sorry|i am sorry|sorry,|i can(?:no|')t|i am unable|i'?m unable|unable to|as an ai)",
+    re.IGNORECASE,
+)
+
+
+def is_acceptable_caption(caption, min_length=MIN_CAPTION_LENGTH):
+    """Return False for empty, too short or refusal-looking captions."""
+    if not caption or len(caption.strip()) < min_length:
+        return False
+    return REFUSAL_PATTERN.match(caption) is None
+
+
+class CaptionRoute:
+    """Ordered list of models to try for each image.
+
+    The first model is the cheap one; the next ones are only called when its
+    caption is not acceptable. With race enabled, the first two models are called
+    at once, each as soon as the rate limiter lets it through, and the first
+    acceptable answer wins. With hedge enabled, a request slower than the model's
+    observed p90 latency gets a duplicate sent to hedge_model (the same model by
+    default) if a rate-limit slot is free, and the slower of the two is cancelled.
+    """
+
+    def __init__(
+        self,
+        models,
+        race=False,
+        hedge=False,
+        hedge_model=None,
+        min_length=MIN_CAPTION_LENGTH,
+        tracker=latency_tracker,
+    ):
+        # Drop duplicates while keeping the order
+        self.models = list(dict.fromkeys(models))
+        self.race = race and len(self.models) > 1
+        self.hedge = hedge
+        self.hedge_model = hedge_model
+        self.min_length = min_length
+        self.tracker = tracker
+
+    def __repr__(self):
+        separator = " | " if self.race else " -> "
+        return f"CaptionRoute({separator.join(self.models)})"
+
+    def run(self, describe, slot_available=None):
+        """Caption one image, returning (caption, model).
+
+        describe(model, rate_limited, cancel_event, sent_event) must return the caption
+        of the model or raise, and should give up once cancel_event is set. It sets
+        sent_event, when given, once the request leaves the rate limiter.
+        slot_available(model), when given, tells whether a request to the model
+        would leave the rate limiter without waiting; hedges are only sent then.
+        When no model gives an acceptable caption, the last caption received is
+        returned; when every model failed, the last error is raised.
+        """
+        last_caption, last_model, last_error = None, None, None
+        models = self.models
+        if self.race:
+            caption, model, error = self._race(describe, models[0], models[1])
+            if model is not None and is_acceptable_caption(caption, self.min_length):
+                return caption, model
+            if model is not None:
+                last_caption, last_model = caption, model
+            last_error = error
+            models = models[2:]
+
+        for model in models:
+            try:
+                caption, model = self._call(describe, model, slot_available)
+            except Exception as e:
+                print(f"{model} failed, trying next model: {e}")
+                last_error = e
+                continue
+            if is_acceptable_caption(caption, self.min_length):
+                return caption, model
+            print(f"{model} returned an unusable caption, trying next model.")
+            last_caption, last_model = caption, model
+
+        if last_model is not None:
+            return last_caption, last_model
+        raise last_error
+
+    def _call(self, describe, model, slot_available=None):
+        """Call one model, hedging it when it runs past its p90 latency.
+
+        Returns (caption, model) where model is the one that answered first.
+        """
+        threshold = self.tracker.hedge_threshold(model) if self.hedge else None
+        if threshold is None:
+            return describe(model, True, None), model
+
+        hedge_model = self.hedge_model or model
+        executor = ThreadPoolExecutor(max_workers=2)
+        cancel_events = {}
+        try:
+            primary_cancel = threading.Event()
+            primary_sent = threading.Event()
+            primary = executor.submit(describe, model, True, primary_cancel, primary_sent)
+            cancel_events[primary] = (model, primary_cancel)
+            # The threshold is a post-queue latency: time the request from when it is sent,
+            # not while it waits for its rate-limit slot
+            while not primary_sent.wait(SENT_POLL_INTERVAL) and not primary.done():
+                pass
+            done, _ = wait([primary], timeout=threshold)
+            if done:
+                return primary.result(), model
+
+            # A hedge that would wait for the rate limiter comes too late, and must not cause a 429
+            if slot_available is not None and not slot_available(hedge_model):
+                print(f"{model} is slower than its p90 ({threshold:.1f}s), no rate-limit slot to hedge.")
+                return primary.result(), model
+            print(f"{model} is slower than its p90 ({threshold:.1f}s), hedging with {hedge_model}.")
+            hedge_cancel = threading.Event()
+            hedge = executor.submit(describe, hedge_model, True, hedge_cancel)
+            cancel_events[hedge] = (hedge_model, hedge_cancel)
+            return self._first_answer(cancel_events, accept=lambda caption: True)[:2]
+        finally:
+            for _, cancel_event in cancel_events.values():
+                cancel_event.set()
+            # Do not wait for the loser, its answer is simply ignored
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _first_answer(self, cancel_events, accept):
+        """Wait for the given futures and return the first accepted (caption, model, error).
+
+        When no answer is accepted, the last rejected caption is returned along
+        with the last error; if every future failed, the last error is raised.
+        """
+        fallback, last_error = (None, None), None
+        pending = set(cancel_events)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                model = cancel_events[future][0]
+                try:
+                    caption = future.result()
+                except Exception as e:
+                    print(f"{model} failed: {e}")
+                    last_error = e
+                    continue
+                if accept(caption):
+                    return caption, model, None
+                fallback = (caption, model)
+        if fallback[1] is None:
+            raise last_error
+        return fallback[0], fallback[1], last_error
+
+    def _race(self, describe, first_model, second_model):
+        """Call two models at once and keep the first acceptable answer.
+
+        Returns (caption, model, error); the loser is cancelled.
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        cancel_events = {}
+        try:
+            for model in (first_model, second_model):
+                # Both go through the shared rate limiter, the second one is sent in the next slot
+                cancel_event = threading.Event()
+                future = executor.submit(describe, model, True, cancel_event)
+                cancel_events[future] = (model, cancel_event)
+            try:
+                return self._first_answer(
+                    cancel_events,
+                    accept=lambda caption: is_acceptable_caption(caption, self.min_length),
+                )
+            except Exception as e:
+                return None, None, e
+        finally:
+            for _, cancel_event in cancel_events.values():
+                cancel_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
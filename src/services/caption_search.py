@@ -0,0 +1,241 @@
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+
+from src.services.dataset_stats import tokenize
+from src.utils.utils import get_caption_path
+
+DEFAULT_TOP_K = 50
+
+# Words added to a query by expand_query, and their weight relative to the query words
+RELATED_TERMS = 5
+RELATED_TERM_WEIGHT = 0.5
+
+# Captions read per step of an update, between stop and progress checks
+UPDATE_BATCH_SIZE = 1000
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _caption_signature(image_path):
+    try:
+        stat = os.stat(get_caption_path(image_path))
+        return (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+
+
+class CaptionIndex:
+    """TF-IDF index of the captions of a folder, for similarity search.
+
+    Each caption is a vector of (1 + log tf) * idf weights over its words. The
+    inverted index keeps, per word, the rows of the captions holding it, as
+    NumPy arrays rebuilt only for words whose captions changed. Updates re-read
+    only the caption files whose size or modification time changed. idf and the
+    caption norms are recomputed at query time when the index changed, in one
+    vectorised pass.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.rows = {} # image path -> row
+        self.paths = [] # row -> image path, None for removed captions
+        self.free_rows = []
+        self.signatures = {} # image path -> caption (size, mtime)
+        self.vocabulary = {} # word -> term id
+        self.terms = [] # term id -> word
+        self.postings = [] # term id -> {row: tf weight}
+        self.doc_terms = {} # row -> (term ids, tf weights)
+        self._posting_arrays = {} # term id -> (rows, tf weights), dropped when the postings change
+        self._idf = None
+        self._norms = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _term_id(self, word):
+        term_id = self.vocabulary.get(word)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.vocabulary[word] = term_id
+            self.terms.append(word)
+            self.postings.append({})
+        return term_id
+
+    def _remove(self, image_path):
+        row = self.rows.pop(image_path, None)
+        self.signatures.pop(image_path, None)
+        if row is None:
+            return
+        term_ids, _ = self.doc_terms.pop(row)
+        for term_id in term_ids.tolist():
+            del self.postings[term_id][row]
+            self._posting_arrays.pop(term_id, None)
+        self.paths[row] = None
+        self.free_rows.append(row)
+
+    def set_caption(self, image_path, caption, signature=None):
+        """Index (or re-index) one caption."""
+        with self._lock:
+            self._remove(image_path)
+            self._idf = self._norms = None
+            counts = Counter(tokenize(caption))
+            if not counts:
+                self.signatures[image_path] = signature
+                return
+            row = self.free_rows.pop() if self.free_rows else len(self.paths)
+            if row == len(self.paths):
+                self.paths.append(image_path)
+            else:
+                self.paths[row] = image_path
+            self.rows[image_path] = row
+            self.signatures[image_path] = signature
+            term_ids = np.array([self._term_id(word) for word in counts], dtype=np.int64)
+            weights = 1.0 + np.log(np.array(list(counts.values()), dtype=np.float64))
+            for term_id, weight in zip(term_ids.tolist(), weights.tolist()):
+                self.postings[term_id][row] = weight
+                self._posting_arrays.pop(term_id, None)
+            self.doc_terms[row] = (term_ids, weights)
+
+    def update(self, image_paths, progress=None, stop_event=None):
+        """
+        Bring the index up to date with the captions of the given images.
+        Returns the number of captions (re)indexed, or None if stopped.
+        """
+        with self._lock:
+            wanted = set(image_paths)
+            for image_path in [path for path in self.signatures if path not in wanted]:
+                self._remove(image_path)
+                self._idf = self._norms = None
+            changed = []
+            for image_path in image_paths:
+                signature = _caption_signature(image_path)
+                if image_path not in self.signatures or self.signatures[image_path] != signature:
+                    changed.append((image_path, signature))
+
+        for start in range(0, len(changed), UPDATE_BATCH_SIZE):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            for image_path, signature in changed[start:start + UPDATE_BATCH_SIZE]:
+                try:
+                    with open(get_caption_path(image_path), "r", encoding="utf-8") as f:
+                        caption = f.read()
+                except (OSError, UnicodeDecodeError):
+                    caption = ""
+                self.set_caption(image_path, caption, signature)
+            if progress is not None:
+                progress(min(start + UPDATE_BATCH_SIZE, len(changed)), len(changed))
+        return len(changed)
+
+    def _posting_array(self, term_id):
+        arrays = self._posting_arrays.get(term_id)
+        if arrays is None:
+            postings = self.postings[term_id]
+            arrays = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+            self._posting_arrays[term_id] = arrays
+        return arrays
+
+    def _refresh_weights(self):
+        """Recompute idf and the caption norms if the index changed since the last query."""
+        if self._norms is not None:
+            return
+        document_frequencies = np.fromiter((len(p) for p in self.postings), dtype=np.float64, count=len(self.postings))
+        self._idf = np.log((1 + len(self.rows)) / (1 + document_frequencies)) + 1.0
+        norms = np.zeros(len(self.paths))
+        if self.doc_terms:
+            rows = np.fromiter(self.doc_terms.keys(), dtype=np.int64, count=len(self.doc_terms))
+            term_ids = np.concatenate([terms for terms, _ in self.doc_terms.values()])
+            weights = np.concatenate([weights for _, weights in self.doc_terms.values()])
+            lengths = [len(terms) for terms, _ in self.doc_terms.values()]
+            squares = (weights * self._idf[term_ids]) ** 2
+            norms[rows] = np.sqrt(np.add.reduceat(squares, np.cumsum([0] + lengths[:-1])))
+        self._norms = norms
+
+    def _query_vector(self, words):
+        counts = Counter(word for word in words if word in self.vocabulary)
+        term_ids = np.array([self.vocabulary[word] for word in counts], dtype=np.int64)
+        weights = 1.0 + np.log(np.array(list(counts.values()), dtype=np.float64))
+        return term_ids, weights
+
+    def _search_vector(self, term_ids, weights, top_k, exclude=None):
+        self._refresh_weights()
+        if not len(term_ids):
+            return []
+        query_weights = weights * self._idf[term_ids]
+        query_norm = np.sqrt(np.sum(query_weights ** 2))
+        scores = np.zeros(len(self.paths))
+        for term_id, query_weight in zip(term_ids.tolist(), query_weights.tolist()):
+            rows, tf_weights = self._posting_array(term_id)
+            scores[rows] += query_weight * tf_weights * self._idf[term_id]
+        if exclude is not None and exclude in self.rows:
+            scores[self.rows[exclude]] = 0.0
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        scores = scores[candidates] / (self._norms[candidates] * query_norm)
+        if len(candidates) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.paths[candidates[i]], float(scores[i])) for i in best]
+
+    def expand_query(self, words, count=RELATED_TERMS):
+        """
+        Words that appear most with the given ones in the captions, weighted by idf:
+        a cheap stand-in for "concepts near" the query.
+        """
+        self._refresh_weights()
+        query_ids = {self.vocabulary[word] for word in words if word in self.vocabulary}
+        rows = set()
+        for term_id in query_ids:
+            rows.update(self.postings[term_id])
+        if not rows:
+            return []
+        counts = np.bincount(
+            np.concatenate([self.doc_terms[row][0] for row in rows]), minlength=len(self.terms)
+        )
+        weights = counts * self._idf
+        weights[list(query_ids)] = 0.0
+        weights[counts < 2] = 0.0 # Words found in a single caption are noise, not related concepts
+        best = np.argsort(-weights)[:count]
+        return [self.terms[term_id] for term_id in best.tolist() if weights[term_id] > 0]
+
+    def search(self, text, top_k=DEFAULT_TOP_K, related=False):
+        """
+        Return [(image_path, score)] of the captions closest to a text, best first.
+        With related, words that often appear with the query words are added at a lower weight.
+        """
+        with self._lock:
+            words = tokenize(text)
+            term_ids, weights = self._query_vector(words)
+            if related and len(term_ids):
+                extra = self._query_vector(self.expand_query(words))
+                term_ids = np.concatenate([term_ids, extra[0]])
+                weights = np.concatenate([weights, extra[1] * RELATED_TERM_WEIGHT])
+            return self._search_vector(term_ids, weights, top_k)
+
+    def similar_to(self, image_path, top_k=DEFAULT_TOP_K):
+        """Return [(image_path, score)] of the captions closest to the caption of an image."""
+        with self._lock:
+            row = self.rows.get(image_path)
+            if row is None:
+                return []
+            term_ids, weights = self.doc_terms[row]
+            return self._search_vector(term_ids, weights, top_k, exclude=image_path)
+
+
+def get_caption_index(folder_path):
+    """Return the shared caption index of a folder."""
+    folder_path = os.path.abspath(folder_path)
+    with _indexes_lock:
+        if folder_path not in _indexes:
+            _indexes[folder_path] = CaptionIndex(folder_path)
+        return _indexes[folder_path]
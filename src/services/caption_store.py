@@ -0,0 +1,124 @@
+import os
+import threading
+
+from src.services.caption_export import get_export_format, read_dataset_batches, resolve_file_name, write_dataset
+from src.services.image_metadata import get_metadata_batch
+from src.utils.utils import get_caption_path, save_caption_to_file
+
+# Edits are written to the dataset file after this delay, in one rewrite
+SAVE_DELAY = 5.0
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class DatasetCaptionStore:
+    """Captions of a folder kept in one JSONL, CSV or Parquet dataset file.
+
+    The file is read once into memory; edits are kept there and the whole file
+    is rewritten (through a temporary file) after SAVE_DELAY, so a burst of
+    edits costs one write. With write_txt the .txt file of each edited image is
+    written as well; without it, the dataset file is the only copy.
+    """
+
+    def __init__(self, dataset_path, folder_path, write_txt=False):
+        self.dataset_path = dataset_path
+        self.folder_path = folder_path
+        self.write_txt = write_txt
+        get_export_format(dataset_path) # Raises on an unsupported file
+        self.records = {} # Image path -> record (file_name, caption, width, height, format)
+        self.dirty = False
+        self._save_timer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock() # A timed save and a flush never write the file at once
+        if os.path.exists(dataset_path):
+            self.load()
+
+    def load(self):
+        """Read the captions of the dataset file, records outside the folder are skipped."""
+        records = {}
+        for batch in read_dataset_batches(self.dataset_path):
+            for record in batch:
+                file_name = record.get("file_name")
+                image_path = resolve_file_name(self.folder_path, file_name) if file_name else None
+                if image_path is None:
+                    continue
+                records[os.path.normpath(image_path)] = {
+                    "file_name": file_name,
+                    "caption": (record.get("caption") or "").strip(),
+                    "width": _to_int(record.get("width")),
+                    "height": _to_int(record.get("height")),
+                    "format": record.get("format") or None,
+                }
+        with self._lock:
+            self.records = records
+            self.dirty = False
+
+    def get(self, image_path):
+        """Caption of an image, "" when it has none."""
+        record = self.records.get(os.path.normpath(image_path))
+        return record["caption"] if record else ""
+
+    def caption_length(self, image_path):
+        """Size in bytes of the caption of an image, as the .txt file would have."""
+        return len(self.get(image_path).encode("utf-8"))
+
+    def set(self, image_path, caption):
+        """Store the caption of an image; the dataset file is rewritten after SAVE_DELAY."""
+        caption = (caption or "").strip()
+        with self._lock:
+            record = self.records.get(os.path.normpath(image_path))
+            if record is None:
+                file_name = os.path.relpath(image_path, self.folder_path).replace(os.sep, "/")
+                record = {"file_name": file_name, "caption": "", "width": None, "height": None, "format": None}
+                self.records[os.path.normpath(image_path)] = record
+            if record["caption"] != caption:
+                record["caption"] = caption
+                self.dirty = True
+                self.schedule_save()
+        if self.write_txt:
+            save_caption_to_file(caption, get_caption_path(image_path))
+
+    def schedule_save(self, delay=SAVE_DELAY):
+        """Save after a delay, so edits made one by one are written together."""
+        with self._lock:
+            if self._save_timer is None and self.dirty:
+                self._save_timer = threading.Timer(delay, self.save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _image_path(self, record):
+        return os.path.join(self.folder_path, *record["file_name"].split("/"))
+
+    def save(self):
+        """Rewrite the dataset file if a caption changed."""
+        with self._write_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self.dirty:
+                    return
+                records = [dict(record) for record in self.records.values()]
+                self.dirty = False
+            # Images captioned since the file was read get their metadata from the folder index
+            added = [record for record in records if record["width"] is None]
+            metadata = get_metadata_batch([self._image_path(record) for record in added]) if added else {}
+            for record in added:
+                record["format"], record["width"], record["height"] = metadata.get(
+                    self._image_path(record), (None, None, None)
+                )
+            try:
+                write_dataset(records, self.dataset_path)
+            except Exception as e:
+                print(f"Error writing captions to {self.dataset_path}: {e}")
+                with self._lock:
+                    self.dirty = True # Written again with the next edit or flush
+
+    def flush(self):
+        """Write pending edits now, e.g. before quitting or loading another folder."""
+        self.save()
@@ -0,0 +1,212 @@
+import math
+import os
+import threading
+from collections import Counter
+
+from src.services.caption_packing import build_packed_prompt
+from src.services.dataset_stats import get_dataset_stats
+from src.services.image_metadata import get_image_metadata, get_metadata_batch
+from src.services.prompt_template import compile_template
+from src.utils.utils import get_caption_path
+
+# Rough text tokenization, no tokenizer ships with the app
+CHARS_PER_TOKEN = 4
+TOKENS_PER_WORD = 1.3
+
+# Expected caption length when the folder has no caption yet
+DEFAULT_OUTPUT_TOKENS = 120
+
+# Templates with variables are rendered for this many images, their mean length is used
+PROMPT_SAMPLE_SIZE = 50
+
+
+def openai_tile_tokens(width, height):
+    """GPT-4.1 high detail: fit in 2048x2048, short side down to 768, 170 tokens per 512px tile plus 85."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def gemini_tile_tokens(width, height):
+    """Gemini: 258 tokens for small images, else 258 per crop unit of 2/3 of the short side (256 to 768px)."""
+    if width <= 384 and height <= 384:
+        return 258
+    unit = min(768, max(256, min(width, height) // 1.5))
+    return 258 * math.ceil(width / unit) * math.ceil(height / unit)
+
+
+def qwen_patch_tokens(width, height):
+    """Qwen2.5-VL: one token per 28x28 patch, images scaled to at most 1280 tokens."""
+    max_pixels = 1280 * 28 * 28
+    scale = min(1.0, math.sqrt(max_pixels / (width * height)))
+    return max(4, math.ceil(width * scale / 28) * math.ceil(height * scale / 28))
+
+
+def pixtral_patch_tokens(width, height):
+    """Pixtral: one token per 16x16 patch plus one per row, images fit in 1024x1024."""
+    scale = min(1.0, 1024 / max(width, height))
+    columns, rows = math.ceil(width * scale / 16), math.ceil(height * scale / 16)
+    return columns * rows + rows
+
+
+def florence2_tokens(width, height):
+    """Florence-2 always sees a 768x768 image."""
+    return 577
+
+
+# Per model: (image token function, input $ per 1M tokens, output $ per 1M tokens).
+# List prices, free tiers (GitHub Models, OpenRouter ":free") are not taken into account.
+MODEL_COSTS = {
+    "GPT-4.1": (openai_tile_tokens, 2.00, 8.00),
+    "Gemini 2.5 Flash": (gemini_tile_tokens, 0.30, 2.50),
+    "Gemini 2.5 Pro": (gemini_tile_tokens, 1.25, 10.00),
+    "Qwen2.5 72B": (qwen_patch_tokens, 0.0, 0.0),
+    "Grok": (openai_tile_tokens, 0.0, 0.0), # Tiling not published, GPT-4.1's is used
+    "Pixtral": (pixtral_patch_tokens, 0.15, 0.15),
+    "Florence2": (florence2_tokens, 0.0, 0.0), # Runs locally
+}
+
+
+def text_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def image_tokens(model, width, height):
+    if model not in MODEL_COSTS or not width or not height:
+        return 0
+    return MODEL_COSTS[model][0](width, height)
+
+
+def cost_of(model, input_tokens, output_tokens):
+    """Dollar cost of a number of input and output tokens."""
+    if model not in MODEL_COSTS:
+        return 0.0
+    _, input_price, output_price = MODEL_COSTS[model]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def pending_images(image_paths):
+    """Images whose caption file is missing or empty, from file sizes only."""
+    pending = []
+    for image_path in image_paths:
+        try:
+            if os.path.getsize(get_caption_path(image_path)) == 0:
+                pending.append(image_path)
+        except OSError:
+            pending.append(image_path)
+    return pending
+
+
+def expected_output_tokens(folder_path):
+    """Mean caption length of the folder from the statistics cache, or a default."""
+    words = [entry["words"] for entry in get_dataset_stats(folder_path).files.values() if entry["words"]]
+    if not words:
+        return DEFAULT_OUTPUT_TOKENS
+    return math.ceil(sum(words) / len(words) * TOKENS_PER_WORD)
+
+
+def prompt_tokens(prompt, image_paths, pack_size=1):
+    """Estimated text tokens of one request, packed prompts included."""
+    template = compile_template(prompt)
+    sample = image_paths[:PROMPT_SAMPLE_SIZE] or [""]
+    if template.is_static():
+        rendered = [prompt] * len(sample)
+    else:
+        rendered = [template.render(image_path) for image_path in sample]
+    if pack_size > 1:
+        return text_tokens(build_packed_prompt(rendered[:pack_size]))
+    return math.ceil(sum(text_tokens(text) for text in rendered) / len(rendered))
+
+
+def estimate_batch(model, image_paths, prompt, pack_size=1, output_tokens=None, progress=None, stop_event=None):
+    """
+    Estimates the requests, tokens and dollars of captioning the given images.
+    Image sizes come from the folder index (headers are read once for new files),
+    and the token count is computed once per distinct size.
+    Returns None if the stop event was set.
+    """
+    metadata = get_metadata_batch(image_paths, progress, stop_event)
+    if metadata is None:
+        return None
+    sizes = Counter(metadata[image_path][1:] for image_path in image_paths if image_path in metadata)
+    image_token_total = sum(image_tokens(model, width, height) * count for (width, height), count in sizes.items())
+    requests = math.ceil(len(image_paths) / pack_size) if image_paths else 0
+    text_token_total = requests * prompt_tokens(prompt, image_paths, pack_size) if requests else 0
+    if output_tokens is None:
+        output_tokens = DEFAULT_OUTPUT_TOKENS
+    output_token_total = len(image_paths) * output_tokens
+    input_token_total = image_token_total + text_token_total
+    return {
+        "model": model,
+        "images": len(image_paths),
+        "unreadable": len(image_paths) - sum(sizes.values()),
+        "requests": requests,
+        "image_tokens": image_token_total,
+        "prompt_tokens": text_token_total,
+        "input_tokens": input_token_total,
+        "output_tokens": output_token_total,
+        "cost": cost_of(model, input_token_total, output_token_total),
+    }
+
+
+def estimate_request(model, image_paths, prompt):
+    """Estimated input tokens of one request, to compare with the reported usage."""
+    tokens = text_tokens(prompt)
+    for image_path in image_paths:
+        try:
+            _, width, height = get_image_metadata(image_path)
+        except Exception:
+            continue
+        tokens += image_tokens(model, width, height)
+    return tokens
+
+
+class UsageTracker:
+    """Token usage reported by the APIs, per model, next to what was estimated."""
+
+    def __init__(self):
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, images, input_tokens, output_tokens, estimated_input_tokens):
+        with self._lock:
+            totals = self.models.setdefault(
+                model,
+                {"requests": 0, "images": 0, "input_tokens": 0, "output_tokens": 0, "estimated_input_tokens": 0},
+            )
+            totals["requests"] += 1
+            totals["images"] += images
+            totals["input_tokens"] += input_tokens
+            totals["output_tokens"] += output_tokens
+            totals["estimated_input_tokens"] += estimated_input_tokens
+
+    def record_response(self, model, image_paths, prompt, usage):
+        """Record the usage object of an API response, ignored when the backend sent none."""
+        if usage is None:
+            return
+        try:
+            estimated = estimate_request(model, image_paths, prompt)
+        except Exception as e:
+            print(f"Error estimating request tokens: {e}")
+            estimated = 0
+        self.record(
+            model, len(image_paths), usage.prompt_tokens or 0, usage.completion_tokens or 0, estimated
+        )
+
+    def summary(self):
+        """Return the totals per model, with their cost."""
+        with self._lock:
+            summary = {model: dict(totals) for model, totals in self.models.items()}
+        for model, totals in summary.items():
+            totals["cost"] = cost_of(model, totals["input_tokens"], totals["output_tokens"])
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self.models.clear()
+
+
+# Filled by the OpenAI-compatible client, shown in the cost estimate window
+usage_tracker = UsageTracker()
@@ -0,0 +1,166 @@
+import bisect
+import json
+import os
+import re
+import statistics
+import threading
+from collections import Counter
+
+from src.services.image_metadata import get_metadata_batch
+from src.utils.utils import get_caption_path, get_state_dir
+
+STATS_FILE_NAME = "stats.json"
+
+# Histogram bins, each value is the lower bound of its bin
+SHORT_SIDE_BINS = [0, 256, 512, 768, 1024, 1536, 2048]
+ASPECT_RATIO_BINS = [0, 0.5, 0.6, 0.7, 0.8, 0.95, 1.05, 1.25, 1.4, 1.6, 1.9, 2.2]
+CAPTION_WORD_BINS = [0, 1, 10, 25, 50, 100, 200]
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z'-]+")
+STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "in", "on", "with", "to", "is", "are", "at",
+    "by", "for", "from", "her", "his", "its", "their", "as", "it", "this", "that",
+    "which", "while", "has", "have", "be", "into", "there", "who", "one",
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def tokenize(caption):
+    return [token for token in TOKEN_PATTERN.findall(caption.lower()) if token not in STOPWORDS]
+
+
+def histogram(values, bins):
+    """Count values per bin, bins being sorted lower bounds."""
+    counts = [0] * len(bins)
+    for value in values:
+        counts[max(0, bisect.bisect_right(bins, value) - 1)] += 1
+    return counts
+
+
+class DatasetStats:
+    """Incremental statistics over the images and captions of a folder.
+
+    Image sizes are read from the file headers and cached in the folder index.
+    Caption lengths, the token counts of each caption and the token frequency
+    table are cached in stats.json, so only caption files whose size or
+    modification time changed are read again, in this session or a later one.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(get_state_dir(folder_path), STATS_FILE_NAME)
+        self.files = {} # name -> {"caption": signature, "chars": n, "words": n, "tokens": {token: n}}
+        self.tokens = Counter()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        self.files = {}
+        self.tokens = Counter()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.tokens = Counter(data.get("tokens", {}))
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            print(f"Error decoding stats cache {self.path}, rebuilding it.")
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "tokens": self.tokens}, f)
+        os.replace(temp_path, self.path)
+
+    def update(self, image_paths, progress=None, stop_event=None):
+        """Bring the cache up to date with the given images and return the summary."""
+        with self._lock:
+            names = {os.path.basename(path): path for path in image_paths}
+
+            # Find the captions that changed, from their signature only
+            changed = []
+            for name, image_path in names.items():
+                try:
+                    stat = os.stat(get_caption_path(image_path))
+                    signature = [stat.st_size, stat.st_mtime_ns]
+                except OSError:
+                    signature = None
+                cached = self.files.get(name)
+                if cached is None or cached["caption"] != signature:
+                    changed.append((name, signature))
+            removed = [name for name in self.files if name not in names]
+
+            # The old token counts of every touched file are subtracted from the table.
+            # Entries of a cache written before they were stored lead to one full recount.
+            touched = [name for name, _ in changed if name in self.files] + removed
+            full_recount = any("tokens" not in self.files[name] for name in touched)
+            if full_recount:
+                self.tokens = Counter()
+                to_read = set(names)
+            else:
+                for name in touched:
+                    self.tokens.subtract(self.files[name]["tokens"])
+                to_read = {name for name, _ in changed}
+            for name in removed:
+                del self.files[name]
+            signatures = dict(changed)
+
+            metadata = get_metadata_batch(list(names.values()), progress, stop_event)
+            sizes = [(width, height) for _, width, height in (metadata or {}).values()]
+
+            # One streaming pass over the captions that need it
+            for done, (name, image_path) in enumerate(names.items(), 1):
+                if metadata is None or (stop_event is not None and stop_event.is_set()):
+                    # Partial counts are thrown away, the cache on disk is still consistent
+                    self.load()
+                    return None
+                if name in to_read:
+                    try:
+                        with open(get_caption_path(image_path), "r", encoding="utf-8") as f:
+                            caption = f.read().strip()
+                    except FileNotFoundError:
+                        caption = ""
+                    tokens = Counter(tokenize(caption))
+                    self.tokens.update(tokens)
+                    if name in signatures:
+                        self.files[name] = {
+                            "caption": signatures[name],
+                            "chars": len(caption),
+                            "words": len(caption.split()),
+                            "tokens": dict(tokens),
+                        }
+                    else:
+                        self.files[name]["tokens"] = dict(tokens) # Full recount of an unchanged caption
+                if progress is not None and done % 500 == 0:
+                    progress(done, len(names))
+
+            self.tokens = +self.tokens # Drop tokens whose count fell to zero
+            self.save()
+            return self.summary(sizes, [self.files[name] for name in names if name in self.files])
+
+    def summary(self, sizes, captions):
+        words = [caption["words"] for caption in captions]
+        short_sides = [min(width, height) for width, height in sizes]
+        aspect_ratios = [width / height for width, height in sizes if height]
+        return {
+            "images": len(sizes),
+            "short_side_histogram": histogram(short_sides, SHORT_SIDE_BINS),
+            "aspect_ratio_histogram": histogram(aspect_ratios, ASPECT_RATIO_BINS),
+            "caption_word_histogram": histogram(words, CAPTION_WORD_BINS),
+            "empty_captions": sum(1 for count in words if count == 0),
+            "mean_words": statistics.fmean(words) if words else 0,
+            "median_words": statistics.median(words) if words else 0,
+            "top_tokens": self.tokens.most_common(40),
+        }
+
+
+def get_dataset_stats(folder_path):
+    """Return the shared stats engine of a folder."""
+    folder_path = os.path.abspath(folder_path)
+    with _engines_lock:
+        if folder_path not in _engines:
+            _engines[folder_path] = DatasetStats(folder_path)
+        return _engines[folder_path]
@@ -0,0 +1,135 @@
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.folder_index import get_folder_index
+from src.utils.file_access import hash_file
+from src.utils.phash import dhash_batch, find_duplicate_groups, load_hash_thumbnail
+from src.utils.utils import get_caption_path, load_file_as_string, save_caption_to_file
+
+# Images decoded per vectorised hashing step
+HASH_BATCH_SIZE = 256
+
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def content_hash(image_path):
+    """Hash of the bytes of an image, cached in the folder index, None if unreadable."""
+    index = get_folder_index(os.path.dirname(image_path))
+    value = index.lookup(image_path, "content")
+    if value is None:
+        try:
+            value = hash_file(image_path)
+        except OSError as e:
+            print(f"Error hashing {image_path}: {e}")
+            return None
+        index.store(image_path, "content", value)
+    return value
+
+
+def find_exact_copies(image_paths):
+    """
+    Returns {image_path: original} for images whose bytes are identical to an
+    earlier image of the list. Only files sharing their size are content-hashed.
+    """
+    sizes = {}
+    for image_path in image_paths:
+        try:
+            sizes[image_path] = os.path.getsize(image_path)
+        except OSError:
+            pass
+    size_counts = Counter(sizes.values())
+    originals = {}
+    copies = {}
+    for image_path in image_paths:
+        if size_counts[sizes.get(image_path)] < 2:
+            continue
+        content = content_hash(image_path)
+        if content is None:
+            continue
+        original = originals.setdefault(content, image_path)
+        if original != image_path:
+            copies[image_path] = original
+    return copies
+
+
+def compute_hashes(image_paths, progress=None, stop_event=None):
+    """
+    Returns {image_path: dhash} for every readable image.
+    Hashes cached in the folder index are reused. Byte-identical copies (found by
+    content hash) share the hash of their original; the other images are decoded
+    in a thread pool (Pillow releases the GIL while decoding) and hashed in batches.
+    """
+    hashes = {}
+    missing = []
+    for image_path in image_paths:
+        cached = get_folder_index(os.path.dirname(image_path)).lookup(image_path, "dhash")
+        if cached is not None:
+            hashes[image_path] = cached
+        else:
+            missing.append(image_path)
+    copies = find_exact_copies(missing)
+    missing = [image_path for image_path in missing if image_path not in copies]
+
+    def load(image_path):
+        try:
+            return load_hash_thumbnail(image_path)
+        except Exception as e:
+            print(f"Error hashing {image_path}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        for start in range(0, len(missing), HASH_BATCH_SIZE):
+            if stop_event is not None and stop_event.is_set():
+                break
+            batch = missing[start:start + HASH_BATCH_SIZE]
+            loaded = [(path, thumb) for path, thumb in zip(batch, executor.map(load, batch)) if thumb is not None]
+            if loaded:
+                for (image_path, _), value in zip(loaded, dhash_batch([thumb for _, thumb in loaded]).tolist()):
+                    hashes[image_path] = value
+                    get_folder_index(os.path.dirname(image_path)).store(image_path, "dhash", value)
+            if progress is not None:
+                progress(len(hashes), len(image_paths))
+
+    for image_path, original in copies.items():
+        if original in hashes:
+            hashes[image_path] = hashes[original]
+            get_folder_index(os.path.dirname(image_path)).store(image_path, "dhash", hashes[original])
+
+    for folder in {os.path.dirname(path) for path in image_paths}:
+        get_folder_index(folder).save()
+    return hashes
+
+
+def find_duplicates(image_paths, max_distance=4, progress=None, stop_event=None):
+    """
+    Returns groups of near-duplicate images, each a list of paths with the
+    representative first: the first image that already has a caption, or the
+    first image of the group in list order.
+    """
+    hashes = compute_hashes(image_paths, progress, stop_event)
+    hashed_paths = [path for path in image_paths if path in hashes]
+    groups = []
+    for group in find_duplicate_groups([hashes[path] for path in hashed_paths], max_distance):
+        paths = [hashed_paths[i] for i in sorted(group)]
+        captioned = [path for path in paths if load_file_as_string(get_caption_path(path)) != ""]
+        representative = captioned[0] if captioned else paths[0]
+        groups.append([representative] + [path for path in paths if path != representative])
+    return groups
+
+
+def copy_caption_to_duplicates(group, caption=None, overwrite=False):
+    """
+    Copies the representative's caption to the other images of the group.
+    Returns the list of images whose caption was written.
+    """
+    representative, members = group[0], group[1:]
+    caption = caption if caption is not None else load_file_as_string(get_caption_path(representative))
+    if not caption:
+        return []
+    written = []
+    for member in members:
+        if overwrite or load_file_as_string(get_caption_path(member)) == "":
+            save_caption_to_file(caption, get_caption_path(member))
+            written.append(member)
+    return written
@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+
+from src.utils.utils import get_state_dir
+
+INDEX_FILE_NAME = "index.json"
+
+# Values stored one at a time (e.g. while browsing) are written after this delay, in one go
+SAVE_DELAY = 5.0
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class FolderIndex:
+    """Per-folder cache of values computed from image files (hashes, metadata...).
+
+    Entries are keyed by file name and dropped as soon as the size or the
+    modification time of the file changes. The state folder is only created
+    when the index is saved; in a read-only folder the index stays in memory.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(get_state_dir(folder_path, create=False), INDEX_FILE_NAME)
+        self.entries = {}
+        self.checked = set() # Names whose signature was verified during this session
+        self.dirty = False
+        self.read_only = False
+        self._save_timer = None
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        except PermissionError:
+            print(f"Cannot read folder index {self.path}, rebuilding it in memory.")
+        except json.JSONDecodeError:
+            print(f"Error decoding folder index {self.path}, rebuilding it.")
+
+    def save(self):
+        """Write the index if it changed, through a temporary file."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self.dirty or self.read_only:
+                return
+            temp_path = self.path + ".tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump({"files": self.entries}, f)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Cannot write folder index {self.path}, keeping it in memory: {e}")
+                self.read_only = True
+                return
+            self.dirty = False
+
+    def schedule_save(self, delay=SAVE_DELAY):
+        """Save after a delay, so values stored one by one are written together."""
+        with self._lock:
+            if self._save_timer is None and self.dirty and not self.read_only:
+                self._save_timer = threading.Timer(delay, self.save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _entry(self, file_path):
+        """Return the valid entry of a file, or None if it is missing or stale."""
+        name = os.path.basename(file_path)
+        entry = self.entries.get(name)
+        if entry is None or name in self.checked:
+            return entry
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if entry.get("signature") != [stat.st_size, stat.st_mtime_ns]:
+            del self.entries[name]
+            self.dirty = True
+            return None
+        self.checked.add(name)
+        return entry
+
+    def lookup(self, file_path, key):
+        """Return the cached value of key for the file, or None."""
+        with self._lock:
+            entry = self._entry(file_path)
+            return entry.get(key) if entry else None
+
+    def store(self, file_path, key, value):
+        """Cache a value computed from the current content of the file."""
+        with self._lock:
+            entry = self._entry(file_path)
+            if entry is None:
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    return
+                entry = {"signature": [stat.st_size, stat.st_mtime_ns]}
+                name = os.path.basename(file_path)
+                self.entries[name] = entry
+                self.checked.add(name)
+            entry[key] = value
+            self.dirty = True
+
+    def invalidate(self, file_path):
+        """Forget the cached values of a file (e.g. after it was rewritten or renamed)."""
+        with self._lock:
+            name = os.path.basename(file_path)
+            if self.entries.pop(name, None) is not None:
+                self.dirty = True
+            self.checked.discard(name)
+
+    def rename(self, renamed_paths):
+        """Move cached values along with renamed files, given {old_path: new_path}."""
+        with self._lock:
+            old_names = {os.path.basename(old): os.path.basename(new) for old, new in renamed_paths.items()}
+            moved = {name: self.entries.pop(name) for name in old_names if name in self.entries}
+            for old_name, new_name in old_names.items():
+                self.checked.discard(old_name)
+                self.checked.discard(new_name)
+                if old_name in moved:
+                    self.entries[new_name] = moved[old_name]
+                else:
+                    self.entries.pop(new_name, None) # Values of the file that used to have this name
+            self.dirty = True
+
+
+def get_folder_index(folder_path):
+    """Return the shared index of a folder, loading it on first use."""
+    folder_path = os.path.abspath(folder_path)
+    with _indexes_lock:
+        if folder_path not in _indexes:
+            _indexes[folder_path] = FolderIndex(folder_path)
+        return _indexes[folder_path]
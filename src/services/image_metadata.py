@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.folder_index import get_folder_index
+from src.utils.image_metadata import read_image_header
+
+METADATA_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+# Headers read per step of a batch, between stop and progress checks
+METADATA_BATCH_SIZE = 1000
+
+
+def get_image_metadata(image_path):
+    """Return (format, width, height) of an image, from the folder index or its header."""
+    index = get_folder_index(os.path.dirname(image_path))
+    cached = index.lookup(image_path, "meta")
+    if cached is not None:
+        return tuple(cached)
+    metadata = read_image_header(image_path)
+    index.store(image_path, "meta", list(metadata))
+    index.schedule_save()
+    return metadata
+
+
+def get_metadata_batch(image_paths, progress=None, stop_event=None):
+    """
+    Returns {image_path: (format, width, height)} for every readable image.
+    Cached values are reused, the other headers are read in a thread pool
+    (the work is mostly waiting on the disk) and added to the folder index.
+    Returns None if the stop event was set.
+    """
+    metadata = {}
+    missing = []
+    for image_path in image_paths:
+        cached = get_folder_index(os.path.dirname(image_path)).lookup(image_path, "meta")
+        if cached is not None:
+            metadata[image_path] = tuple(cached)
+        else:
+            missing.append(image_path)
+
+    def read(image_path):
+        try:
+            return read_image_header(image_path)
+        except Exception as e:
+            print(f"Error reading metadata of {image_path}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as executor:
+        for start in range(0, len(missing), METADATA_BATCH_SIZE):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            batch = missing[start:start + METADATA_BATCH_SIZE]
+            for image_path, value in zip(batch, executor.map(read, batch)):
+                if value is not None:
+                    metadata[image_path] = value
+                    get_folder_index(os.path.dirname(image_path)).store(image_path, "meta", list(value))
+            if progress is not None:
+                progress(len(metadata), len(image_paths))
+
+    for folder in {os.path.dirname(path) for path in image_paths}:
+        get_folder_index(folder).save()
+    return metadata
@@ -0,0 +1,155 @@
+import os
+import re
+
+import numpy as np
+
+from src.services.image_metadata import get_metadata_batch
+from src.utils.utils import get_caption_path
+
+# Columns the list can be sorted by, "name" keeps the folder order
+SORT_COLUMNS = ("name", "width", "height", "size", "caption")
+
+# Filter clauses: "width < 512", "h>=1024", "size > 2m", "caption = 0"
+COMPARISON_PATTERN = re.compile(r"^(width|w|height|h|size|caption)\s*(<=|>=|!=|=|<|>)\s*(\d+(?:\.\d+)?)([km]?)$")
+COLUMN_ALIASES = {"w": "width", "h": "height"}
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 * 1024}
+COMPARISONS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "=": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def parse_filter(text):
+    """
+    Split a filter text into clauses, separated by commas. Each clause is
+    ("empty",), ("captioned",), ("compare", column, function, value) or
+    ("name", substring). Clauses that are not keywords or comparisons are
+    searched in the file names.
+    """
+    clauses = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if part in ("empty", "no caption"):
+            clauses.append(("empty",))
+        elif part in ("captioned", "has caption"):
+            clauses.append(("captioned",))
+        else:
+            match = COMPARISON_PATTERN.match(part)
+            if match:
+                column, operator, value, unit = match.groups()
+                clauses.append(
+                    ("compare", COLUMN_ALIASES.get(column, column), COMPARISONS[operator], float(value) * SIZE_UNITS[unit])
+                )
+            else:
+                clauses.append(("name", part))
+    return clauses
+
+
+class ImageTable:
+    """Column store of the images of the list, one row per image in list order.
+
+    Columns are NumPy arrays (file size, width, height, caption length in bytes)
+    so filters and sorts run as vectorised operations over every row at once.
+    Names are also kept lower-cased in one fixed-width string array for
+    substring filters. Rows never move: filtering and sorting return arrays
+    of row numbers, which the list view maps to its items.
+    """
+
+    def __init__(self, image_paths, sizes, widths, heights, caption_lengths):
+        self.paths = list(image_paths)
+        self.rows = {path: row for row, path in enumerate(self.paths)}
+        self.names = np.array([os.path.basename(path).lower() for path in self.paths], dtype=str)
+        self.columns = {
+            "size": np.asarray(sizes, dtype=np.int64),
+            "width": np.asarray(widths, dtype=np.int32),
+            "height": np.asarray(heights, dtype=np.int32),
+            "caption": np.asarray(caption_lengths, dtype=np.int64),
+        }
+        self._sort_orders = {} # (column, descending) -> row order, dropped when the column changes
+
+    def __len__(self):
+        return len(self.paths)
+
+    @classmethod
+    def from_paths(cls, image_paths, progress=None, stop_event=None, read_caption_length=None):
+        """
+        Build the table of a list of images from file sizes and the cached header
+        metadata; no image is decoded. Caption lengths come from read_caption_length,
+        the .txt file sizes by default. Returns None if the stop event was set.
+        """
+        read_caption_length = read_caption_length or caption_length
+        metadata = get_metadata_batch(image_paths, progress, stop_event)
+        if metadata is None:
+            return None
+        sizes, widths, heights, caption_lengths = [], [], [], []
+        for image_path in image_paths:
+            try:
+                sizes.append(os.path.getsize(image_path))
+            except OSError:
+                sizes.append(0)
+            _, width, height = metadata.get(image_path, (None, 0, 0))
+            widths.append(width)
+            heights.append(height)
+            caption_lengths.append(read_caption_length(image_path))
+        return cls(image_paths, sizes, widths, heights, caption_lengths)
+
+    def set_caption_length(self, image_path, length):
+        """Update the caption column of one image, returns False if it is not in the table."""
+        row = self.rows.get(image_path)
+        if row is None:
+            return False
+        if self.columns["caption"][row] != length:
+            self.columns["caption"][row] = length
+            self._sort_orders.pop(("caption", False), None)
+            self._sort_orders.pop(("caption", True), None)
+        return True
+
+    def sort_order(self, column="name", descending=False):
+        """Row numbers sorted by a column, ties kept in list order."""
+        if column == "name":
+            order = np.arange(len(self.paths))
+            return order[::-1] if descending else order
+        order = self._sort_orders.get((column, descending))
+        if order is None:
+            # A stable sort of the negated column keeps the ties in list order when descending
+            values = -self.columns[column] if descending else self.columns[column]
+            order = np.argsort(values, kind="stable")
+            self._sort_orders[(column, descending)] = order
+        return order
+
+    def mask(self, clauses):
+        """Boolean array of the rows matching every clause."""
+        keep = np.ones(len(self.paths), dtype=bool)
+        for clause in clauses:
+            if clause[0] == "empty":
+                keep &= self.columns["caption"] == 0
+            elif clause[0] == "captioned":
+                keep &= self.columns["caption"] > 0
+            elif clause[0] == "compare":
+                _, column, compare, value = clause
+                keep &= compare(self.columns[column], value)
+            elif clause[0] == "name":
+                keep &= np.char.find(self.names, clause[1]) >= 0
+        return keep
+
+    def query(self, filter_text="", sort_by="name", descending=False):
+        """Row numbers of the images matching a filter text, in display order."""
+        order = self.sort_order(sort_by, descending)
+        clauses = parse_filter(filter_text)
+        if not clauses:
+            return order
+        return order[self.mask(clauses)[order]]
+
+
+def caption_length(image_path):
+    """Size in bytes of the caption file of an image, 0 when it is missing."""
+    try:
+        return os.path.getsize(get_caption_path(image_path))
+    except OSError:
+        return 0
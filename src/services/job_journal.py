@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from src.utils.utils import get_state_dir
+
+JOURNAL_FILE_NAME = "journal.jsonl"
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobJournal:
+    """Append-only journal of a batch run, used to resume it after the app is closed.
+
+    Each line is one JSON event. A "run" event lists the queued images, followed by
+    "started", "done" and "failed" events per image and a final "finished" event.
+    Images are stored relative to the folder to keep the journal small.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.path = os.path.join(get_state_dir(folder_path), JOURNAL_FILE_NAME)
+        self.model = None
+        self.queued = []
+        self.status = {}
+        self.errors = {}
+        self.run_active = False
+        self.run_started_at = None
+        self.completion_times = deque(maxlen=50) # Recent completions, for throughput
+        self._lock = threading.Lock()
+        self.load()
+        # Only completions of this session count, a resumed run would see a huge gap
+        self.completion_times.clear()
+
+    def load(self):
+        """Replay the journal file to rebuild the state of the last run."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a truncated last line, ignore it
+                    continue
+                self._apply(event)
+
+    def _apply(self, event):
+        kind = event.get("event")
+        if kind == "run":
+            self.model = event.get("model")
+            self.queued = list(event.get("images", []))
+            self.status = {name: QUEUED for name in self.queued}
+            self.errors = {}
+            self.run_active = True
+            self.run_started_at = event.get("t")
+            self.completion_times.clear()
+        elif kind == "started":
+            self.status[event["image"]] = IN_FLIGHT
+        elif kind == "done":
+            self.status[event["image"]] = DONE
+            self.completion_times.append(event.get("t", time.time()))
+        elif kind == "failed":
+            self.status[event["image"]] = FAILED
+            self.errors[event["image"]] = event.get("reason", "")
+            self.completion_times.append(event.get("t", time.time()))
+        elif kind == "finished":
+            self.run_active = False
+
+    def _write(self, event, truncate=False):
+        event["t"] = time.time()
+        with self._lock:
+            self._apply(event)
+            with open(self.path, "w" if truncate else "a", encoding="utf-8") as f:
+                f.write(json.dumps(event) + "\n")
+
+    def _name(self, image_path):
+        return os.path.relpath(image_path, self.folder_path)
+
+    def _path(self, name):
+        return os.path.join(self.folder_path, name)
+
+    def has_pending_run(self):
+        """Return True if the last run was interrupted before all its images were handled."""
+        return self.run_active and any(
+            self.status.get(name) in (QUEUED, IN_FLIGHT) for name in self.queued
+        )
+
+    def pending_paths(self):
+        """Return the images of the last run that are still queued or were in flight."""
+        return [
+            self._path(name)
+            for name in self.queued
+            if self.status.get(name) in (QUEUED, IN_FLIGHT)
+        ]
+
+    def failed_paths(self):
+        """Return the images that failed during the last run."""
+        return [self._path(name) for name in self.queued if self.status.get(name) == FAILED]
+
+    def start_run(self, image_paths, model):
+        """Start a new run, replacing the journal of the previous one."""
+        self._write(
+            {"event": "run", "model": model, "images": [self._name(p) for p in image_paths]},
+            truncate=True,
+        )
+
+    def mark_started(self, image_path):
+        self._write({"event": "started", "image": self._name(image_path)})
+
+    def mark_done(self, image_path, prompt_hash=None):
+        event = {"event": "done", "image": self._name(image_path)}
+        if prompt_hash is not None:
+            event["prompt"] = prompt_hash # Tells which captions a changed prompt would alter
+        self._write(event)
+
+    def mark_failed(self, image_path, reason):
+        self._write({"event": "failed", "image": self._name(image_path), "reason": reason})
+
+    def finish_run(self):
+        self._write({"event": "finished"})
+
+    def stats(self, remaining=None):
+        """
+        Return counts, throughput (images/s) and ETA (s) of the current run. The
+        ETA of a run that is not journaled is computed from the given remaining count.
+        """
+        counts = {QUEUED: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+        for name in self.queued:
+            counts[self.status.get(name, QUEUED)] += 1
+        if remaining is None:
+            remaining = counts[QUEUED] + counts[IN_FLIGHT]
+        throughput = 0.0
+        if len(self.completion_times) >= 2:
+            elapsed = self.completion_times[-1] - self.completion_times[0]
+            if elapsed > 0:
+                throughput = (len(self.completion_times) - 1) / elapsed
+        eta = remaining / throughput if throughput > 0 else None
+        return {
+            "total": len(self.queued),
+            "done": counts[DONE],
+            "failed": counts[FAILED],
+            "remaining": remaining,
+            "throughput": throughput,
+            "eta": eta,
+        }
+
+
+def format_eta(seconds):
+    """Format an ETA in seconds as a short human readable string."""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
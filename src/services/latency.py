@@ -0,0 +1,63 @@
+import bisect
+import threading
+
+# Log-spaced bucket upper bounds in seconds, from 0.25s up to 4 minutes
+BUCKET_BOUNDS = [0.25 * (2 ** (i / 2)) for i in range(21)]
+
+# Do not trust a percentile computed from fewer samples than this
+MIN_SAMPLES = 10
+
+
+class LatencyHistogram:
+    """Bucketed latency histogram, cheap to update from any thread."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+            self.total += 1
+
+    def percentile(self, q):
+        """Return the upper bound of the bucket holding the q-th percentile (0-100)."""
+        with self._lock:
+            if self.total == 0:
+                return None
+            target = self.total * q / 100
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= target:
+                    return BUCKET_BOUNDS[min(i, len(BUCKET_BOUNDS) - 1)]
+        return BUCKET_BOUNDS[-1]
+
+
+class LatencyTracker:
+    """Live latency histograms per model."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, model):
+        with self._lock:
+            if model not in self.histograms:
+                self.histograms[model] = LatencyHistogram()
+            return self.histograms[model]
+
+    def record(self, model, seconds):
+        self.histogram(model).record(seconds)
+
+    def hedge_threshold(self, model, q=90):
+        """Return the q-th percentile latency of the model, or None while warming up."""
+        histogram = self.histogram(model)
+        if histogram.total < MIN_SAMPLES:
+            return None
+        return histogram.percentile(q)
+
+
+# Shared by every run, so the thresholds keep learning across runs
+latency_tracker = LatencyTracker()
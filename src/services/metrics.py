@@ -0,0 +1,184 @@
+import csv
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Stages of one caption request, in pipeline order
+STAGES = ("queue", "decode", "resize", "encode", "network", "write")
+
+# Stages spent preparing the image, subtracted from the call time to get the network time
+IMAGE_STAGES = ("decode", "resize", "encode")
+
+_local = threading.local()
+
+
+class TimingRecord:
+    """Time spent in each stage while captioning one image.
+
+    Requests are kept as attempts (model, network seconds, outcome), failed and
+    cancelled ones included. Race and hedge send concurrent requests for the same
+    image, so the network stage is taken from the attempt that won, not summed.
+    """
+
+    def __init__(self, image_path, model):
+        self.image_path = image_path
+        self.model = model
+        self.started_at = time.time()
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.attempts = []
+        self.failed = False
+        self.total = None
+        self._lock = threading.Lock()
+
+    def add(self, stage_name, seconds):
+        with self._lock:
+            self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def add_attempt(self, model, network, outcome="ok"):
+        """Record one request; outcome is "ok", "failed" or "cancelled"."""
+        with self._lock:
+            self.attempts.append((model, network, outcome))
+
+    def use_attempt(self, model):
+        """Take the network time of the first successful attempt of the winning model."""
+        with self._lock:
+            for attempt_model, network, outcome in self.attempts:
+                if attempt_model == model and outcome == "ok":
+                    self.stages["network"] = network
+                    return
+
+    def image_time(self):
+        with self._lock:
+            return sum(self.stages[name] for name in IMAGE_STAGES)
+
+    def finish(self, model=None, failed=False):
+        if model is not None:
+            self.model = model
+        self.failed = failed
+        self.total = time.time() - self.started_at
+
+    def to_dict(self):
+        row = {
+            "image": self.image_path,
+            "model": self.model,
+            "started_at": round(self.started_at, 3),
+            "total": round(self.total or 0.0, 4),
+            "failed": self.failed,
+            "attempts": len(self.attempts),
+            "failed_attempts": sum(outcome != "ok" for _, _, outcome in self.attempts),
+        }
+        row.update({name: round(seconds, 4) for name, seconds in self.stages.items()})
+        return row
+
+
+def current_record():
+    """Return the record being timed on this thread, if any."""
+    return getattr(_local, "record", None)
+
+
+@contextmanager
+def activate(record):
+    """Make record the target of stage() calls made on this thread."""
+    previous = current_record()
+    _local.record = record
+    try:
+        yield record
+    finally:
+        _local.record = previous
+
+
+@contextmanager
+def stage(name, record=None):
+    """Add the time spent in the block to the given (or this thread's) record."""
+    record = record or current_record()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.add(name, time.perf_counter() - start)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (q in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class MetricsRecorder:
+    """Ring buffer of the last timing records, with summaries and exports."""
+
+    def __init__(self, max_records=5000):
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def summary(self, window=60.0):
+        """Return throughput and p50/p95 per stage and per model."""
+        records = self.snapshot()
+        now = time.time()
+        recent = [
+            r for r in records if r.total is not None and not r.failed and now - r.started_at - r.total <= window
+        ]
+        stages = {}
+        for name in STAGES:
+            values = [r.stages[name] for r in records]
+            stages[name] = (percentile(values, 50), percentile(values, 95))
+        models = {}
+        attempts = [attempt for r in records for attempt in r.attempts]
+        for model in sorted({r.model for r in records} | {attempt[0] for attempt in attempts}):
+            succeeded = [r for r in records if r.model == model and r.total is not None and not r.failed]
+            totals = [r.total for r in succeeded]
+            networks = [r.stages["network"] for r in succeeded]
+            models[model] = {
+                "count": len(totals),
+                "total": (percentile(totals, 50), percentile(totals, 95)),
+                "network": (percentile(networks, 50), percentile(networks, 95)),
+                "attempts": sum(attempt[0] == model for attempt in attempts),
+                "failed_attempts": sum(attempt[0] == model and attempt[2] != "ok" for attempt in attempts),
+            }
+        return {
+            "count": len(records),
+            "throughput": len(recent) * 60.0 / window, # Images per minute
+            "stages": stages,
+            "models": models,
+        }
+
+    def export_csv(self, file_path):
+        rows = [r.to_dict() for r in self.snapshot()]
+        fieldnames = ["image", "model", "started_at", "total", "failed", "attempts", "failed_attempts", *STAGES]
+        with open(file_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def export_jsonl(self, file_path):
+        records = self.snapshot()
+        with open(file_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record.to_dict()) + "\n")
+        return len(records)
+
+
+# Shared by the caption service and the performance panel
+metrics_recorder = MetricsRecorder()
@@ -0,0 +1,89 @@
+import os
+import threading
+from concurrent.futures import CancelledError
+from contextlib import nullcontext
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from src.services.cost_estimator import usage_tracker
+from src.services.metrics import activate, stage
+from src.utils.utils import local_image_to_data_url
+
+load_dotenv()
+
+# OpenAI-compatible backends: (base_url, model_id, API key environment variable)
+OPENAI_COMPATIBLE_MODELS = {
+    "GPT-4.1": ("https://models.github.ai/inference", "openai/gpt-4.1", "GITHUB_TOKEN"),
+    "Qwen2.5 72B": ("https://openrouter.ai/api/v1", "qwen/qwen2.5-vl-72b-instruct:free", "OPENROUTER_API_KEY"),
+    "Gemini 2.5 Flash": ("https://generativelanguage.googleapis.com/v1beta/", "gemini-2.5-flash", "GEMINI_API_KEY"),
+    "Gemini 2.5 Pro": ("https://generativelanguage.googleapis.com/v1beta/", "gemini-2.5-pro", "GEMINI_API_KEY"),
+    "Grok": ("https://openrouter.ai/api/v1", "x-ai/grok-4-fast:free", "OPENROUTER_API_KEY"),
+}
+
+# Longest wait for a reply, also bounds how long a cancelled request keeps running
+REQUEST_TIMEOUT = 120.0
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(model):
+    """Return the shared client of a model's backend, keeping its connections alive between requests."""
+    base_url, _, api_key_env = OPENAI_COMPATIBLE_MODELS[model]
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = OpenAI(base_url=base_url, api_key=os.getenv(api_key_env), timeout=REQUEST_TIMEOUT)
+        return _clients[base_url]
+
+
+def describe_images(model, image_paths, prompt, records=None, json_output=False):
+    """
+    Sends several images in one message and returns the text of the reply.
+    Images are attached in order after the prompt. Each image's encoding time
+    goes to its own timing record when records are given.
+    """
+    _, model_id, _ = OPENAI_COMPATIBLE_MODELS[model]
+    content = [{"type": "text", "text": prompt}]
+    for i, image_path in enumerate(image_paths):
+        # Without records the caller's active record (if any) gets the timings
+        with activate(records[i]) if records else nullcontext():
+            content.append({"type": "image_url", "image_url": {"url": local_image_to_data_url(image_path, timer=stage)}})
+    options = {"response_format": {"type": "json_object"}} if json_output else {}
+    response = get_client(model).chat.completions.create(
+        model=model_id,
+        messages=[{"role": "user", "content": content}],
+        **options,
+    )
+    usage_tracker.record_response(model, image_paths, prompt, response.usage)
+    return response.choices[0].message.content or ""
+
+
+def stream_image_description(model, image_path, prompt, on_text, stop_event=None):
+    """
+    Describes one image with a streamed reply, calling on_text with each new
+    piece of text. Returns the full text. Setting stop_event closes the
+    connection and raises CancelledError.
+    """
+    _, model_id, _ = OPENAI_COMPATIBLE_MODELS[model]
+    content = [
+        {"type": "text", "text": prompt},
+        {"type": "image_url", "image_url": {"url": local_image_to_data_url(image_path, timer=stage)}},
+    ]
+    stream = get_client(model).chat.completions.create(
+        model=model_id,
+        messages=[{"role": "user", "content": content}],
+        stream=True,
+        stream_options={"include_usage": True}, # Usage comes in a last chunk without choices
+    )
+    parts = []
+    with stream:
+        for chunk in stream:
+            if stop_event is not None and stop_event.is_set():
+                raise CancelledError(f"{model} stream cancelled") # Leaving the block closes the connection
+            if getattr(chunk, "usage", None) is not None:
+                usage_tracker.record_response(model, [image_path], prompt, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                on_text(chunk.choices[0].delta.content)
+    return "".join(parts).strip()
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+from src.services.image_metadata import get_image_metadata
+from src.utils.utils import get_caption_path, load_file_as_string
+
+# Per-image values a prompt can use as {name}
+TEMPLATE_VARIABLES = {
+    "filename": "file name of the image, with its extension",
+    "stem": "file name of the image, without its extension",
+    "folder": "name of the folder holding the image",
+    "tags": "words of the folder name, comma separated",
+    "caption": "current caption of the image, for refinement prompts",
+    "width": "image width in pixels",
+    "height": "image height in pixels",
+}
+
+VARIABLE_PATTERN = re.compile(r"\{(" + "|".join(TEMPLATE_VARIABLES) + r")\}")
+TAG_SEPARATOR_PATTERN = re.compile(r"[_\-\s,]+")
+
+
+def folder_tags(folder_path):
+    """Words of a folder name, numbers left out (e.g. "10_red cars" -> "red, cars")."""
+    words = TAG_SEPARATOR_PATTERN.split(os.path.basename(os.path.normpath(folder_path)))
+    return ", ".join(word for word in words if word and not word.isdigit())
+
+
+def prompt_hash(prompt):
+    """Stable hash of a rendered prompt, insensitive to Unicode normalization and outer blanks."""
+    normalized = unicodedata.normalize("NFC", prompt).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class PromptTemplate:
+    """A prompt with {variable} placeholders, parsed once and rendered per image.
+
+    Only the known variables are placeholders, any other brace is kept as
+    written. Rendering computes only the variables the template uses, so a
+    template without {caption} never reads caption files and one without
+    {width}/{height} never reads image headers.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = [] # Literal strings and variable names, alternating
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(text):
+            self.parts.append(text[position:match.start()])
+            self.parts.append(match.group(1))
+            position = match.end()
+        self.parts.append(text[position:])
+        self.variables = set(self.parts[1::2])
+
+    def is_static(self):
+        return not self.variables
+
+    def _values(self, image_path):
+        values = {}
+        if "filename" in self.variables:
+            values["filename"] = os.path.basename(image_path)
+        if "stem" in self.variables:
+            values["stem"] = os.path.splitext(os.path.basename(image_path))[0]
+        if "folder" in self.variables:
+            values["folder"] = os.path.basename(os.path.dirname(image_path))
+        if "tags" in self.variables:
+            values["tags"] = folder_tags(os.path.dirname(image_path))
+        if "caption" in self.variables:
+            values["caption"] = load_file_as_string(get_caption_path(image_path))
+        if "width" in self.variables or "height" in self.variables:
+            _, values["width"], values["height"] = get_image_metadata(image_path)
+        return values
+
+    def render(self, image_path):
+        """Return the prompt for one image."""
+        if not self.variables:
+            return self.text
+        values = self._values(image_path)
+        rendered = list(self.parts)
+        for i in range(1, len(rendered), 2):
+            rendered[i] = str(values[rendered[i]])
+        return "".join(rendered)
+
+
+@lru_cache(maxsize=32)
+def compile_template(text):
+    """Return the compiled template of a prompt text, shared between runs."""
+    return PromptTemplate(text)
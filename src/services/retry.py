@@ -0,0 +1,133 @@
+import random
+import threading
+from concurrent.futures import CancelledError
+
+from src.services.cancellation import wait_cancelled
+
+# HTTP status codes worth retrying: timeouts, rate limits and server-side errors
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Messages that mean retrying will never help (auth, content policy, bad input)
+PERMANENT_MARKERS = (
+    "content_policy",
+    "content policy",
+    "content_filter",
+    "safety",
+    "moderation",
+    "invalid api key",
+    "incorrect api key",
+    "unauthorized",
+    "permission denied",
+)
+
+# Messages of transient failures for errors that carry no status code
+RETRYABLE_MARKERS = (
+    "timeout",
+    "timed out",
+    "rate limit",
+    "too many requests",
+    "overloaded",
+    "temporarily unavailable",
+    "service unavailable",
+    "connection reset",
+    "connection error",
+)
+
+
+def get_status_code(error):
+    """Return the HTTP status code carried by an SDK exception, if any."""
+    for attr in ("status_code", "http_status", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def get_retry_after(error):
+    """Return the Retry-After delay (in seconds) sent with the error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Tell transient errors (timeouts, 429, 5xx) apart from permanent ones."""
+    if isinstance(error, CancelledError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    message = str(error).lower()
+    if any(marker in message for marker in PERMANENT_MARKERS):
+        return False
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    name = type(error).__name__.lower()
+    if "timeout" in name or "connection" in name:
+        return True
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+
+class RetryBudget:
+    """Number of retries shared by every request of a run."""
+
+    def __init__(self, max_retries=50):
+        self.remaining = max_retries
+        self._lock = threading.Lock()
+
+    def consume(self):
+        """Take one retry from the budget, return False once it is exhausted."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter."""
+
+    def __init__(self, max_attempts=5, base_delay=2.0, max_delay=60.0, budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def delay_for(self, attempt, error=None):
+        """Return how long to wait before the given retry attempt (0-based)."""
+        retry_after = get_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def call_with_retry(func, policy=None, stop_event=None, cancel_event=None):
+    """Call func, retrying transient errors until it succeeds or the policy gives up.
+
+    Permanent errors, exhausted attempts and an exhausted budget re-raise the last error,
+    as does setting either event during a backoff wait.
+    """
+    policy = policy or RetryPolicy()
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if (
+                not is_retryable(e)
+                or attempt + 1 >= policy.max_attempts
+                or not policy.budget.consume()
+            ):
+                raise
+            delay = policy.delay_for(attempt, e)
+            print(f"Retryable error ({e}), retrying in {delay:.1f}s...")
+            if wait_cancelled(delay, stop_event, cancel_event):
+                raise
+            attempt += 1
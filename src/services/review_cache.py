@@ -0,0 +1,217 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from src.services.image_metadata import get_image_metadata
+from src.utils.utils import get_caption_path, save_caption_to_file
+
+# Displayed images are scaled down to this height
+DISPLAY_MAX_HEIGHT = 500
+
+# Decoded images kept around the reviewed one, oldest dropped first
+PRELOAD_CACHE_SIZE = 16
+PRELOAD_WORKERS = 2
+
+
+def fit_display_size(width, height, max_width, max_height=DISPLAY_MAX_HEIGHT):
+    """Size an image is displayed at: at most max_height high and max_width wide, aspect ratio kept."""
+    aspect_ratio = width / height
+    new_width, new_height = width, height
+    if height > max_height:
+        new_height = max_height
+        new_width = int(new_height * aspect_ratio)
+    if new_width > max_width:
+        new_width = max_width
+        new_height = int(new_width / aspect_ratio)
+    return new_width, new_height
+
+
+def load_display_image(image_path, max_width):
+    """
+    Decode an image at its display size. Returns a dict with the PIL image and what
+    the resolution label shows; the Tk image is made from it on the main thread.
+    """
+    _, width, height = get_image_metadata(image_path)
+    display_width, display_height = fit_display_size(width, height, max_width)
+    with Image.open(image_path) as image:
+        image.draft("RGB", (display_width, display_height)) # JPEGs decode at a reduced scale
+        image = image.resize((display_width, display_height), Image.LANCZOS)
+    return {
+        "image": image,
+        "width": width,
+        "height": height,
+        "file_size": os.path.getsize(image_path),
+    }
+
+
+def caption_signature(image_path):
+    """(size, mtime) of the caption file of an image, None when it is missing."""
+    try:
+        stat = os.stat(get_caption_path(image_path))
+        return (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+
+
+def read_caption(image_path):
+    """Caption of an image and the signature of its file, ("", None) when it is missing."""
+    signature = caption_signature(image_path)
+    if signature is None:
+        return "", None
+    try:
+        with open(get_caption_path(image_path), "r") as f:
+            return f.read(), signature
+    except OSError:
+        return "", None
+
+
+class ReviewPreloader:
+    """Decodes the images around the reviewed one, and reads their captions, in the background.
+
+    Entries are kept in a small LRU cache. Requests for images that have not
+    started loading are cancelled when the reviewer moves on, so jumping around
+    never queues up work for images already out of reach.
+    """
+
+    def __init__(self, max_width, cache_size=PRELOAD_CACHE_SIZE, workers=PRELOAD_WORKERS):
+        self.max_width = max_width
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # image path -> entry
+        self._futures = {} # image path -> future of the loads in flight
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="review-preload")
+        self._lock = threading.Lock()
+
+    def _load(self, image_path):
+        entry = load_display_image(image_path, self.max_width)
+        entry["caption"], entry["signature"] = read_caption(image_path)
+        return entry
+
+    def _store(self, image_path, future):
+        with self._lock:
+            if self._futures.get(image_path) is future:
+                del self._futures[image_path]
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._cache[image_path] = future.result()
+            self._cache.move_to_end(image_path)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def request(self, image_paths):
+        """Load the given images, nearest first; loads of other images not started yet are dropped."""
+        wanted = set(image_paths)
+        submitted = []
+        with self._lock:
+            dropped = [future for image_path, future in self._futures.items() if image_path not in wanted]
+            for image_path in image_paths:
+                if image_path in self._cache:
+                    self._cache.move_to_end(image_path)
+                elif image_path not in self._futures:
+                    future = self._executor.submit(self._load, image_path)
+                    self._futures[image_path] = future
+                    submitted.append((image_path, future))
+        # Callbacks run at once for futures already done or cancelled, so outside the lock
+        for future in dropped:
+            future.cancel()
+        for image_path, future in submitted:
+            future.add_done_callback(lambda f, path=image_path: self._store(path, f))
+
+    def get(self, image_path):
+        """
+        Entry of an image, loaded now if it was not preloaded. The caption is read
+        again when its file changed since it was preloaded (e.g. by a batch run).
+        """
+        with self._lock:
+            entry = self._cache.get(image_path)
+            future = self._futures.get(image_path)
+        if entry is None and future is not None and not future.cancel():
+            try:
+                entry = future.result()
+            except Exception:
+                entry = None
+        if entry is None:
+            entry = self._load(image_path)
+            with self._lock:
+                self._cache[image_path] = entry
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        elif caption_signature(image_path) != entry["signature"]:
+            entry["caption"], entry["signature"] = read_caption(image_path)
+        return entry
+
+    def set_caption(self, image_path, caption):
+        """Keep the cached caption of an image in sync with an edit."""
+        with self._lock:
+            entry = self._cache.get(image_path)
+            if entry is not None:
+                entry["caption"] = caption
+
+    def clear(self):
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+            self._cache.clear()
+        for future in futures:
+            future.cancel()
+
+
+class CaptionWriteQueue:
+    """Write-behind queue of caption saves.
+
+    Saves return at once; one background thread writes them in order. Saving an
+    image again before its caption was written only replaces the pending text,
+    so each file is written once per burst. pending() lets readers see captions
+    not written yet, and flush() waits until everything is on disk.
+    """
+
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+        self._pending = OrderedDict() # image path -> caption
+        self._writing = None # (image path, caption) being written
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._pending) + (self._writing is not None)
+
+    def put(self, image_path, caption):
+        with self._condition:
+            self._pending[image_path] = caption
+            self._pending.move_to_end(image_path)
+            self._condition.notify_all()
+
+    def pending(self, image_path):
+        """Caption of an image waiting to be written or being written, None if there is none."""
+        with self._condition:
+            if image_path in self._pending:
+                return self._pending[image_path] # Newer than the one being written
+            if self._writing is not None and self._writing[0] == image_path:
+                return self._writing[1] # The file may be half written
+            return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                image_path, caption = self._pending.popitem(last=False)
+                self._writing = (image_path, caption)
+            try:
+                save_caption_to_file(caption, get_caption_path(image_path))
+            except Exception as e:
+                print(f"Error writing caption of {image_path}: {e}")
+                if self.on_error is not None:
+                    self.on_error(image_path, e)
+            with self._condition:
+                self._writing = None
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every queued caption is written, returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and self._writing is None, timeout)
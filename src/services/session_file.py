@@ -1,23 +1,88 @@
 import json
 import os
+import threading
 
 from pathlib import Path
-from src.utils.utils import check_file_exists
+
+from src.services.caption_store import DatasetCaptionStore
 
 root_dir = Path(__file__).parent.parent.parent
 config_path = root_dir / "config" / "session.json"
 
+DEFAULT_PROMPT = "Describe this image as one paragraph, without mentionning the style nor the atmosphere."
+
+# Saves happen in bursts (one per API call), they are coalesced into one write
+SAVE_DELAY = 2.0
+
+
+class SessionWriter:
+    """Coalesces session saves and only writes the file when its content changed."""
+
+    def __init__(self, path, delay=SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self._pending = None
+        self._timer = None
+        self._last_written = None
+        self._lock = threading.Lock()
+
+    def schedule(self, session_data):
+        """Remember the latest session data and write it after the delay."""
+        with self._lock:
+            self._pending = session_data
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending session data now, if any."""
+        with self._lock:
+            session_data, self._pending = self._pending, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if session_data is None:
+                return
+            serialized = json.dumps(session_data)
+            if serialized == self._last_written:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a truncated session
+            temp_path = self.path.with_suffix(".json.tmp")
+            with open(temp_path, "w") as f:
+                f.write(serialized)
+            os.replace(temp_path, self.path)
+            self._last_written = serialized
+
+
+session_writer = SessionWriter(config_path)
+
+
 def save_session(self):
+    # Only the folder is stored, images are listed again when the session is restored.
+    # Individually opened images are kept as names relative to that folder.
     session_data = {
         "current_folder": self.current_folder,
         "current_image": self.current_image,
-        "file_map": self.file_map,
+        "selected_files": self.image_manager.selected_files,
         "selected_model": self.selected_model.get(),
+        "fallback_model": self.model_controls.fallback_model.get(),
+        "race_models": self.model_controls.race_models.get(),
+        "hedge_requests": self.model_controls.hedge_requests.get(),
+        "pack_size": self.model_controls.pack_size.get(),
         "gpt_last_used": self.gpt_last_used,
         "prompt_text": self.prompt_text,
+        "caption_cleanup": self.caption_cleanup,
+        "caption_dataset": self.caption_store.dataset_path if self.caption_store else None,
+        "caption_dataset_txt": self.caption_store.write_txt if self.caption_store else False,
     }
-    with open(config_path, "w") as f:
-        json.dump(session_data, f)
+    session_writer.schedule(session_data)
+
+
+def flush_session():
+    """Write any pending session change immediately (e.g. before quitting)."""
+    session_writer.flush()
 
 
 def load_session(self):
@@ -27,21 +92,34 @@ def load_session(self):
         #     os.makedirs("config")
         with open(config_path, "r") as f:
             session_data = json.load(f)
-        self.file_map = session_data.get("file_map", {})
-        for file_name, file_path in self.file_map.items():
-            if not check_file_exists(file_path):
-                return
         self.current_folder = session_data.get("current_folder", "")
         self.current_image = session_data.get("current_image", "")
         self.selected_model.set(session_data.get("selected_model", "Florence2"))
+        self.model_controls.fallback_model.set(session_data.get("fallback_model", "None"))
+        self.model_controls.race_models.set(session_data.get("race_models", False))
+        self.model_controls.hedge_requests.set(session_data.get("hedge_requests", False))
+        self.model_controls.pack_size.set(session_data.get("pack_size", 1))
         self.gpt_last_used = session_data.get("gpt_last_used", None)
-        self.prompt_text = session_data.get(
-            "prompt_text",
-            "Describe this image as one paragraph, without mentionning the style nor the atmosphere.",
-        )
+        self.prompt_text = session_data.get("prompt_text", DEFAULT_PROMPT)
+        self.caption_cleanup.update(session_data.get("caption_cleanup", {}))
 
-        if self.current_folder:
-            self.load_images_from_folder(self.current_folder)
+        # Files are not checked one by one here, missing ones are reported when displayed
+        if self.current_folder and os.path.isdir(self.current_folder):
+            dataset_path = session_data.get("caption_dataset")
+            if dataset_path:
+                try:
+                    self.caption_store = DatasetCaptionStore(
+                        dataset_path, self.current_folder, write_txt=session_data.get("caption_dataset_txt", False)
+                    )
+                except Exception as e:
+                    print(f"Cannot read the captions of {dataset_path}, using the .txt files: {e}")
+            selected_files = session_data.get("selected_files")
+            if selected_files:
+                self.image_manager.load_image_files(
+                    [os.path.join(self.current_folder, name) for name in selected_files]
+                )
+            else:
+                self.load_images_from_folder(self.current_folder)
             self.display_image(None)
     except FileNotFoundError:
         print("No previous session found.")
@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from src.utils.utils import get_caption_path, load_file_as_string
+
+SHARD_NAME_PATTERN = "shard-{:06d}.tar"
+INDEX_FILE_NAME = "index.jsonl"
+
+DEFAULT_SAMPLES_PER_SHARD = 1000
+DEFAULT_MAX_SHARD_BYTES = 1024 * 1024 * 1024
+
+# Output buffer: tarfile issues one small write per header, they are gathered into large writes
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+RESIZE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Images resized ahead of the writer, bounds the memory held by finished results
+RESIZE_WINDOW = RESIZE_WORKERS * 4
+
+
+def _sample_key(image_path, folder_path):
+    """WebDataset key of an image: its relative path without extension, with no dots."""
+    stem = os.path.splitext(os.path.relpath(image_path, folder_path))[0]
+    return stem.replace(os.sep, "/").replace(".", "_")
+
+
+def _read_image(image_path, max_side=None, quality=90):
+    """
+    Returns (data, extension) of an image for a shard.
+    Images larger than max_side are downscaled and re-encoded (JPEG, or PNG with
+    transparency), the others are copied as is. Runs in worker processes.
+    """
+    extension = os.path.splitext(image_path)[1].lstrip(".").lower()
+    if max_side:
+        with Image.open(image_path) as img:
+            if max(img.size) > max_side:
+                img.draft("RGB", (max_side, max_side))
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+                buffer = io.BytesIO()
+                if img.mode in ("RGBA", "LA", "P"):
+                    img.save(buffer, format="PNG", optimize=True)
+                    return buffer.getvalue(), "png"
+                img.convert("RGB").save(buffer, format="JPEG", quality=quality)
+                return buffer.getvalue(), "jpg"
+    with open(image_path, "rb") as f:
+        return f.read(), extension
+
+
+def _iter_images(image_paths, max_side, quality):
+    """Yields (image_path, data, extension) in order, resizing in a process pool if needed."""
+    if not max_side:
+        for image_path in image_paths:
+            yield (image_path, *_read_image(image_path))
+        return
+
+    with ProcessPoolExecutor(max_workers=RESIZE_WORKERS) as executor:
+        pending = deque()
+        paths = iter(image_paths)
+        for image_path in paths:
+            pending.append((image_path, executor.submit(_read_image, image_path, max_side, quality)))
+            if len(pending) >= RESIZE_WINDOW:
+                break
+        try:
+            while pending:
+                image_path, future = pending.popleft()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(_read_image, next_path, max_side, quality)))
+                yield (image_path, *future.result())
+        finally:
+            for _, future in pending: # The writer stopped early
+                future.cancel()
+
+
+def _add_member(tar, name, data):
+    """Append one file to the archive, returns the offset of its data."""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = time.time()
+    tar.addfile(info, io.BytesIO(data))
+    return tar.offset - (-len(data) % tarfile.BLOCKSIZE) - len(data)
+
+
+def write_shards(
+    image_paths,
+    folder_path,
+    output_dir,
+    samples_per_shard=DEFAULT_SAMPLES_PER_SHARD,
+    max_shard_bytes=DEFAULT_MAX_SHARD_BYTES,
+    max_side=None,
+    quality=90,
+    skip_empty=True,
+    progress=None,
+    stop_event=None,
+):
+    """
+    Packs image + caption pairs into WebDataset tar shards.
+    Each sample is stored as <key>.<ext> and <key>.txt; a shard is closed when it
+    holds samples_per_shard samples or max_shard_bytes bytes. Shards are written
+    sequentially through a large buffer, and index.jsonl records the shard, the
+    data offset and the size of every member. Images are copied as is unless
+    max_side is set. Returns the list of written shards, or None if stopped.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if skip_empty:
+        image_paths = [path for path in image_paths if load_file_as_string(get_caption_path(path))]
+
+    shards = []
+    shard_file = tar = None
+    shard_samples = 0
+    stopped = False
+    with open(os.path.join(output_dir, INDEX_FILE_NAME), "w", encoding="utf-8") as index:
+        try:
+            for done, (image_path, data, extension) in enumerate(_iter_images(image_paths, max_side, quality), 1):
+                if stop_event is not None and stop_event.is_set():
+                    stopped = True
+                    break
+                caption = load_file_as_string(get_caption_path(image_path)).encode("utf-8")
+                if tar is not None and (
+                    shard_samples >= samples_per_shard or tar.offset + len(data) > max_shard_bytes
+                ):
+                    tar.close()
+                    shard_file.close()
+                    tar = None
+                if tar is None:
+                    shards.append(os.path.join(output_dir, SHARD_NAME_PATTERN.format(len(shards))))
+                    shard_file = open(shards[-1], "wb", buffering=WRITE_BUFFER_SIZE)
+                    tar = tarfile.open(fileobj=shard_file, mode="w")
+                    shard_samples = 0
+
+                key = _sample_key(image_path, folder_path)
+                shard_name = os.path.basename(shards[-1])
+                for name, member_data in ((f"{key}.{extension}", data), (f"{key}.txt", caption)):
+                    offset = _add_member(tar, name, member_data)
+                    index.write(json.dumps(
+                        {"shard": shard_name, "name": name, "offset": offset, "size": len(member_data)}
+                    ) + "\n")
+                shard_samples += 1
+                if progress is not None:
+                    progress(done, len(image_paths))
+        finally:
+            if tar is not None:
+                tar.close()
+                shard_file.close()
+    return None if stopped else shards
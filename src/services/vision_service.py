@@ -1,58 +1,44 @@
+import threading
 import time
 import os
+from concurrent.futures import CancelledError
 from src.models.florence2 import describe_image as describe_image_florence2
-from src.models.open_ai import describe_image as describe_image
 from src.models.pixtral import describe_image as describe_image_pixtral
+from src.services.batch_scheduler import BatchScheduler
+from src.services.caption_cleanup import get_inline_cleaner
+from src.services.caption_packing import PACKABLE_MODELS, build_packed_prompt, parse_packed_response
+from src.services.cancellation import is_cancelled, run_cancellable
+from src.services.caption_router import CaptionRoute, is_acceptable_caption
+from src.services.duplicates import copy_caption_to_duplicates
+from src.services.job_journal import JobJournal
+from src.services.latency import latency_tracker
+from src.services.metrics import TimingRecord, activate, metrics_recorder, stage
+from src.services.openai_client import OPENAI_COMPATIBLE_MODELS, describe_images, stream_image_description
+from src.services.prompt_template import compile_template, prompt_hash
+from src.services.retry import RetryBudget, RetryPolicy, call_with_retry, is_retryable
 from src.services.session_file import save_session
-from src.utils.utils import load_file_as_string, save_caption_to_file
+from src.utils.utils import get_caption_path, load_file_as_string, save_caption_to_file
 
 
-def get_caption(model, image_path, prompt):
+def describe_with_model(model, image_path, prompt):
+    """Send one image to the backend of the given model, raising on any error."""
+    if model == "Florence2":
+        return describe_image_florence2(image_path, prompt)
+    elif model == "Pixtral":
+        return describe_image_pixtral(image_path, prompt)
+    elif model in OPENAI_COMPATIBLE_MODELS:
+        # Shared client, the token usage of the reply is recorded
+        return describe_images(model, [image_path], prompt).strip()
+    raise ValueError(f"Unknown model: {model}")
+
+
+def get_caption(model, image_path, prompt, retry_policy=None, stop_event=None):
     try:
-        if model == "Florence2":
-            caption = describe_image_florence2(image_path, prompt)
-        elif model == "Pixtral":
-            caption = describe_image_pixtral(image_path, prompt)
-        elif model == "GPT-4.1":
-            caption = describe_image(
-                image_path,
-                "https://models.github.ai/inference",
-                "openai/gpt-4.1",
-                "GITHUB_TOKEN",
-                prompt,
-            )
-        elif model == "Qwen2.5 72B":
-            caption = describe_image(
-                image_path,
-                "https://openrouter.ai/api/v1",
-                "qwen/qwen2.5-vl-72b-instruct:free",
-                "OPENROUTER_API_KEY",
-                prompt,
-            )
-        elif model == "Gemini 2.5 Flash":
-            caption = describe_image(
-                image_path,
-                "https://generativelanguage.googleapis.com/v1beta/",
-                "gemini-2.5-flash",
-                "GEMINI_API_KEY",
-                prompt,
-            )
-        elif model == "Gemini 2.5 Pro":
-            caption = describe_image(
-                image_path,
-                "https://generativelanguage.googleapis.com/v1beta/",
-                "gemini-2.5-pro",
-                "GEMINI_API_KEY",
-                prompt,
-            )
-        elif model == "Grok":
-            caption = describe_image(
-                image_path,
-                "https://openrouter.ai/api/v1",
-                "x-ai/grok-4-fast:free",
-                "OPENROUTER_API_KEY",
-                prompt,
-            )
+        caption = call_with_retry(
+            lambda: describe_with_model(model, image_path, prompt),
+            retry_policy,
+            stop_event,
+        )
         print(caption)
         return caption
     except Exception as e:
@@ -60,56 +46,329 @@ def get_caption(model, image_path, prompt):
         return None  # Return None on error to be handled by calling function
 
 
+def has_caption_file(image_path):
+    """True if the caption file of an image is not empty, from its size alone."""
+    try:
+        return os.path.getsize(get_caption_path(image_path)) > 0
+    except OSError:
+        return False
+
+
 def save_caption(caption, image_path):
     save_caption_to_file(caption, image_path.rsplit(".", 1)[0] + ".txt")
 
 
-def debounce(self):
-    MIN_DELAY = 4.5  # 15 requests per minute = 4 seconds, plus 0.5s safety margin
-    current_time = time.time()
-    
-    if self.gpt_last_used:
-        time_diff = current_time - self.gpt_last_used
-        if time_diff < MIN_DELAY:
-            time.sleep(MIN_DELAY - time_diff)
-    
-    # Update timestamp AFTER sleep to reflect actual request time
-    self.gpt_last_used = time.time()
+MIN_DELAY = 4.5  # 15 requests per minute = 4 seconds, plus 0.5s safety margin
+_debounce_lock = threading.Lock()
+
+
+def debounce(self, stop_event=None):
+    # Requests of a race run in parallel threads, they must queue up here
+    with _debounce_lock:
+        current_time = time.time()
+
+        if self.gpt_last_used:
+            time_diff = current_time - self.gpt_last_used
+            if time_diff < MIN_DELAY:
+                # Waiting on the stop event lets a stop interrupt the delay
+                if stop_event is not None:
+                    if stop_event.wait(MIN_DELAY - time_diff):
+                        raise CancelledError("Cancelled while waiting for the rate limit")
+                else:
+                    time.sleep(MIN_DELAY - time_diff)
+
+        # Update timestamp AFTER sleep to reflect actual request time
+        self.gpt_last_used = time.time()
     save_session(self)
 
 
-def on_run_pressed(self, caption_mode, model, image_paths, index, prompt, llm_queue, stop_event):
+def rate_limit_slot_available(self):
+    """True if a request would pass debounce() now, without waiting."""
+    # A held lock means another request is already waiting for the next slot
+    if not _debounce_lock.acquire(blocking=False):
+        return False
+    try:
+        return not self.gpt_last_used or time.time() - self.gpt_last_used >= MIN_DELAY
+    finally:
+        _debounce_lock.release()
+
+
+def caption_image(
+    self, route, image_path, prompt, retry_policy, stop_event, rate_limited=True, record=None, on_text=None
+):
+    """Caption one image through the route's models, retrying each of them.
+
+    Returns (caption, model) and raises when every model of the route failed.
+    Stage timings are added to record when one is given. With on_text, the
+    OpenAI-compatible models stream their reply: on_text(None) is called when
+    an attempt starts, then on_text(piece) for each piece of text.
+    """
+    def describe(model, use_rate_limit, cancel_event, sent_event=None):
+        def attempt():
+            with activate(record):
+                # Every attempt, retries included, goes through the rate limiter
+                if rate_limited and use_rate_limit and model not in ["Florence2"]:
+                    with stage("queue"):
+                        debounce(self, stop_event)
+                if is_cancelled(cancel_event, stop_event):
+                    raise CancelledError(f"{model} request cancelled")
+                if sent_event is not None:
+                    sent_event.set() # Out of the rate limiter, the hedge clock starts now
+                image_time = record.image_time() if record else 0.0
+                start = time.perf_counter()
+                if on_text is not None and model in OPENAI_COMPATIBLE_MODELS:
+                    on_text(None) # A retry or a fallback model starts over
+
+                def call():
+                    with activate(record): # Stage timings are per thread
+                        if on_text is not None and model in OPENAI_COMPATIBLE_MODELS:
+                            return stream_image_description(model, image_path, prompt, on_text, stop_event)
+                        return describe_with_model(model, image_path, prompt)
+
+                # The request runs in a worker thread, a stop returns from here without waiting for it
+                try:
+                    caption = run_cancellable(call, cancel_event, stop_event)
+                except Exception as e:
+                    if record:
+                        outcome = "cancelled" if isinstance(e, CancelledError) else "failed"
+                        record.add_attempt(model, time.perf_counter() - start, outcome)
+                    raise
+                elapsed = time.perf_counter() - start
+                latency_tracker.record(model, elapsed)
+                if record:
+                    # Decode, resize and encode happen inside the call, the rest is the network.
+                    # Concurrent race or hedge calls share the image time, it is a close estimate.
+                    record.add_attempt(model, max(0.0, elapsed - (record.image_time() - image_time)))
+                return caption
+
+        return call_with_retry(attempt, retry_policy, stop_event, cancel_event)
+
+    def slot_available(model):
+        if not rate_limited or model in ["Florence2"]:
+            return True # Not rate limited
+        return rate_limit_slot_available(self)
+
+    caption, used_model = route.run(describe, slot_available)
+    if record:
+        record.use_attempt(used_model)
+    return caption, used_model
+
+
+def caption_pack(self, model, image_paths, prompts, retry_policy, stop_event, records):
+    """Caption several images with one request, taking a single rate-limit slot.
+
+    Returns the captions in image order and raises ValueError when the reply
+    cannot be split into one caption per image.
+    """
+    packed_prompt = build_packed_prompt(prompts)
+
+    def attempt():
+        start = time.perf_counter()
+        debounce(self, stop_event)
+        waited = time.perf_counter() - start
+        image_times = [record.image_time() for record in records]
+        start = time.perf_counter()
+        try:
+            reply = run_cancellable(
+                lambda: describe_images(model, image_paths, packed_prompt, records, json_output=True), stop_event
+            )
+        except Exception as e:
+            outcome = "cancelled" if isinstance(e, CancelledError) else "failed"
+            for record in records:
+                record.add_attempt(model, (time.perf_counter() - start) / len(records), outcome)
+            raise
+        elapsed = time.perf_counter() - start
+        # The request is shared, its queue and network time are split between the images
+        network = elapsed - sum(record.image_time() - t for record, t in zip(records, image_times))
+        for record in records:
+            record.add("queue", waited)
+            record.add_attempt(model, network / len(records))
+        return reply
+
+    captions = parse_packed_response(call_with_retry(attempt, retry_policy, stop_event), len(image_paths))
+    for record in records:
+        record.use_attempt(model)
+    return captions
+
+
+def skip_duplicates(self, image_paths, on_copy=None):
+    """
+    Drop near-duplicates from a batch when their caption comes from their group's
+    representative: either it is captioned in this batch (its caption is copied once
+    done), or it already has a caption. With on_copy, that existing caption is copied
+    now and on_copy(image_path, caption) is called for each image written; without
+    it nothing is written (e.g. for estimates). Members of a group whose representative
+    is neither stay in the batch.
+    """
+    pending = set(image_paths)
+    skipped = set()
+    for group in self.duplicate_groups:
+        representative, members = group[0], [path for path in group[1:] if path in pending]
+        if not members:
+            continue
+        if representative in pending:
+            skipped.update(members)
+            continue
+        caption = load_file_as_string(get_caption_path(representative))
+        if not caption:
+            continue
+        skipped.update(members)
+        if on_copy is not None:
+            for member in copy_caption_to_duplicates([representative] + members, caption):
+                on_copy(member, caption)
+    if not skipped:
+        return image_paths
+    kept = [path for path in image_paths if path not in skipped]
+    print(f"Skipping {len(image_paths) - len(kept)} near-duplicate image(s).")
+    return kept
+
+
+def on_run_pressed(
+    self, caption_mode, model, image_paths, index, prompt, llm_queue, stop_event, route=None, pack_size=1
+):
     caption = None
+    route = route or CaptionRoute([model])
+    template = compile_template(prompt) # Variables like {filename} or {caption} are filled per image
+    cleaner = get_inline_cleaner(self.caption_cleanup) # None when captions are saved as generated
     if caption_mode == "single":
         try:
-            caption = get_caption(model, image_paths[0], prompt)
+            record = TimingRecord(image_paths[0], route.models[0])
+            # Streamed text goes to the editor as it arrives; concurrent race or hedge calls would mix up
+            on_text = None
+            if not route.race and not route.hedge:
+                on_text = lambda text: llm_queue.put(("PARTIAL_CAPTION", (image_paths[0], text)))
+            caption, used_model = caption_image(
+                self, route, image_paths[0], template.render(image_paths[0]), RetryPolicy(), stop_event,
+                rate_limited=False, record=record, on_text=on_text
+            )
+            if caption and cleaner is not None:
+                caption = cleaner.clean(caption)
+            print(f"[{used_model}] {caption}")
             if caption:
-                save_caption(caption, image_paths[0])
+                with stage("write", record):
+                    save_caption(caption, image_paths[0])
+            record.finish(used_model)
+            metrics_recorder.add(record)
         except Exception as e:
+            if record.total is None:
+                record.finish(failed=True)
+                metrics_recorder.add(record)
             llm_queue.put(("ERROR", str(e)))
             return None
     else:
-        total_images = len(image_paths)
-        for i, img in enumerate(image_paths):
+        journal = JobJournal(self.current_folder)
+        # Only "all" runs replace the journaled run, a retry of the failures must not drop an interrupted one
+        journal_run = caption_mode == "all"
+        if journal_run and journal.has_pending_run():
+            # Resume the interrupted run without reading every caption file. Captions
+            # written since (by hand, by an import) are kept; a stat is enough to tell.
+            pending = [img for img in journal.pending_paths() if not has_caption_file(img)]
+            print(f"Resuming previous run: {len(pending)} image(s) left.")
+        else:
+            if caption_mode == "all":
+                # Check which caption files are empty, once per run
+                pending = [
+                    img for img in image_paths
+                    if load_file_as_string(img.rsplit(".", 1)[0] + ".txt") == ""
+                ]
+            else:
+                pending = list(image_paths)
+            pending = skip_duplicates(
+                self, pending, on_copy=lambda path, c: llm_queue.put(("UPDATE_CAPTION", (path, c)))
+            )
+            if journal_run:
+                journal.start_run(pending, " -> ".join(route.models))
+
+        def run_stats(done):
+            # The journal counts the images of its run, other runs only use its throughput
+            return journal.stats(remaining=None if journal_run else total_images - done)
+
+        groups_by_representative = {group[0]: group for group in self.duplicate_groups}
+        current_path = image_paths[index] if 0 <= index < len(image_paths) else None
+        total_images = len(pending)
+        # One retry budget for the whole run, so a dead provider cannot stall it forever
+        retry_policy = RetryPolicy(budget=RetryBudget())
+        if route.models[0] not in PACKABLE_MODELS or route.race:
+            pack_size = 1
+
+        def complete(img, c, used_model, record, image_prompt):
+            nonlocal caption
+            if c and cleaner is not None:
+                c = cleaner.clean(c)
+            print(f"[{used_model}] {c}")
+            if c:
+                with stage("write", record):
+                    save_caption(c, img)
+                llm_queue.put(("UPDATE_CAPTION", (img, c))) # Update UI for this image
+                if img in groups_by_representative:
+                    # Near-duplicates of this image reuse its caption instead of a request
+                    for member in copy_caption_to_duplicates(groups_by_representative[img], c):
+                        llm_queue.put(("UPDATE_CAPTION", (member, c)))
+            journal.mark_done(img, prompt_hash(image_prompt))
+            record.finish(used_model)
+            metrics_recorder.add(record)
+            # If the current image is the one selected in the UI, update the caption
+            if img == current_path:
+                caption = c
+
+        # The UI promotes the image on screen and its neighbours through self.batch_scheduler
+        scheduler = BatchScheduler(pending)
+        self.batch_scheduler = scheduler
+        start = 0 # Images taken from the scheduler so far
+        while True:
             if stop_event.is_set():
                 llm_queue.put(("ERROR", "Caption generation cancelled."))
                 break
 
-            llm_queue.put(("PROGRESS", (i + 1, total_images)))
-            
-            # Check if the caption file is empty
-            if load_file_as_string(img.rsplit(".", 1)[0] + ".txt") == "":
-                if model not in ["Florence2"]:
-                    debounce(self)
+            chunk = scheduler.pop(pack_size)
+            if not chunk:
+                if journal_run:
+                    journal.finish_run()
+                break
+            packed = {}
+            if len(chunk) > 1:
+                llm_queue.put(("PROGRESS", (start + len(chunk), total_images, run_stats(start))))
+                records = [TimingRecord(img, route.models[0]) for img in chunk]
+                try:
+                    for img in chunk:
+                        journal.mark_started(img)
+                    prompts = [template.render(img) for img in chunk]
+                    captions = caption_pack(self, route.models[0], chunk, prompts, retry_policy, stop_event, records)
+                    for img, c, record, image_prompt in zip(chunk, captions, records, prompts):
+                        if is_acceptable_caption(c, route.min_length):
+                            packed[img] = (c, record, image_prompt)
+                except Exception as e:
+                    if not stop_event.is_set():
+                        print(f"Packed request failed, captioning {len(chunk)} image(s) one by one: {e}")
+
+            for img in chunk:
+                if stop_event.is_set():
+                    break
+                if img in packed:
+                    c, record, image_prompt = packed[img]
+                    complete(img, c, route.models[0], record, image_prompt)
+                    continue
+
+                if len(chunk) == 1:
+                    llm_queue.put(("PROGRESS", (start + 1, total_images, run_stats(start))))
+                journal.mark_started(img)
+                record = TimingRecord(img, route.models[0])
                 try:
-                    c = get_caption(model, img, prompt)
-                    if c:
-                        save_caption(c, img)
-                        llm_queue.put(("UPDATE_CAPTION", (img, c))) # Update UI for this image
-                    # If the current image is the one selected in the UI, update the caption
-                    if i == index:
-                        caption = c
+                    image_prompt = template.render(img)
+                    c, used_model = caption_image(self, route, img, image_prompt, retry_policy, stop_event, record=record)
+                    complete(img, c, used_model, record, image_prompt)
                 except Exception as e:
-                    llm_queue.put(("ERROR", f"Error generating caption for {os.path.basename(img)}: {e}"))
-                    # Continue to next image even if one fails
+                    if stop_event.is_set():
+                        # Left in flight in the journal, so the next run picks it up again
+                        continue
+                    reason = "retries exhausted" if is_retryable(e) else "permanent error"
+                    record.finish(failed=True) # Kept so the failed attempts show in the performance panel
+                    metrics_recorder.add(record)
+                    print(f"Failed to caption {os.path.basename(img)} ({reason}): {e}")
+                    journal.mark_failed(img, f"{reason}: {e}")
+                    # Keep going, the image is added to the failure list for a separate re-run
+                    llm_queue.put(("FAILED", (img, f"{reason}: {e}")))
+            start += len(chunk)
+        if self.batch_scheduler is scheduler:
+            self.batch_scheduler = None
     return caption if caption is not None else ""
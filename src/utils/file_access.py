@@ -0,0 +1,65 @@
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Files smaller than this are simply read, mapping them costs more than it saves
+MMAP_THRESHOLD = 1024 * 1024
+
+# Size of the slices fed to the hasher
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def open_file_buffer(file_path):
+    """
+    Yields a read-only bytes-like view of a file's content.
+    Large files are memory-mapped, so their bytes are paged in by the OS on demand
+    instead of being copied into Python memory.
+    """
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                # The map cannot be closed while a view on it is still exported
+                view.release()
+
+
+def new_hasher():
+    """Returns (name, hasher) for the fastest content hash available."""
+    if blake3 is not None:
+        return "blake3", blake3.blake3()
+    if xxhash is not None:
+        return "xxh3_128", xxhash.xxh3_128()
+    return "blake2b", hashlib.blake2b(digest_size=16)
+
+
+def hash_file(file_path):
+    """
+    Hashes a file's content in one streaming pass over a memory map.
+    The digest is prefixed with the algorithm name, since the algorithm depends
+    on the optional packages installed.
+    """
+    name, hasher = new_hasher()
+    with open_file_buffer(file_path) as data:
+        for start in range(0, len(data), HASH_CHUNK_SIZE):
+            hasher.update(data[start:start + HASH_CHUNK_SIZE])
+    return f"{name}:{hasher.hexdigest()}"
@@ -0,0 +1,80 @@
+import os
+import struct
+
+from PIL import Image
+
+# JPEG start-of-frame markers, the ones carrying the image dimensions
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+HEADER_READ_SIZE = 64
+
+
+def _read_jpeg_size(f):
+    """Walk the JPEG segments up to the first start-of-frame marker."""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff": # Markers may be padded with extra 0xFF bytes
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7: # Markers without a length
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_webp_size(header):
+    chunk = header[12:16]
+    if chunk == b"VP8 " and len(header) >= 30:
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(header) >= 25:
+        bits = int.from_bytes(header[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(header) >= 30:
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def read_image_header(image_path):
+    """
+    Returns (format, width, height) parsed from the file header only.
+    JPEG, PNG, BMP and WebP are parsed directly; other formats fall back to a
+    lazy Pillow open, which also only reads the header.
+    """
+    with open(image_path, "rb") as f:
+        header = f.read(HEADER_READ_SIZE)
+        size = None
+        if header.startswith(b"\x89PNG\r\n\x1a\n") and header[12:16] == b"IHDR":
+            image_format = "PNG"
+            size = struct.unpack(">II", header[16:24])
+        elif header.startswith(b"\xff\xd8"):
+            image_format = "JPEG"
+            size = _read_jpeg_size(f)
+        elif header.startswith(b"BM") and len(header) >= 26:
+            image_format = "BMP"
+            width, height = struct.unpack("<ii", header[18:26])
+            size = (width, abs(height)) # Negative height means a top-down bitmap
+        elif header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+            image_format = "WEBP"
+            size = _read_webp_size(header)
+
+    if size is None:
+        with Image.open(image_path) as img:
+            return img.format, img.width, img.height
+    return image_format, int(size[0]), int(size[1])
@@ -0,0 +1,86 @@
+import numpy as np
+from PIL import Image
+
+# 8 rows of 8 horizontal gradients = 64-bit hash
+HASH_SIZE = 8
+
+# Rows compared at once when a bucket of candidates is large
+COMPARE_BLOCK_SIZE = 1024
+
+# Beyond this, chunks get under 9 bits and their buckets hold more than n/512
+# hashes each, so the search degrades towards comparing every pair
+MAX_DISTANCE = 6
+
+
+def load_hash_thumbnail(image_path, hash_size=HASH_SIZE):
+    """Decode an image straight to the tiny grayscale thumbnail used by dHash."""
+    with Image.open(image_path) as img:
+        # JPEGs are decoded at a reduced scale, which is most of the speedup
+        img.draft("L", (hash_size * 4, hash_size * 4))
+        img = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+        return np.asarray(img, dtype=np.int16)
+
+
+def dhash_batch(thumbnails):
+    """Vectorised dHash of a list of (hash_size, hash_size + 1) thumbnails, as uint64."""
+    stack = np.stack(thumbnails)
+    bits = stack[:, :, 1:] > stack[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(stack), -1), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def hamming_distances(hash_value, hashes):
+    """Hamming distance between one hash and an array of hashes."""
+    return np.bitwise_count(np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(hash_value)))
+
+
+def find_duplicate_groups(hashes, max_distance=4):
+    """
+    Groups hashes within max_distance bits of each other, returns lists of indices.
+    Uses multi-index hashing: the 64 bits are cut into max_distance + 1 chunks, and
+    two hashes that close must share at least one chunk exactly, so only hashes in
+    the same chunk bucket are compared. max_distance is at most MAX_DISTANCE.
+    """
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+    all_hashes = np.asarray(hashes, dtype=np.uint64)
+    if len(all_hashes) < 2:
+        return []
+    # Identical hashes (e.g. repeated frames) are grouped up front, only distinct values are compared
+    hashes, inverse = np.unique(all_hashes, return_inverse=True)
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    chunks = max_distance + 1
+    chunk_bits = 64 // chunks
+    for chunk in range(chunks):
+        start = chunk * chunk_bits
+        width = chunk_bits if chunk < chunks - 1 else 64 - start
+        keys = (hashes >> np.uint64(start)) & np.uint64((1 << width) - 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+        run_starts = np.concatenate(([0], boundaries))
+        run_ends = np.concatenate((boundaries, [len(keys)]))
+        shared = run_ends - run_starts >= 2
+        for run_start, run_end in zip(run_starts[shared].tolist(), run_ends[shared].tolist()):
+            run = order[run_start:run_end]
+            run_hashes = hashes[run]
+            for block_start in range(0, len(run), COMPARE_BLOCK_SIZE):
+                block = run[block_start:block_start + COMPARE_BLOCK_SIZE]
+                distances = np.bitwise_count(hashes[block][:, None] ^ run_hashes[None, :])
+                rows, columns = np.nonzero(distances <= max_distance)
+                for i, j in zip(block[rows].tolist(), run[columns].tolist()):
+                    root_i, root_j = find(i), find(j)
+                    if root_i != root_j:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for i, unique_index in enumerate(inverse.ravel().tolist()):
+        groups.setdefault(find(unique_index), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
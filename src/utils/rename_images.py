@@ -1,56 +1,165 @@
+import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def rename_files_to_numbers(folder_path):
-    image_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.JPG', '.JPEG', '.PNG', '.WEBP')
-    
-    # Get all image files and sort them naturally
+from src.services.folder_index import get_folder_index
+
+from .utils import get_state_dir, sort_files
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.JPG', '.JPEG', '.PNG', '.WEBP')
+
+RENAME_LOG_NAME = "rename.json"
+RENAME_TEMP_DIR_NAME = "rename-tmp"
+
+RENAME_WORKERS = 8
+
+
+def plan_renames(folder_path):
+    """
+    Returns the (source, destination) file names that number the images of the
+    folder in natural order, captions following their image. Files already at
+    their final name are left out.
+    """
     all_files_in_folder = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
-    image_files = [f for f in all_files_in_folder if f.lower().endswith(image_extensions)]
-    
-    # Sort files naturally to maintain a consistent order for renumbering
-    # We need to import sort_files from utils
-    from .utils import sort_files
-    sorted_image_files = sort_files([os.path.join(folder_path, f) for f in image_files])
-    
-    # Calculate padding length based on total number of files
-    padding = len(str(len(sorted_image_files)))
-
-    # Prepare a list of (original_full_path, new_base_name, suffix)
-    renaming_plan = []
-    for idx, original_full_path in enumerate(sorted_image_files, 1):
-        original_filename = os.path.basename(original_full_path)
-        suffix = Path(original_filename).suffix
+    image_files = sort_files([f for f in all_files_in_folder if f.lower().endswith(IMAGE_EXTENSIONS)])
+    existing = set(all_files_in_folder)
+
+    # Padding length based on total number of files
+    padding = len(str(len(image_files)))
+
+    moves = []
+    claimed_captions = set() # a.jpg and a.png share a.txt, it follows the first one
+    for idx, original_filename in enumerate(image_files, 1):
         new_number_str = str(idx).zfill(padding)
-        renaming_plan.append((original_full_path, new_number_str, suffix))
-
-    # First pass: Rename all files to temporary names to avoid conflicts
-    temp_renames = {}
-    for original_full_path, new_number_str, suffix in renaming_plan:
-        original_filename = os.path.basename(original_full_path)
-        temp_filename = f"temp_{new_number_str}{suffix}"
-        temp_full_path = os.path.join(folder_path, temp_filename)
-        
-        os.rename(original_full_path, temp_full_path)
-        temp_renames[temp_full_path] = (original_filename, new_number_str, suffix)
-
-        # Rename corresponding text file to a temporary name
-        original_text_path = os.path.splitext(original_full_path)[0] + '.txt'
-        if os.path.exists(original_text_path):
-            temp_text_filename = f"temp_{new_number_str}.txt"
-            temp_text_full_path = os.path.join(folder_path, temp_text_filename)
-            os.rename(original_text_path, temp_text_full_path)
-
-    # Second pass: Rename from temporary names to final desired names
-    for temp_full_path, (original_filename, new_number_str, suffix) in temp_renames.items():
-        final_filename = f"{new_number_str}{suffix}"
-        final_full_path = os.path.join(folder_path, final_filename)
-        
-        os.rename(temp_full_path, final_full_path)
-
-        # Rename corresponding temporary text file to final name
-        temp_text_full_path = os.path.splitext(temp_full_path)[0] + '.txt'
-        if os.path.exists(temp_text_full_path):
-            final_text_filename = f"{new_number_str}.txt"
-            final_text_full_path = os.path.join(folder_path, final_text_filename)
-            os.rename(temp_text_full_path, final_text_full_path)
+        moves.append((original_filename, f"{new_number_str}{Path(original_filename).suffix}"))
+        caption_filename = Path(original_filename).stem + ".txt"
+        if caption_filename in existing and caption_filename not in claimed_captions:
+            claimed_captions.add(caption_filename)
+            moves.append((caption_filename, f"{new_number_str}.txt"))
+    moves = [(source, destination) for source, destination in moves if source != destination]
+
+    # A destination may only be taken by a file that moves away, never overwritten
+    sources = {source for source, _ in moves}
+    for _, destination in moves:
+        if destination in existing and destination not in sources:
+            raise FileExistsError(f"Cannot rename to {destination}, a file with this name already exists.")
+    return moves
+
+
+class RenameTransaction:
+    """Two-phase rename of files within a folder, recoverable after a crash.
+
+    The plan is written to rename.json before any file is touched. Phase 1 moves
+    every source into a temporary folder of the state directory, phase 2 moves
+    them to their destinations, so names can be swapped freely. Each rename is
+    atomic and temporary names are unique, so the logged phase plus the presence
+    of the temporary files tell exactly which moves are done.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.log_path = os.path.join(get_state_dir(folder_path), RENAME_LOG_NAME)
+        self.temp_dir = os.path.join(get_state_dir(folder_path), RENAME_TEMP_DIR_NAME)
+        self.moves = []
+        self.phase = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.moves = [tuple(move) for move in data["moves"]]
+            self.phase = data["phase"]
+
+    def is_pending(self):
+        """Whether an interrupted rename is waiting to be resumed or rolled back."""
+        return self.phase > 0
+
+    def _write_log(self):
+        temp_path = self.log_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"moves": self.moves, "phase": self.phase}, f)
+            f.flush()
+            os.fsync(f.fileno()) # The intent must be on disk before files move
+        os.replace(temp_path, self.log_path)
+
+    def _source(self, i):
+        return os.path.join(self.folder_path, self.moves[i][0])
+
+    def _temp(self, i):
+        return os.path.join(self.temp_dir, str(i))
+
+    def _destination(self, i):
+        return os.path.join(self.folder_path, self.moves[i][1])
+
+    def _rename_all(self, pairs):
+        """Run independent renames in a thread pool (they mostly wait on the file system)."""
+        with ThreadPoolExecutor(max_workers=RENAME_WORKERS) as executor:
+            list(executor.map(lambda pair: os.rename(*pair), pairs))
+
+    def begin(self, moves):
+        """Log the plan, then run it."""
+        if self.is_pending():
+            raise RuntimeError("An interrupted rename must be resumed or rolled back first.")
+        self.moves = list(moves)
+        self.phase = 1
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._write_log()
+        self.resume()
+
+    def resume(self):
+        """Finish the logged renames from where they stopped."""
+        if self.phase == 1:
+            os.makedirs(self.temp_dir, exist_ok=True)
+            self._rename_all(
+                (self._source(i), self._temp(i))
+                for i in range(len(self.moves))
+                if not os.path.exists(self._temp(i)) and os.path.exists(self._source(i))
+            )
+            self.phase = 2
+            self._write_log()
+        if self.phase == 2:
+            self._rename_all(
+                (self._temp(i), self._destination(i)) for i in range(len(self.moves)) if os.path.exists(self._temp(i))
+            )
+            # Cached values (hashes, metadata...) follow their file
+            index = get_folder_index(self.folder_path)
+            index.rename(self.renamed_paths())
+            index.save()
+        self._finish()
+
+    def rollback(self):
+        """Put every logged file back under its original name."""
+        if self.phase == 2:
+            # Files already at their destination go back through the temporary folder
+            self._rename_all(
+                (self._destination(i), self._temp(i))
+                for i in range(len(self.moves))
+                if not os.path.exists(self._temp(i)) and os.path.exists(self._destination(i))
+            )
+        if self.phase > 0:
+            self._rename_all(
+                (self._temp(i), self._source(i)) for i in range(len(self.moves)) if os.path.exists(self._temp(i))
+            )
+        self._finish()
+
+    def _finish(self):
+        self.phase = 0
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def renamed_paths(self):
+        """Return {old_path: new_path} of the logged moves."""
+        return {self._source(i): self._destination(i) for i in range(len(self.moves))}
+
+
+def rename_files_to_numbers(folder_path):
+    """
+    Renames the images of the folder to numbers, with their captions.
+    Returns {old_path: new_path} of the renamed files.
+    """
+    transaction = RenameTransaction(folder_path)
+    moves = plan_renames(folder_path)
+    if moves:
+        transaction.begin(moves)
+    return transaction.renamed_paths()
@@ -3,130 +3,194 @@ import subprocess
 import tkinter as tk
 import threading
 import queue
+from collections import OrderedDict
 
 from PIL import Image,  ImageTk
 
+# Rows have a fixed height, so the position of any item is known without laying it out
+ROW_HEIGHT = 58
+THUMBNAIL_SIZE = 50
+# Thumbnails kept in memory, the least recently shown are dropped first
+THUMBNAIL_CACHE_SIZE = 512
 
-class ThumbnailItem(tk.Frame):
-    def __init__(
-            self, parent, image_path, text, thumbnail_size=(50, 50), listbox=None
-    ):
-        super().__init__(parent, bd=1, relief="solid")
-        
-        # Store the listbox reference and image path
+
+def resize_to_square(image, size):
+    """Resize image to a square aspect ratio using BoxFit.cover effect"""
+    width, height = image.size
+    ratio = max(size / width, size / height)
+    new_width = int(width * ratio)
+    new_height = int(height * ratio)
+    resized_image = image.resize((new_width, new_height), Image.LANCZOS)
+
+    # Crop the image to fit the square
+    left = (new_width - size) / 2
+    top = (new_height - size) / 2
+    right = (new_width + size) / 2
+    bottom = (new_height + size) / 2
+    cropped_image = resized_image.crop((left, top, right, bottom))
+
+    return cropped_image
+
+
+class ThumbnailItem:
+    """An image of the list. Items have no widget of their own, a ThumbnailRow shows them while in view."""
+
+    def __init__(self, image_path, text, listbox=None):
         self.listbox = listbox
         self.image_path = image_path
-        self.thumbnail_size = thumbnail_size
-        self.photo = None # To hold the ImageTk.PhotoImage
+        self.name = text
+        self.index = None # Position in the listbox, None while hidden
+        self.bg = "gray25"
+        self.fg = "white"
+        self.row = None # Row showing the item, None while out of view
+
+    def set_bg_color(self, color, fg="white"):
+        self.bg = color
+        self.fg = fg
+        if self.row is not None:
+            self.row.show_colors()
+
+
+class ThumbnailRow(tk.Frame):
+    """Widget showing one item. The listbox keeps a few and moves them along as the list scrolls."""
+
+    def __init__(self, parent, listbox):
+        super().__init__(parent, bd=1, relief="solid", bg="gray25")
+        self.listbox = listbox
+        self.item = None
 
-        # Create and pack widgets
         self.image_label = tk.Label(self)
         self.image_label.pack(side="left", padx=2, pady=2)
         self.image_label.bind("<Button-1>", self._on_click)
         self.image_label.bind("<Double-Button-1>", self._on_double_click)
 
-        self.text_label = tk.Label(self, text=text, anchor="w", bg='gray25', fg='white')
+        self.text_label = tk.Label(self, anchor="w", bg='gray25', fg='white')
         self.text_label.pack(side="left", fill="x", expand=True, padx=2)
         self.text_label.bind("<Button-1>", self._on_click)
-
-        self.configure(bg="gray25")
-        
-        # Start thumbnail loading in a separate thread
-        self.load_thumbnail_thread = threading.Thread(target=self._load_thumbnail_in_background)
-        self.load_thumbnail_thread.daemon = True
-        self.load_thumbnail_thread.start()
-
-    def _load_thumbnail_in_background(self):
-        """Load and resize thumbnail in a background thread."""
-        try:
-            image = Image.open(self.image_path)
-            image = self._resize_to_square(image, self.thumbnail_size[0])
-            # Use a queue to pass the PhotoImage back to the main thread
-            self.listbox.captioner.root.after(0, self._update_thumbnail_on_main_thread, image)
-        except Exception as e:
-            print(f"Error loading thumbnail for {self.image_path}: {e}")
-
-    def _update_thumbnail_on_main_thread(self, image):
-        """Update the thumbnail on the main Tkinter thread."""
-        self.photo = ImageTk.PhotoImage(image)
-        self.image_label.config(image=self.photo)
-        self.image_label.image = self.photo # Keep reference
+        self.bind("<Button-1>", self._on_click)
+
+    def show(self, item):
+        """Show another item, None to show nothing. Its thumbnail is set apart, with set_image."""
+        if self.item is not None and self.item.row is self:
+            self.item.row = None
+        self.item = item
+        if item is None:
+            return
+        item.row = self
+        self.text_label.config(text=item.name)
+        self.show_colors()
+
+    def set_image(self, photo):
+        self.image_label.config(image=photo)
+        self.image_label.image = photo # Keep reference
+
+    def show_colors(self):
+        self.configure(bg=self.item.bg)
+        self.text_label.configure(bg=self.item.bg, fg=self.item.fg)
 
     def _on_click(self, event):
-        if self.listbox:
-            self.listbox._on_select(self.listbox.items.index(self))
+        if self.item is not None and self.item.index is not None:
+            self.listbox._on_select(self.item.index)
 
     def _on_double_click(self, event):
         """Open the image file with the default system application."""
-        if self.image_path and os.path.exists(self.image_path):
+        if self.item is not None and os.path.exists(self.item.image_path):
             try:
-                subprocess.run(['open', self.image_path])
+                subprocess.run(['open', self.item.image_path])
             except Exception as e:
                 print(f"Error opening image: {e}")
 
-    
-
-    def set_bg_color(self, color, fg="white"):
-        self.configure(bg=color)
-        self.text_label.configure(bg=color, fg=fg)
-
-    def _resize_to_square(self, image, size):
-        """Resize image to a square aspect ratio using BoxFit.cover effect"""
-        width, height = image.size
-        ratio = max(size / width, size / height)
-        new_width = int(width * ratio)
-        new_height = int(height * ratio)
-        resized_image = image.resize((new_width, new_height), Image.LANCZOS)
-
-        # Crop the image to fit the square
-        left = (new_width - size) / 2
-        top = (new_height - size) / 2
-        right = (new_width + size) / 2
-        bottom = (new_height + size) / 2
-        cropped_image = resized_image.crop((left, top, right, bottom))
-
-        return cropped_image
-    
 
 class ThumbnailListbox(tk.Frame):
+    """List of images with their thumbnails, virtualized.
+
+    Only the rows in view have widgets: a small pool of ThumbnailRow placed on
+    the canvas at the position of the items they show, and rebound to other
+    items as the list scrolls. Loading, filtering or sorting any number of
+    images only updates lists of items and the scroll region. Thumbnails are
+    loaded in the background for the rows shown, newest request first.
+    """
+
     def __init__(self, parent, captioner, width=300):
         super().__init__(parent)
         self.captioner = captioner
 
         # Create canvas and scrollbar
-        self.canvas = tk.Canvas(self, width=width)
+        self.canvas = tk.Canvas(self, width=width, yscrollincrement=ROW_HEIGHT)
         self.scrollbar = tk.Scrollbar(
             self, orient="vertical", command=self.canvas.yview
         )
-        self.scrollable_frame = tk.Frame(self.canvas)
 
-        # Configure canvas
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-        self.canvas_frame = self.canvas.create_window(
-            (0, 0), window=self.scrollable_frame, anchor="nw"
-        )
+        # Configure canvas, any change of the view renders the rows again
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
 
         # Pack widgets
         self.canvas.pack(side="left", fill="both", expand=True)
         self.scrollbar.pack(side="right", fill="y")
 
         # Bind events
-        self.scrollable_frame.bind("<Configure>", self._on_frame_configure)
         self.canvas.bind("<Configure>", self._on_canvas_configure)
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
 
         # Initialize variables
-        self.items = []
+        self.items = [] # Items shown, in display order, each knowing its index
+        self.all_items = [] # Every item, in load order, hidden ones included
+        self.item_by_path = {} # Image path -> item, hidden ones included
         self.selected_index = None
         self.selected_item = None
+        self.rows = [] # Pool of (row, canvas window), enough to fill the view
+        self.render_pending = False
+
+        self.placeholder = tk.PhotoImage(width=THUMBNAIL_SIZE, height=THUMBNAIL_SIZE)
+        self.thumbnails = OrderedDict() # Item -> PhotoImage
+        self.requested = set() # Items whose thumbnail is loading, or failed to
+        self.thumbnail_queue = queue.LifoQueue()
+        self.thumbnail_thread = threading.Thread(target=self._load_thumbnails_in_background)
+        self.thumbnail_thread.daemon = True
+        self.thumbnail_thread.start()
 
     def insert(self, image_path, text):
-        item = ThumbnailItem(self.scrollable_frame, image_path, text, listbox=self)
-        item.pack(fill="x", padx=2, pady=1)
-        item.bind("<Button-1>", lambda e, idx=len(self.items): self._on_select(idx))
+        item = ThumbnailItem(image_path, text, listbox=self)
+        item.index = len(self.items)
         self.items.append(item)
+        self.all_items.append(item)
+        self.item_by_path[image_path] = item
+        self._refresh()
         return item
 
+    def clear(self):
+        """Remove every item, hidden ones included."""
+        self.items = []
+        self.all_items = []
+        self.item_by_path = {}
+        self.selected_index = None
+        self.selected_item = None
+        self.thumbnails.clear()
+        self.requested.clear()
+        self._refresh()
+
+    def _reindex(self):
+        """Store each shown item's index, after the shown items changed."""
+        for item in self.all_items:
+            item.index = None
+        for idx, item in enumerate(self.items):
+            item.index = idx
+        self.selected_index = self.selected_item.index if self.selected_item is not None else None
+
+    def find_item(self, image_path):
+        """Item of an image, shown or not, None if it is not in the list."""
+        return self.item_by_path.get(image_path)
+
+    def set_item_path(self, item, image_path):
+        """Point an item to a renamed image. Renames may swap names, so the old entry is only dropped if it is still this item's."""
+        if self.item_by_path.get(item.image_path) is item:
+            del self.item_by_path[item.image_path]
+        item.image_path = image_path
+        item.name = os.path.basename(image_path)
+        if item.row is not None:
+            item.row.text_label.config(text=item.name)
+        self.item_by_path[image_path] = item
+
     def delete(self, first, last=None):
         # Convert string indices to integers
         if first == "0":
@@ -139,31 +203,131 @@ class ThumbnailListbox(tk.Frame):
         elif last is None:
             last = first
 
-        for idx in range(first, last + 1):
-            if idx < len(self.items):
-                self.items[idx].destroy()
-
-        self.items = self.items[:first] + self.items[last + 1 :]
-        self.selected_index = None
-        self.selected_item = None
+        self.delete_items(self.items[first : last + 1])
+
+    def delete_items(self, items):
+        """Remove several items at once, the lists and indices are rebuilt a single time."""
+        removed = set(items)
+        if not removed:
+            return
+        for item in removed:
+            if self.item_by_path.get(item.image_path) is item:
+                del self.item_by_path[item.image_path]
+            self.thumbnails.pop(item, None)
+        self.items = [item for item in self.items if item not in removed]
+        self.all_items = [item for item in self.all_items if item not in removed]
+        if self.selected_item in removed:
+            self.selected_item = None
+        self._reindex()
+        self._refresh()
+
+    def reorder(self, items):
+        """Show the items in a new order, the rows in view are rebound to them."""
+        self.items = items
+        self._reindex()
+        self._refresh()
+
+    def set_view(self, items):
+        """Show only the given items, in this order. The others are hidden, not removed."""
+        if items == self.items:
+            return
+        if self.selected_item is not None and self.selected_item not in items:
+            # The selection is filtered out, the displayed image stays as it is
+            self.captioner.check_and_color_item(self.selected_item, self.selected_item.image_path)
+            self.selected_index = None
+            self.selected_item = None
+        self.reorder(items)
+        if self.selected_index is not None:
+            self.see(self.selected_index)
+        else:
+            self.canvas.yview_moveto(0)
+
+    def _refresh(self):
+        """Fit the scroll region to the items shown, then render the rows."""
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), len(self.items) * ROW_HEIGHT))
+        self._schedule_render()
+
+    def _schedule_render(self):
+        """Render once the pending events are handled, however many changes come before."""
+        if not self.render_pending:
+            self.render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        """Bind the pooled rows to the items in view and place them at their positions."""
+        self.render_pending = False
+        width = self.canvas.winfo_width()
+        count = max(self.canvas.winfo_height(), ROW_HEIGHT) // ROW_HEIGHT + 2
+        while len(self.rows) < count:
+            row = ThumbnailRow(self.canvas, self)
+            window = self.canvas.create_window(0, 0, window=row, anchor="nw", state="hidden")
+            self.rows.append((row, window))
+
+        first = max(0, int(self.canvas.canvasy(0)) // ROW_HEIGHT)
+        last = min(first + len(self.rows), len(self.items))
+        shown = set()
+        for index in range(first, last):
+            # Each index keeps the same row while it stays in view, scrolling rebinds only the rows that wrap around
+            row, window = self.rows[index % len(self.rows)]
+            item = self.items[index]
+            if row.item is not item:
+                row.show(item) # Bound first, the loader skips items with no row
+                row.set_image(self._get_thumbnail(item))
+            self.canvas.coords(window, 0, index * ROW_HEIGHT)
+            self.canvas.itemconfigure(window, width=width, height=ROW_HEIGHT - 2, state="normal")
+            shown.add(window)
+        for row, window in self.rows:
+            if window not in shown:
+                row.show(None)
+                self.canvas.itemconfigure(window, state="hidden")
+
+    def _get_thumbnail(self, item):
+        """Thumbnail of an item, the placeholder while it loads."""
+        photo = self.thumbnails.get(item)
+        if photo is not None:
+            self.thumbnails.move_to_end(item)
+            return photo
+        if item not in self.requested:
+            self.requested.add(item)
+            self.thumbnail_queue.put(item)
+        return self.placeholder
+
+    def _load_thumbnails_in_background(self):
+        """Load and resize thumbnails in a background thread."""
+        while True:
+            item = self.thumbnail_queue.get()
+            if item.row is None:
+                # Scrolled out of view before its turn, requested again if it comes back
+                self.captioner.root.after(0, self.requested.discard, item)
+                continue
+            try:
+                with Image.open(item.image_path) as image:
+                    thumbnail = resize_to_square(image, THUMBNAIL_SIZE)
+                self.captioner.root.after(0, self._set_thumbnail, item, thumbnail)
+            except Exception as e:
+                print(f"Error loading thumbnail for {item.image_path}: {e}")
+
+    def _set_thumbnail(self, item, image):
+        """Store a loaded thumbnail, on the main Tkinter thread."""
+        self.requested.discard(item)
+        if self.item_by_path.get(item.image_path) is not item:
+            return # Removed while loading
+        photo = ImageTk.PhotoImage(image)
+        self.thumbnails[item] = photo
+        while len(self.thumbnails) > THUMBNAIL_CACHE_SIZE:
+            self.thumbnails.popitem(last=False)
+        if item.row is not None:
+            item.row.set_image(photo)
 
     def _on_select(self, index):
         if self.selected_item:
-            try:
-                # Get the file path of the deselected item
-                file_name = self.get(self.selected_index)
-                file_path = self.captioner.file_map[file_name]
-                # Check and restore the correct background color
-                self.captioner.check_and_color_item(self.selected_item, file_path)
-            except (tk.TclError, KeyError):
-                # Ignore the error if the item has been destroyed or not in file_map
-                pass
+            # Check and restore the correct background color of the deselected item
+            self.captioner.check_and_color_item(self.selected_item, self.selected_item.image_path)
 
         if 0 <= index < len(self.items):
             self.selected_index = index
             self.selected_item = self.items[index]
-            self.selected_item.configure(bg="lavender blush")
-            self.selected_item.text_label.configure(bg='lavender blush', fg='black')
+            self.selected_item.set_bg_color("lavender blush", fg="black")
 
             # Generate virtual event
             self.event_generate("<<ListboxSelect>>")
@@ -184,14 +348,14 @@ class ThumbnailListbox(tk.Frame):
 
         # If only first parameter is provided and it's an integer
         if last is None and isinstance(first, int):
-            return self.items[first].text_label["text"]
+            return self.items[first].name
 
         # If both parameters are provided, return a list of items
         if last is not None:
-            return [item.text_label["text"] for item in self.items[first : last + 1]]
+            return [item.name for item in self.items[first : last + 1]]
 
         # If only first parameter is provided and we want all items
-        return [item.text_label["text"] for item in self.items]
+        return [item.name for item in self.items]
 
     def select_set(self, first, last=None):
         # Convert string indices to integers
@@ -212,18 +376,20 @@ class ThumbnailListbox(tk.Frame):
 
     def select_clear(self, first, last=None):
         if self.selected_item:
-            self.selected_item.configure(bg="white")
+            self.selected_item.set_bg_color("white", fg=self.selected_item.fg)
             self.selected_index = None
             self.selected_item = None
 
     def size(self):
         return len(self.items)
 
-    def _on_frame_configure(self, event):
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._schedule_render()
 
     def _on_canvas_configure(self, event):
-        self.canvas.itemconfig(self.canvas_frame, width=event.width)
+        self.canvas.configure(scrollregion=(0, 0, event.width, len(self.items) * ROW_HEIGHT))
+        self._schedule_render()
 
     def _on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
@@ -231,9 +397,7 @@ class ThumbnailListbox(tk.Frame):
     def see(self, index):
         """Scroll to make the item at index visible"""
         if 0 <= index < len(self.items):
-            item = self.items[index]
-            bbox = self.canvas.bbox(self.canvas_frame)
-            if bbox:
-                item_y = item.winfo_y()
-                #canvas_height = self.canvas.winfo_height()
-                self.canvas.yview_moveto(item_y / bbox[3])
+            top = self.canvas.canvasy(0)
+            y = index * ROW_HEIGHT
+            if y < top or y + ROW_HEIGHT > top + self.canvas.winfo_height():
+                self.canvas.yview_moveto(y / (len(self.items) * ROW_HEIGHT))
@@ -1,22 +1,61 @@
+import binascii
 import glob
 import os
 import re
-import base64
 import io
-import tempfile
+from contextlib import nullcontext
 from mimetypes import guess_type
 from PIL import Image
 
+from src.utils.file_access import open_file_buffer
+
+# Name of the hidden folder holding per-dataset state (journal, index...)
+STATE_DIR_NAME = ".yofardev-captioner"
+
 # Define the maximum image size in bytes (10MB)
 MAX_IMAGE_SIZE_BYTES = 5 * 1024 * 1024
 
-def extract_first_sentence(text):
-    match = re.match(r"([^.!?]*[.!?])", text)
-    if match:
-        return match.group(1).strip()
+# A sentence ends at its final punctuation ("..." or "?!" included) followed by a space or the end
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+(?=\s|$)")
+# Abbreviations whose period does not end a sentence
+ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "prof", "st", "mt", "jr", "sr", "vs", "e.g", "i.e"}
+LAST_WORD_PATTERN = re.compile(r"[\w.]+$")
+
+def ends_with_abbreviation(text):
+    """Tell whether text ends with an abbreviation ("Dr", "e.g") or an initial ("J"), its period left out."""
+    match = LAST_WORD_PATTERN.search(text)
+    if not match:
+        return False
+    word = match.group(0)
+    return word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper())
+
+def extract_sentences(text, count):
+    """
+    Return the first count sentences of a text, None if it has no complete sentence.
+    An unfinished last sentence is kept when the text has fewer than count sentences.
+    """
+    sentences = []
+    start = end = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        if match.group(0) == "." and ends_with_abbreviation(text[start:match.start()]):
+            continue
+        sentence = text[start:match.end()].strip()
+        start = match.end()
+        if sentence.strip(".!?"): # Skip stray punctuation
+            sentences.append(sentence)
+            end = start
+            if len(sentences) >= count:
+                break
+    if sentences and len(sentences) < count and text[end:].strip():
+        sentences.append(text[end:].strip())
+    if sentences:
+        return " ".join(sentences)
     else:
         return None
 
+def extract_first_sentence(text):
+    return extract_sentences(text, 1)
+
 
 def get_substring_starting_from_word(text, word):
     index = text.find(word)
@@ -65,98 +104,138 @@ def load_file_as_string(file_path):
     except FileNotFoundError:
         return ""
     
+def get_caption_path(image_path):
+    """Return the path of the .txt caption file next to an image."""
+    return os.path.splitext(image_path)[0] + ".txt"
+
 def check_file_exists(file_path):
     return os.path.isfile(file_path)
 
-# Function to encode a local image into data URL 
-def local_image_to_data_url(image_path):
-    mime_type, _ = guess_type(image_path)
-    if mime_type is None:
-        mime_type = 'application/octet-stream'  # Default MIME type if none is found
-    with open(image_path, "rb") as image_file:
-        base64_encoded_data = base64.b64encode(image_file.read()).decode('utf-8')
-    return f"data:{mime_type};base64,{base64_encoded_data}"
+def get_state_dir(folder_path, create=True):
+    """Return the hidden state folder of a dataset folder, creating it if needed (and asked)."""
+    state_dir = os.path.join(folder_path, STATE_DIR_NAME)
+    if create:
+        os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+# Base64 is encoded chunk by chunk; the chunk size must be a multiple of 3
+ENCODE_CHUNK_SIZE = 3 * 256 * 1024
+
+def no_timer(stage_name):
+    """Default timing hook: times nothing."""
+    return nullcontext()
 
-def resize_image_if_needed(image_path, max_size_bytes=MAX_IMAGE_SIZE_BYTES):
+def resize_image_to_buffer(image_path, max_size_bytes=MAX_IMAGE_SIZE_BYTES, timer=no_timer):
     """
-    Resizes an image if its file size exceeds max_size_bytes.
-    Returns the path to the (potentially temporary) resized image.
+    Re-encodes an image in memory if its file size exceeds max_size_bytes.
+    Returns (buffer, mime_type) where buffer is a BytesIO, or (None, None) when
+    the original file can be sent as is. timer(stage_name) returns a context
+    manager timing the "decode" and "resize" steps.
     """
     file_size = os.path.getsize(image_path)
 
     if file_size <= max_size_bytes:
-        return image_path, False # No resize needed, return original path and a flag
+        return None, None # No resize needed
 
     print(f"Image {image_path} is too large ({file_size / (1024 * 1024):.2f} MB). Resizing...")
 
     try:
         with Image.open(image_path) as img:
+            with timer("decode"):
+                img.load()
             # Determine initial quality/scale
             quality = 90
             scale_factor = 0.9
 
-            # Create a temporary file to save the resized image
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(image_path)[1])
-            temp_path = temp_file.name
-            temp_file.close()
-
             # Iteratively reduce quality/scale until size is acceptable
-            while True:
-                # Save to a buffer to check size without writing to disk repeatedly
-                img_byte_arr = io.BytesIO()
-                
-                # Handle different image formats
-                if img.mode in ("RGBA", "P"): # PNGs and images with alpha channel
-                    img.save(img_byte_arr, format='PNG', optimize=True)
-                else: # JPEGs and other formats
-                    img.save(img_byte_arr, format='JPEG', quality=quality, optimize=True)
-                
-                current_size = img_byte_arr.tell()
-
-                if current_size <= max_size_bytes:
-                    # Write the content from buffer to the temporary file
-                    with open(temp_path, 'wb') as f:
-                        f.write(img_byte_arr.getvalue())
-                    print(f"Resized image saved to {temp_path} with size {current_size / (1024 * 1024):.2f} MB")
-                    return temp_path, True # Return temporary path and a flag indicating resize happened
-
-                # Reduce quality or scale down if still too large
-                if quality > 10:
-                    quality -= 10
-                else:
-                    # If quality is already low, start scaling down dimensions
-                    new_width = int(img.width * scale_factor)
-                    new_height = int(img.height * scale_factor)
-                    if new_width < 100 or new_height < 100: # Prevent image from becoming too small
-                        print("Warning: Image could not be resized to fit within limits without becoming too small.")
-                        # As a last resort, save with lowest quality and current dimensions
-                        with open(temp_path, 'wb') as f:
-                            f.write(img_byte_arr.getvalue())
-                        return temp_path, True
-                    img = img.resize((new_width, new_height), Image.LANCZOS)
-                    scale_factor -= 0.1 # Further reduce scale for next iteration
-                    quality = 90 # Reset quality for new dimensions
+            with timer("resize"):
+                while True:
+                    # Save to a buffer to check size without writing to disk
+                    img_byte_arr = io.BytesIO()
+
+                    # Handle different image formats
+                    if img.mode in ("RGBA", "P"): # PNGs and images with alpha channel
+                        img.save(img_byte_arr, format='PNG', optimize=True)
+                        mime_type = "image/png"
+                    else: # JPEGs and other formats
+                        img.save(img_byte_arr, format='JPEG', quality=quality, optimize=True)
+                        mime_type = "image/jpeg"
+
+                    current_size = img_byte_arr.tell()
+
+                    if current_size <= max_size_bytes:
+                        print(f"Resized image {image_path} to {current_size / (1024 * 1024):.2f} MB")
+                        return img_byte_arr, mime_type
+
+                    # Reduce quality or scale down if still too large
+                    if quality > 10:
+                        quality -= 10
+                    else:
+                        # If quality is already low, start scaling down dimensions
+                        new_width = int(img.width * scale_factor)
+                        new_height = int(img.height * scale_factor)
+                        if new_width < 100 or new_height < 100: # Prevent image from becoming too small
+                            print("Warning: Image could not be resized to fit within limits without becoming too small.")
+                            # As a last resort, send the lowest quality at the current dimensions
+                            return img_byte_arr, mime_type
+                        img = img.resize((new_width, new_height), Image.LANCZOS)
+                        scale_factor -= 0.1 # Further reduce scale for next iteration
+                        quality = 90 # Reset quality for new dimensions
 
     except Exception as e:
         print(f"Error resizing image {image_path}: {e}")
-        return image_path, False # Fallback to original if resize fails
+        return None, None # Fallback to original if resize fails
 
-def local_image_to_data_url(image_path):
+def encode_data_url(source, mime_type, size=None):
     """
-    Encodes a local image into a data URL, resizing it if necessary.
+    Encodes a bytes-like object (bytes, memoryview...) or a binary stream into a data URL.
+    The base64 text is written chunk by chunk into one preallocated buffer. Streams
+    are read chunk by chunk and closed before the final string is built, so the raw
+    image is never held twice and at most two full-size copies exist at once.
     """
-    resized_path, was_resized = resize_image_if_needed(image_path)
-    
-    mime_type, _ = guess_type(resized_path)
+    view = None
+    if hasattr(source, "read"):
+        if size is None:
+            size = source.seek(0, os.SEEK_END)
+            source.seek(0)
+        chunks = iter(lambda: source.read(ENCODE_CHUNK_SIZE), b"")
+    else:
+        view = memoryview(source)
+        size = len(view)
+        chunks = (view[start:start + ENCODE_CHUNK_SIZE] for start in range(0, size, ENCODE_CHUNK_SIZE))
+
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    encoded = bytearray(len(prefix) + 4 * ((size + 2) // 3))
+    encoded[:len(prefix)] = prefix
+    position = len(prefix)
+    for chunk in chunks:
+        chunk = binascii.b2a_base64(chunk, newline=False)
+        encoded[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    del encoded[position:] # In case the source was shorter than announced
+
+    if view is not None:
+        view.release() # Lets the caller close a memory map right away
+    else:
+        source.close() # Frees an in-memory buffer before the string copy is made
+    return encoded.decode("ascii")
+
+def local_image_to_data_url(image_path, timer=no_timer):
+    """
+    Encodes a local image into a data URL, resizing it in memory if necessary.
+    timer(stage_name) times the decode, resize and encode steps (see resize_image_to_buffer).
+    """
+    buffer, mime_type = resize_image_to_buffer(image_path, timer=timer)
+
+    if buffer is not None:
+        buffer.seek(0)
+        with timer("encode"):
+            return encode_data_url(buffer, mime_type)
+
+    mime_type, _ = guess_type(image_path)
     if mime_type is None:
         mime_type = 'application/octet-stream'  # Default MIME type if none is found
-    
-    with open(resized_path, "rb") as image_file:
-        base64_encoded_data = base64.b64encode(image_file.read()).decode('utf-8')
-    
-    # Clean up the temporary file if it was created
-    if was_resized:
-        os.remove(resized_path)
-        print(f"Cleaned up temporary resized image: {resized_path}")
 
-    return f"data:{mime_type};base64,{base64_encoded_data}"
+    # Large files are memory-mapped, their raw bytes are never copied into Python memory
+    with open_file_buffer(image_path) as data, timer("encode"):
+        return encode_data_url(data, mime_type)
@@ -0,0 +1,35 @@
+import threading
+import time
+import unittest
+from concurrent.futures import CancelledError
+
+from src.services.cancellation import abandoned_calls, run_cancellable
+
+
+class RunCancellableTest(unittest.TestCase):
+    def test_returns_result(self):
+        self.assertEqual(run_cancellable(lambda: 42, threading.Event()), 42)
+
+    def test_raises_timeout_of_the_call(self):
+        def call():
+            raise TimeoutError("read timed out")
+
+        stop_event = threading.Event()
+        threading.Timer(2, stop_event.set).start()
+        start = time.perf_counter()
+        with self.assertRaises(TimeoutError):
+            run_cancellable(call, stop_event)
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_cancel_counts_abandoned_call(self):
+        stop_event = threading.Event()
+        threading.Timer(0.1, stop_event.set).start()
+        with self.assertRaises(CancelledError):
+            run_cancellable(lambda: time.sleep(0.5), stop_event)
+        self.assertEqual(abandoned_calls(), 1)
+        time.sleep(0.6)
+        self.assertEqual(abandoned_calls(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
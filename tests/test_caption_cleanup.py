@@ -0,0 +1,96 @@
+import unittest
+
+from src.services.caption_cleanup import DEFAULT_PREFIXES, CaptionCleaner, compile_cleaner, get_inline_cleaner
+from src.utils.utils import extract_sentences
+
+
+class PrefixTest(unittest.TestCase):
+    def setUp(self):
+        self.cleaner = CaptionCleaner(prefixes=DEFAULT_PREFIXES)
+
+    def test_strips_prefix(self):
+        self.assertEqual(self.cleaner.clean("The image shows a red car."), "A red car.")
+        self.assertEqual(self.cleaner.clean("In this image, a dog runs."), "A dog runs.")
+        self.assertEqual(self.cleaner.clean("  this picture shows: two cats"), "Two cats")
+
+    def test_longest_prefix_wins(self):
+        cleaner = CaptionCleaner(prefixes=["This image", "This image shows"])
+        self.assertEqual(cleaner.clean("This image shows a boat."), "A boat.")
+
+    def test_keeps_words_starting_like_a_prefix(self):
+        for caption in (
+            "A picture often hangs on the wall.",
+            "An image offset print of a bridge.",
+            "This image showstopper dress is red.",
+        ):
+            self.assertEqual(self.cleaner.clean(caption), caption)
+
+    def test_keeps_caption_made_only_of_prefix(self):
+        self.assertEqual(self.cleaner.clean("The image shows"), "The image shows")
+
+
+class RuleTest(unittest.TestCase):
+    def test_normalizes_whitespace(self):
+        cleaner = CaptionCleaner()
+        self.assertEqual(cleaner.clean("  A  red\ncar , parked .  "), "A red car, parked.")
+
+    def test_dedupes_sentences_and_phrases(self):
+        cleaner = CaptionCleaner()
+        self.assertEqual(cleaner.clean("A red car. A red car. It is parked."), "A red car. It is parked.")
+        self.assertEqual(cleaner.clean("A cat, a dog, a cat."), "A cat, a dog.")
+
+    def test_dedupe_keeps_repeated_abbreviations(self):
+        cleaner = CaptionCleaner()
+        caption = "Dr. Smith stands. Dr. Jones sits."
+        self.assertEqual(cleaner.clean(caption), caption)
+
+    def test_max_sentences(self):
+        cleaner = CaptionCleaner(max_sentences=1)
+        self.assertEqual(cleaner.clean("A red car. It is parked."), "A red car.")
+        self.assertEqual(cleaner.clean("A red car"), "A red car")
+
+    def test_max_sentences_skips_abbreviations(self):
+        cleaner = CaptionCleaner(max_sentences=1)
+        self.assertEqual(
+            cleaner.clean("Dr. Smith stands near St. Mary's church. A dog sits."),
+            "Dr. Smith stands near St. Mary's church.",
+        )
+        self.assertEqual(cleaner.clean("Fruit, e.g. apples, on a table. Next."), "Fruit, e.g. apples, on a table.")
+        self.assertEqual(cleaner.clean("A portrait of J. R. Smith. He smiles."), "A portrait of J. R. Smith.")
+
+    def test_max_words(self):
+        cleaner = CaptionCleaner(max_words=3)
+        self.assertEqual(cleaner.clean("A red car is parked."), "A red car")
+        self.assertEqual(cleaner.clean("A red car."), "A red car.")
+
+    def test_rules_can_be_turned_off(self):
+        cleaner = CaptionCleaner(dedupe=False, normalize=False)
+        self.assertEqual(cleaner.clean("A  cat. A  cat."), "A  cat. A  cat.")
+
+
+class ExtractSentencesTest(unittest.TestCase):
+    def test_counts_sentences(self):
+        self.assertEqual(extract_sentences("One. Two! Three?", 2), "One. Two!")
+        self.assertEqual(extract_sentences("Wait... What?! Yes.", 2), "Wait... What?!")
+
+    def test_keeps_unfinished_last_sentence(self):
+        self.assertEqual(extract_sentences("One. Two", 3), "One. Two")
+        self.assertIsNone(extract_sentences("No punctuation", 1))
+
+    def test_ignores_periods_inside_words(self):
+        self.assertEqual(extract_sentences("Version 3.5 of example.com. Next.", 1), "Version 3.5 of example.com.")
+
+
+class SettingsTest(unittest.TestCase):
+    def test_compiled_cleaners_are_shared(self):
+        settings = {"prefixes": ["The image shows"], "max_words": 5}
+        self.assertIs(compile_cleaner(settings), compile_cleaner(dict(settings)))
+
+    def test_inline_cleaner_only_when_enabled(self):
+        self.assertIsNone(get_inline_cleaner(None))
+        self.assertIsNone(get_inline_cleaner({"enabled": False}))
+        self.assertIsNotNone(get_inline_cleaner({"enabled": True}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import threading
+import time
+import unittest
+
+from src.services.caption_router import CaptionRoute
+
+CAPTION = "A long enough caption of a red car."
+
+
+class FakeTracker:
+    def hedge_threshold(self, model, q=90):
+        return 0.05
+
+
+class CaptionRouteRateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def describe(self, delays):
+        def describe(model, rate_limited, cancel_event, sent_event=None):
+            with self.lock:
+                self.calls.append((model, rate_limited))
+            if sent_event is not None:
+                sent_event.set()
+            if cancel_event is not None and cancel_event.wait(delays[model]):
+                raise RuntimeError("cancelled")
+            return f"{CAPTION} ({model})"
+        return describe
+
+    def test_race_goes_through_the_rate_limiter(self):
+        route = CaptionRoute(["cheap", "strong"], race=True)
+        route.run(self.describe({"cheap": 0.0, "strong": 0.0}))
+        time.sleep(0.05) # The loser may still be starting
+        self.assertEqual(sorted(self.calls), [("cheap", True), ("strong", True)])
+
+    def test_hedge_goes_through_the_rate_limiter(self):
+        route = CaptionRoute(["slow"], hedge=True, hedge_model="fast", tracker=FakeTracker())
+        caption, model = route.run(self.describe({"slow": 1.0, "fast": 0.0}), lambda model: True)
+        self.assertEqual(model, "fast")
+        self.assertEqual(self.calls, [("slow", True), ("fast", True)])
+
+    def test_no_hedge_without_a_rate_limit_slot(self):
+        route = CaptionRoute(["slow"], hedge=True, hedge_model="fast", tracker=FakeTracker())
+        caption, model = route.run(self.describe({"slow": 0.2, "fast": 0.0}), lambda model: False)
+        self.assertEqual(model, "slow")
+        self.assertEqual(self.calls, [("slow", True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+from src.services.caption_export import export_captions, import_captions, read_dataset_batches
+from src.services.caption_store import DatasetCaptionStore
+
+
+def read_records(dataset_path):
+    return {record["file_name"]: record for batch in read_dataset_batches(dataset_path) for record in batch}
+
+
+class DatasetCaptionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+        self.image_paths = []
+        for name in ("a.png", "b.png", "c.png"):
+            image_path = os.path.join(self.folder, name)
+            Image.new("RGB", (32, 16)).save(image_path)
+            self.image_paths.append(image_path)
+        self.dataset_path = os.path.join(self.folder, "captions.jsonl")
+        with open(self.dataset_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"file_name": "a.png", "caption": "A red car.", "width": 32, "height": 16, "format": "PNG"}) + "\n")
+            f.write(json.dumps({"file_name": "../outside.png", "caption": "Outside."}) + "\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_reads_captions_of_the_folder(self):
+        store = DatasetCaptionStore(self.dataset_path, self.folder)
+        self.assertEqual(store.get(self.image_paths[0]), "A red car.")
+        self.assertEqual(store.get(self.image_paths[1]), "")
+        self.assertEqual(store.caption_length(self.image_paths[0]), len("A red car."))
+        self.assertEqual(len(store.records), 1)
+
+    def test_saves_to_the_dataset_file_only(self):
+        store = DatasetCaptionStore(self.dataset_path, self.folder)
+        store.set(self.image_paths[0], "A blue car.")
+        store.set(self.image_paths[1], "A boat.")
+        store.flush()
+        records = read_records(self.dataset_path)
+        self.assertEqual(records["a.png"]["caption"], "A blue car.")
+        self.assertEqual(records["b.png"]["caption"], "A boat.")
+        self.assertEqual((records["b.png"]["width"], records["b.png"]["height"]), (32, 16))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "b.txt")))
+        self.assertEqual(DatasetCaptionStore(self.dataset_path, self.folder).get(self.image_paths[1]), "A boat.")
+
+    def test_writes_txt_files_when_asked(self):
+        store = DatasetCaptionStore(self.dataset_path, self.folder, write_txt=True)
+        store.set(self.image_paths[1], "A boat.")
+        with open(os.path.join(self.folder, "b.txt")) as f:
+            self.assertEqual(f.read(), "A boat.")
+        store.flush()
+
+    def test_new_parquet_file(self):
+        dataset_path = os.path.join(self.folder, "captions.parquet")
+        store = DatasetCaptionStore(dataset_path, self.folder)
+        self.assertEqual(store.get(self.image_paths[0]), "")
+        store.set(self.image_paths[2], "A tree.")
+        store.flush()
+        self.assertEqual(read_records(dataset_path)["c.png"]["caption"], "A tree.")
+
+    def test_import_and_export_through_the_store(self):
+        store = DatasetCaptionStore(os.path.join(self.folder, "store.csv"), self.folder)
+        imported = import_captions(
+            self.dataset_path, self.folder, read_caption=store.get, save_caption=store.set
+        )
+        self.assertEqual(imported, {self.image_paths[0]: "A red car."})
+        self.assertEqual(store.get(self.image_paths[0]), "A red car.")
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "a.txt")))
+
+        output_path = os.path.join(self.folder, "export.jsonl")
+        export_captions(self.image_paths, self.folder, output_path, read_caption=store.get)
+        self.assertEqual(read_records(output_path)["a.png"]["caption"], "A red car.")
+        store.flush()
+
+
+if __name__ == "__main__":
+    unittest.main()
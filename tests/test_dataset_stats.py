@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from src.services import dataset_stats
+from src.services.dataset_stats import DatasetStats
+
+
+class DatasetStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+        self.image_paths = []
+        for name, caption in (("a", "A red car."), ("b", "A red boat."), ("c", "A green tree.")):
+            image_path = os.path.join(self.folder, f"{name}.png")
+            Image.new("RGB", (32, 16)).save(image_path)
+            self.write_caption(image_path, caption)
+            self.image_paths.append(image_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_caption(self, image_path, caption):
+        with open(os.path.splitext(image_path)[0] + ".txt", "w", encoding="utf-8") as f:
+            f.write(caption)
+
+    def test_changed_caption_is_the_only_one_read_in_a_new_session(self):
+        DatasetStats(self.folder).update(self.image_paths)
+        self.write_caption(self.image_paths[1], "A blue boat on a red sea.")
+
+        stats = DatasetStats(self.folder)
+        with mock.patch.object(dataset_stats, "tokenize", wraps=dataset_stats.tokenize) as tokenize:
+            summary = stats.update(self.image_paths)
+        self.assertEqual(tokenize.call_count, 1)
+        top_tokens = dict(summary["top_tokens"])
+        self.assertEqual(top_tokens["red"], 2)
+        self.assertEqual(top_tokens["boat"], 1)
+        self.assertEqual(top_tokens["blue"], 1)
+        self.assertEqual(summary["mean_words"], (3 + 7 + 3) / 3)
+
+    def test_removed_image_is_subtracted(self):
+        DatasetStats(self.folder).update(self.image_paths)
+        summary = DatasetStats(self.folder).update(self.image_paths[:2])
+        self.assertNotIn("green", dict(summary["top_tokens"]))
+        self.assertEqual(dict(summary["top_tokens"])["red"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from src.services import duplicates
+from src.utils.phash import load_hash_thumbnail
+
+
+class ComputeHashesTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+        self.original = os.path.join(self.folder, "a.png")
+        self.copy = os.path.join(self.folder, "b.png")
+        self.other = os.path.join(self.folder, "c.png")
+        Image.linear_gradient("L").save(self.original)
+        shutil.copyfile(self.original, self.copy)
+        Image.linear_gradient("L").rotate(90).save(self.other)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_exact_copies_are_found_by_content(self):
+        copies = duplicates.find_exact_copies([self.original, self.copy, self.other])
+        self.assertEqual(copies, {self.copy: self.original})
+
+    def test_copies_are_not_decoded(self):
+        with mock.patch.object(duplicates, "load_hash_thumbnail", wraps=load_hash_thumbnail) as load:
+            hashes = duplicates.compute_hashes([self.original, self.copy, self.other])
+        self.assertEqual(sorted(call.args[0] for call in load.call_args_list), [self.original, self.other])
+        self.assertEqual(hashes[self.copy], hashes[self.original])
+        self.assertEqual(len(hashes), 3)
+
+    def test_copies_are_grouped(self):
+        groups = duplicates.find_duplicates([self.original, self.copy, self.other], max_distance=0)
+        self.assertEqual(groups, [[self.original, self.copy]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+
+from src.services.job_journal import JobJournal
+
+
+class JobJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+        self.image_paths = [os.path.join(self.folder, f"{name}.png") for name in "abc"]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_interrupted_run_is_replayed(self):
+        journal = JobJournal(self.folder)
+        journal.start_run(self.image_paths, "GPT-4.1")
+        journal.mark_done(self.image_paths[0])
+        journal.mark_started(self.image_paths[1])
+        journal.mark_failed(self.image_paths[2], "permanent error")
+
+        reloaded = JobJournal(self.folder)
+        self.assertTrue(reloaded.has_pending_run())
+        self.assertEqual(reloaded.pending_paths(), [self.image_paths[1]])
+        self.assertEqual(reloaded.failed_paths(), [self.image_paths[2]])
+
+    def test_finished_run_is_not_pending(self):
+        journal = JobJournal(self.folder)
+        journal.start_run(self.image_paths[:1], "GPT-4.1")
+        journal.mark_done(self.image_paths[0])
+        journal.finish_run()
+        self.assertFalse(JobJournal(self.folder).has_pending_run())
+
+    def test_stats_of_a_run_that_is_not_journaled(self):
+        journal = JobJournal(self.folder)
+        journal.start_run(self.image_paths, "GPT-4.1")
+        self.assertEqual(journal.stats()["remaining"], 3)
+        self.assertEqual(journal.stats(remaining=1)["remaining"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from PIL import Image
+
+from src.services import openai_client
+from src.services.metrics import TimingRecord, activate
+
+
+def fake_client(reply):
+    response = SimpleNamespace(
+        usage=None,
+        choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+    )
+    create = mock.Mock(return_value=response)
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+class DescribeImagesTimingTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        # Noise does not compress, the PNG is over the size limit and gets re-encoded
+        self.image_path = os.path.join(self.folder.name, "large.png")
+        Image.frombytes("RGB", (1500, 1500), os.urandom(1500 * 1500 * 3)).save(self.image_path)
+        patches = [
+            mock.patch.object(openai_client, "get_client", return_value=fake_client("A caption.")),
+            mock.patch.object(openai_client.usage_tracker, "record_response"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_single_image_times_go_to_active_record(self):
+        record = TimingRecord(self.image_path, "GPT-4.1")
+        with activate(record):
+            reply = openai_client.describe_images("GPT-4.1", [self.image_path], "Describe.")
+        self.assertEqual(reply, "A caption.")
+        for stage_name in ("decode", "resize", "encode"):
+            self.assertGreater(record.stages[stage_name], 0, stage_name)
+
+    def test_packed_images_times_go_to_their_records(self):
+        records = [TimingRecord(self.image_path, "GPT-4.1"), TimingRecord(self.image_path, "GPT-4.1")]
+        outer = TimingRecord(self.image_path, "GPT-4.1")
+        with activate(outer):
+            openai_client.describe_images("GPT-4.1", [self.image_path] * 2, "Describe.", records)
+        for record in records:
+            self.assertGreater(record.stages["encode"], 0)
+        self.assertEqual(outer.stages["encode"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import threading
+import unittest
+from unittest import mock
+
+from src.services import review_cache
+from src.services.review_cache import CaptionWriteQueue
+
+
+class CaptionWriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.written = []
+        patch = mock.patch.object(review_cache, "save_caption_to_file", side_effect=self.slow_save)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.addCleanup(self.release.set)
+
+    def slow_save(self, caption, caption_path):
+        self.writing.set()
+        self.release.wait(5)
+        self.written.append((caption_path, caption))
+
+    def test_caption_is_visible_while_written(self):
+        queue = CaptionWriteQueue()
+        queue.put("/images/a.png", "A red car.")
+        self.assertTrue(self.writing.wait(5))
+        self.assertEqual(queue.pending("/images/a.png"), "A red car.")
+        self.assertEqual(len(queue), 1)
+        self.release.set()
+        self.assertTrue(queue.flush(5))
+        self.assertIsNone(queue.pending("/images/a.png"))
+
+    def test_newer_caption_wins_over_the_one_written(self):
+        queue = CaptionWriteQueue()
+        queue.put("/images/a.png", "A red car.")
+        self.assertTrue(self.writing.wait(5))
+        queue.put("/images/a.png", "A blue car.")
+        self.assertEqual(queue.pending("/images/a.png"), "A blue car.")
+        self.release.set()
+        self.assertTrue(queue.flush(5))
+        self.assertEqual([caption for _, caption in self.written], ["A red car.", "A blue car."])
+
+
+if __name__ == "__main__":
+    unittest.main()
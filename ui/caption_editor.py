@@ -43,16 +43,22 @@ class CaptionEditor:
             pass
 
     def save_caption(self, event=None):
-        """Save the current caption to file."""
+        """Save the current caption to file, or to the dataset file holding the captions."""
+        # Captions queued by the review mode are written first, they must not overwrite this one
+        self.captioner.review_mode.flush()
         try:
             description = self.text_entry.get(1.0, "end").strip()
             if description == "":
                 return
-            description_file = str(self.captioner.current_image_path).rsplit(".", 1)[0] + ".txt"
-            save_caption_to_file(description, description_file)
+            if self.captioner.caption_store is not None:
+                self.captioner.caption_store.set(self.captioner.current_image_path, description)
+            else:
+                description_file = str(self.captioner.current_image_path).rsplit(".", 1)[0] + ".txt"
+                save_caption_to_file(description, description_file)
             # After saving, check and color the item again
-            item = self.captioner.image_manager.image_list.items[self.captioner.index]
-            self.captioner.image_manager.check_and_color_item(item, self.captioner.current_image_path)
+            item = self.captioner.image_manager.find_item(self.captioner.current_image_path)
+            if item is not None:
+                self.captioner.image_manager.check_and_color_item(item, self.captioner.current_image_path)
         except Exception as e:
             messagebox.showinfo(
                 "Error", f"There was an error while saving the captions: {e}"
@@ -61,6 +67,9 @@ class CaptionEditor:
     def load_caption(self, file_path):
         """Load caption from file into text entry."""
         self.text_entry.delete(1.0, "end")
+        if self.captioner.caption_store is not None:
+            self.text_entry.insert(1.0, self.captioner.caption_store.get(file_path))
+            return
         description_file = str(file_path).rsplit(".", 1)[0] + ".txt"
         if os.path.isfile(description_file):
             with open(description_file, "r") as file:
@@ -75,6 +84,11 @@ class CaptionEditor:
         """Get the current caption text."""
         return self.text_entry.get(1.0, "end").strip()
     
+    def append_caption_text(self, text):
+        """Append text at the end of the caption, e.g. while a reply is streamed."""
+        self.text_entry.insert("end-1c", text)
+        self.text_entry.see("end")
+
     def set_caption_text(self, text):
         """Set the caption text."""
         self.text_entry.delete(1.0, "end")
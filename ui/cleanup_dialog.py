@@ -0,0 +1,159 @@
+import queue
+import threading
+import tkinter as tk
+from tkinter import messagebox
+
+from src.services.caption_cleanup import DEFAULT_PREFIXES, clean_caption_files, compile_cleaner
+from src.services.session_file import save_session
+
+
+class CleanupDialog:
+    """Edits the caption post-processing rules and applies them to the whole folder."""
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.cleanup_window = None
+        self.task_queue = queue.Queue()
+        self.task_thread = None
+
+    def open_cleanup_window(self):
+        """Open the caption cleanup window."""
+        if self.cleanup_window is not None and self.cleanup_window.winfo_exists():
+            self.cleanup_window.focus()
+            return
+
+        settings = self.captioner.caption_cleanup
+        self.cleanup_window = tk.Toplevel(self.captioner.root)
+        self.cleanup_window.title("Caption cleanup")
+        self.cleanup_window.geometry("520x480")
+
+        enabled = tk.BooleanVar(value=settings["enabled"])
+        dedupe = tk.BooleanVar(value=settings["dedupe"])
+        normalize = tk.BooleanVar(value=settings["normalize"])
+        max_sentences = tk.IntVar(value=settings["max_sentences"])
+        max_words = tk.IntVar(value=settings["max_words"])
+
+        options_frame = tk.Frame(self.cleanup_window)
+        options_frame.pack(side="top", fill="x", padx=10, pady=10)
+        tk.Checkbutton(options_frame, text="Clean new captions as they are generated", variable=enabled).grid(
+            row=0, column=0, columnspan=2, sticky="w"
+        )
+        tk.Checkbutton(options_frame, text="Remove repeated sentences and phrases", variable=dedupe).grid(
+            row=1, column=0, columnspan=2, sticky="w"
+        )
+        tk.Checkbutton(options_frame, text="Normalize whitespace", variable=normalize).grid(
+            row=2, column=0, columnspan=2, sticky="w"
+        )
+        tk.Label(options_frame, text="Max sentences (0 = all):").grid(row=3, column=0, sticky="w")
+        tk.Spinbox(options_frame, from_=0, to=20, width=5, textvariable=max_sentences).grid(row=3, column=1, sticky="w")
+        tk.Label(options_frame, text="Max words (0 = all):").grid(row=4, column=0, sticky="w")
+        tk.Spinbox(options_frame, from_=0, to=500, width=5, textvariable=max_words).grid(row=4, column=1, sticky="w")
+
+        tk.Label(self.cleanup_window, text="Prefixes to remove, one per line:").pack(side="top", anchor="w", padx=10)
+        button_frame = tk.Frame(self.cleanup_window)
+        button_frame.pack(side="bottom", fill="x", pady=10)
+        prefixes_text = tk.Text(self.cleanup_window, wrap="none", height=10)
+        prefixes_text.pack(expand=True, fill="both", padx=10)
+        prefixes_text.insert(1.0, "\n".join(settings["prefixes"]))
+
+        def read_settings():
+            try:
+                sentences, words = max(0, max_sentences.get()), max(0, max_words.get())
+            except tk.TclError:
+                messagebox.showerror("Error", "Limits must be whole numbers.", parent=self.cleanup_window)
+                return None
+            return {
+                "enabled": enabled.get(),
+                "prefixes": [line.strip() for line in prefixes_text.get(1.0, "end-1c").splitlines() if line.strip()],
+                "max_sentences": sentences,
+                "max_words": words,
+                "dedupe": dedupe.get(),
+                "normalize": normalize.get(),
+            }
+
+        def save_settings():
+            new_settings = read_settings()
+            if new_settings is None:
+                return None
+            self.captioner.caption_cleanup.update(new_settings)
+            save_session(self.captioner)
+            return new_settings
+
+        def set_default_prefixes():
+            prefixes_text.delete(1.0, "end")
+            prefixes_text.insert(1.0, "\n".join(DEFAULT_PREFIXES))
+
+        def preview():
+            new_settings = read_settings()
+            if new_settings is None:
+                return
+            caption = self.captioner.caption_editor.get_caption_text()
+            if not caption.strip():
+                messagebox.showinfo("Preview", "The current caption is empty.", parent=self.cleanup_window)
+                return
+            messagebox.showinfo("Preview", compile_cleaner(new_settings).clean(caption), parent=self.cleanup_window)
+
+        def clean_folder():
+            new_settings = save_settings()
+            if new_settings is not None:
+                self.clean_folder(new_settings)
+
+        tk.Button(button_frame, text="Save", command=save_settings).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Default prefixes", command=set_default_prefixes).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Preview", command=preview).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Clean all captions", command=clean_folder).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Close", command=self.cleanup_window.destroy).pack(side="right", padx=5)
+
+    def clean_folder(self, settings):
+        """Apply the rules to every caption of the folder in the background."""
+        if not self.captioner.file_map:
+            messagebox.showwarning("Warning", "Please open a folder first.", parent=self.cleanup_window)
+            return
+        if self.task_thread and self.task_thread.is_alive():
+            messagebox.showinfo("Info", "Captions are already being cleaned.", parent=self.cleanup_window)
+            return
+        if not messagebox.askyesno(
+            "Caption cleanup", "Rewrite every caption of the folder with these rules?", parent=self.cleanup_window
+        ):
+            return
+        self.captioner.caption_editor.save_caption()
+        image_paths = list(self.captioner.file_map.values())
+        self.task_queue = queue.Queue()
+
+        def run():
+            try:
+                changed = clean_caption_files(
+                    image_paths,
+                    settings,
+                    progress=lambda done, total: self.task_queue.put(("PROGRESS", (done, total))),
+                )
+                self.task_queue.put(("COMPLETED", changed))
+            except Exception as e:
+                self.task_queue.put(("ERROR", str(e)))
+
+        self.task_thread = threading.Thread(target=run, daemon=True)
+        self.task_thread.start()
+        self.captioner.model_controls.progress_label.config(text="Cleaning captions...")
+        self.captioner.root.after(100, self._process_task_queue)
+
+    def _process_task_queue(self):
+        """Process cleanup progress from the queue."""
+        progress_label = self.captioner.model_controls.progress_label
+        try:
+            while True:
+                message_type, data = self.task_queue.get_nowait()
+                if message_type == "PROGRESS":
+                    progress_label.config(text=f"Cleaning captions... {data[0]}/{data[1]}")
+                elif message_type == "COMPLETED":
+                    progress_label.config(text="")
+                    if self.captioner.current_image_path:
+                        self.captioner.caption_editor.load_caption(self.captioner.current_image_path)
+                    messagebox.showinfo("Success", f"Cleaned {data} caption(s).")
+                    return
+                elif message_type == "ERROR":
+                    progress_label.config(text="")
+                    messagebox.showerror("Error", f"Cleanup failed: {data}")
+                    return
+        except queue.Empty:
+            pass
+        self.captioner.root.after(100, self._process_task_queue)
@@ -0,0 +1,160 @@
+import queue
+import threading
+import tkinter as tk
+from tkinter import messagebox
+
+from src.services.caption_packing import PACKABLE_MODELS
+from src.services.cost_estimator import estimate_batch, expected_output_tokens, pending_images, usage_tracker
+from src.services.job_journal import JobJournal
+from src.services.vision_service import skip_duplicates
+
+
+class CostDialog:
+    """Estimates the tokens and cost of the next run, next to the usage reported by the APIs."""
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.cost_window = None
+        self.cost_text = None
+        self.cost_queue = queue.Queue()
+        self.cost_thread = None
+        self.estimate_lines = []
+
+    def open_cost_window(self):
+        """Open the cost window and estimate the next run in the background."""
+        if not self.captioner.current_folder or not self.captioner.file_map:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+
+        if self.cost_window is None or not self.cost_window.winfo_exists():
+            self.cost_window = tk.Toplevel(self.captioner.root)
+            self.cost_window.title("Cost Estimate")
+            self.cost_window.geometry("620x480")
+
+            button_frame = tk.Frame(self.cost_window)
+            button_frame.pack(pady=10, side="top", fill="x")
+            tk.Button(button_frame, text="Refresh", command=self.start_estimate).pack(side="left", padx=5)
+            tk.Button(button_frame, text="Reset usage", command=self.reset_usage).pack(side="left", padx=5)
+            tk.Button(
+                button_frame, text="Close", command=self.cost_window.destroy
+            ).pack(side="right", padx=5)
+
+            self.cost_text = tk.Text(self.cost_window, wrap="none", font=("Courier", 11))
+            self.cost_text.pack(expand=True, fill="both", padx=10, pady=10)
+        else:
+            self.cost_window.focus()
+
+        self.start_estimate()
+
+    def _images_to_caption(self, caption_mode, image_paths, failed_images, current_path):
+        """Images the Run button would caption in the selected mode."""
+        if caption_mode == "single":
+            return [current_path] if current_path else []
+        if caption_mode == "failed":
+            return failed_images or JobJournal(self.captioner.current_folder).failed_paths()
+        journal = JobJournal(self.captioner.current_folder)
+        if journal.has_pending_run():
+            return journal.pending_paths()
+        return skip_duplicates(self.captioner, pending_images(image_paths))
+
+    def start_estimate(self):
+        """Estimate the next run in a background thread."""
+        if self.cost_thread and self.cost_thread.is_alive():
+            return
+        model_controls = self.captioner.model_controls
+        model = self.captioner.selected_model.get()
+        caption_mode = model_controls.caption_mode.get()
+        pack_size = model_controls.pack_size.get()
+        if model not in PACKABLE_MODELS or model_controls.race_models.get() or caption_mode == "single":
+            pack_size = 1
+        prompt = self.captioner.prompt_dialog.prompt_text
+        folder = self.captioner.current_folder
+        image_paths = list(self.captioner.file_map.values())
+        failed_images = list(model_controls.failed_images)
+        current_path = self.captioner.current_image_path
+        self.cost_queue = queue.Queue()
+        self.estimate_lines = ["Estimating..."]
+        self._show()
+
+        def estimate():
+            try:
+                estimate = estimate_batch(
+                    model,
+                    self._images_to_caption(caption_mode, image_paths, failed_images, current_path),
+                    prompt,
+                    pack_size,
+                    output_tokens=expected_output_tokens(folder),
+                    progress=lambda done, total: self.cost_queue.put(("PROGRESS", (done, total))),
+                )
+                self.cost_queue.put(("COMPLETED", (caption_mode, estimate)))
+            except Exception as e:
+                self.cost_queue.put(("ERROR", str(e)))
+
+        self.cost_thread = threading.Thread(target=estimate, daemon=True)
+        self.cost_thread.start()
+        self.captioner.root.after(100, self._process_cost_queue)
+
+    def _process_cost_queue(self):
+        """Process estimate results from the queue and update the window."""
+        try:
+            while True:
+                message_type, data = self.cost_queue.get_nowait()
+                if message_type == "PROGRESS":
+                    self.estimate_lines = [f"Reading image sizes... {data[0]}/{data[1]}"]
+                    self._show()
+                elif message_type == "COMPLETED":
+                    self.estimate_lines = format_estimate(*data)
+                    self._show()
+                    return
+                elif message_type == "ERROR":
+                    self.estimate_lines = [f"Error estimating the run: {data}"]
+                    self._show()
+                    return
+        except queue.Empty:
+            pass
+        self.captioner.root.after(100, self._process_cost_queue)
+
+    def reset_usage(self):
+        usage_tracker.clear()
+        self._show()
+
+    def _show(self):
+        if self.cost_window is None or not self.cost_window.winfo_exists():
+            return
+        lines = self.estimate_lines + [""] + format_usage(usage_tracker.summary())
+        self.cost_text.config(state="normal")
+        self.cost_text.delete(1.0, "end")
+        self.cost_text.insert(1.0, "\n".join(lines))
+        self.cost_text.config(state="disabled")
+
+
+def format_estimate(caption_mode, estimate):
+    """Render a run estimate as text lines."""
+    lines = [
+        f"Next run ({caption_mode}) with {estimate['model']}",
+        f"  Images:         {estimate['images']:>12,}",
+        f"  Requests:       {estimate['requests']:>12,}",
+        f"  Image tokens:   {estimate['image_tokens']:>12,}",
+        f"  Prompt tokens:  {estimate['prompt_tokens']:>12,}",
+        f"  Output tokens:  {estimate['output_tokens']:>12,}",
+        f"  Cost:           {'$' + format(estimate['cost'], ',.2f'):>12}",
+    ]
+    if estimate["unreadable"]:
+        lines.append(f"  {estimate['unreadable']} unreadable image(s) not counted")
+    lines.append("  List prices; fallback requests and retries are not included.")
+    return lines
+
+
+def format_usage(summary):
+    """Render the usage reported by the APIs as text lines."""
+    lines = ["Reported usage this session"]
+    if not summary:
+        return lines + ["  No request yet."]
+    lines.append(f"  {'Model':<18}{'req':>6}{'input':>11}{'estimated':>11}{'output':>10}{'cost':>10}")
+    for model, totals in summary.items():
+        lines.append(
+            f"  {model:<18}{totals['requests']:>6}{totals['input_tokens']:>11,}"
+            f"{totals['estimated_input_tokens']:>11,}{totals['output_tokens']:>10,}"
+            f"{'$' + format(totals['cost'], '.4f'):>10}"
+        )
+    return lines
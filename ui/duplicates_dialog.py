@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import messagebox
+
+from src.services.duplicates import copy_caption_to_duplicates, find_duplicates
+from src.utils.phash import MAX_DISTANCE
+
+
+class DuplicatesDialog:
+    """Finds near-duplicate images so only one image per group gets captioned."""
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.duplicates_window = None
+        self.groups = []
+        self.scan_queue = queue.Queue()
+        self.scan_thread = None
+        self.max_distance = tk.IntVar(value=4)
+        self.caption_one_per_group = tk.BooleanVar(value=False)
+        self.status_label = None
+        self.groups_text = None
+
+    def open_duplicates_window(self):
+        """Open the near-duplicates window."""
+        if not self.captioner.file_map:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+
+        if self.duplicates_window is not None and self.duplicates_window.winfo_exists():
+            self.duplicates_window.focus()
+            return
+
+        self.duplicates_window = tk.Toplevel(self.captioner.root)
+        self.duplicates_window.title("Near-duplicate Images")
+        self.duplicates_window.geometry("700x500")
+
+        input_frame = tk.Frame(self.duplicates_window)
+        input_frame.pack(pady=10, padx=10, fill="x")
+
+        tk.Label(input_frame, text="Max distance (bits):", font=("Verdana", 10)).pack(side="left")
+        tk.Spinbox(
+            input_frame, from_=0, to=MAX_DISTANCE, width=4, textvariable=self.max_distance
+        ).pack(side="left", padx=5)
+        tk.Button(input_frame, text="Scan", command=self.start_scan).pack(side="left", padx=5)
+        self.status_label = tk.Label(input_frame, text="", font=("Verdana", 10), fg="green")
+        self.status_label.pack(side="left", padx=5)
+
+        self.groups_text = tk.Text(self.duplicates_window, wrap="word", font=("Verdana", 9))
+        scrollbar = tk.Scrollbar(self.duplicates_window, command=self.groups_text.yview)
+        self.groups_text.config(yscrollcommand=scrollbar.set)
+
+        button_frame = tk.Frame(self.duplicates_window)
+        button_frame.pack(side="bottom", pady=10, fill="x")
+        tk.Checkbutton(
+            button_frame,
+            text="Batch runs caption one image per group and copy it to the others",
+            variable=self.caption_one_per_group,
+            command=self.apply_batch_setting,
+        ).pack(side="left", padx=5)
+        tk.Button(
+            button_frame, text="Copy captions now", command=self.copy_captions
+        ).pack(side="left", padx=5)
+        tk.Button(
+            button_frame, text="Close", command=self.duplicates_window.destroy
+        ).pack(side="right", padx=5)
+
+        scrollbar.pack(side="right", fill="y")
+        self.groups_text.pack(side="left", fill="both", expand=True, padx=10)
+        self.show_groups()
+
+    def start_scan(self):
+        """Hash every image in a background thread."""
+        if self.scan_thread and self.scan_thread.is_alive():
+            return
+        image_paths = list(self.captioner.file_map.values())
+        try:
+            max_distance = min(MAX_DISTANCE, max(0, self.max_distance.get()))
+        except tk.TclError: # Not a number
+            max_distance = 4
+        self.max_distance.set(max_distance)
+        self.scan_queue = queue.Queue()
+        self.status_label.config(text="Hashing images...")
+
+        def scan():
+            groups = find_duplicates(
+                image_paths,
+                max_distance,
+                progress=lambda done, total: self.scan_queue.put(("PROGRESS", (done, total))),
+            )
+            self.scan_queue.put(("COMPLETED", groups))
+
+        self.scan_thread = threading.Thread(target=scan, daemon=True)
+        self.scan_thread.start()
+        self.captioner.root.after(100, self._process_scan_queue)
+
+    def _process_scan_queue(self):
+        """Process scan results from the queue and update the window."""
+        try:
+            while True:
+                message_type, data = self.scan_queue.get_nowait()
+                if message_type == "PROGRESS":
+                    done, total = data
+                    self._set_status(f"Hashing images... {done}/{total}")
+                elif message_type == "COMPLETED":
+                    self.groups = data
+                    self.apply_batch_setting()
+                    self._set_status(f"{len(self.groups)} group(s) found.")
+                    self.show_groups()
+                    return
+        except queue.Empty:
+            pass
+        self.captioner.root.after(100, self._process_scan_queue)
+
+    def _set_status(self, text):
+        if self.duplicates_window is not None and self.duplicates_window.winfo_exists():
+            self.status_label.config(text=text)
+
+    def show_groups(self):
+        """List the groups, representative first."""
+        if self.duplicates_window is None or not self.duplicates_window.winfo_exists():
+            return
+        self.groups_text.delete(1.0, "end")
+        if not self.groups:
+            self.groups_text.insert("end", "Click 'Scan' to look for near-duplicate images.\n")
+            return
+        duplicates = sum(len(group) - 1 for group in self.groups)
+        self.groups_text.insert(
+            "end", f"{len(self.groups)} group(s), {duplicates} image(s) can skip captioning.\n\n"
+        )
+        for number, group in enumerate(self.groups, 1):
+            names = [os.path.basename(path) for path in group]
+            self.groups_text.insert("end", f"Group {number}: ", "group")
+            self.groups_text.insert("end", f"{names[0]} (representative)", "representative")
+            self.groups_text.insert("end", f", {', '.join(names[1:])}\n")
+        self.groups_text.tag_config("group", foreground="blue")
+        self.groups_text.tag_config("representative", font=("Verdana", 9, "bold"))
+
+    def apply_batch_setting(self):
+        """Share the groups with batch runs when the option is enabled."""
+        self.captioner.duplicate_groups = self.groups if self.caption_one_per_group.get() else []
+
+    def copy_captions(self):
+        """Copy each representative's caption to the empty captions of its group."""
+        if not self.groups:
+            messagebox.showinfo("Info", "No duplicate groups, run a scan first.")
+            return
+        written = 0
+        for group in self.groups:
+            written += len(copy_caption_to_duplicates(group))
+        messagebox.showinfo("Success", f"Copied captions to {written} image(s).")
+        self.captioner.image_manager.refresh_item_colors()
@@ -0,0 +1,167 @@
+import queue
+import threading
+from tkinter import filedialog, messagebox, simpledialog
+
+from src.services.caption_export import export_captions, import_captions, read_caption_file
+from src.services.caption_store import DatasetCaptionStore
+from src.services.session_file import save_session
+from src.services.shard_writer import write_shards
+
+DATASET_FILE_TYPES = [("JSON Lines", "*.jsonl"), ("CSV", "*.csv"), ("Parquet", "*.parquet")]
+
+
+class ExportDialog:
+    """Exports the captions of the folder to dataset files and imports them back."""
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.task_queue = queue.Queue()
+        self.task_thread = None
+
+    def export_dataset(self):
+        """Ask for an output file and export every caption of the folder to it."""
+        if not self.captioner.current_folder or not self.captioner.file_map:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+        output_path = filedialog.asksaveasfilename(
+            title="Export captions",
+            defaultextension=".jsonl",
+            filetypes=DATASET_FILE_TYPES,
+        )
+        if not output_path:
+            return
+        self.captioner.caption_editor.save_caption()
+        store = self.captioner.caption_store
+        read_caption = store.get if store is not None else read_caption_file
+        image_paths = list(self.captioner.file_map.values())
+        folder = self.captioner.current_folder
+        self._start(
+            "Exporting",
+            lambda progress: f"Exported {export_captions(image_paths, folder, output_path, progress, read_caption=read_caption)} caption(s).",
+        )
+
+    def import_dataset(self):
+        """Ask for a dataset file and write its captions to the .txt files of the folder (or the dataset file holding them)."""
+        if not self.captioner.current_folder:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+        input_path = filedialog.askopenfilename(title="Import captions", filetypes=DATASET_FILE_TYPES)
+        if not input_path:
+            return
+        overwrite = messagebox.askyesno("Import captions", "Overwrite captions that are not empty?")
+        self.captioner.caption_editor.save_caption()
+        folder = self.captioner.current_folder
+        store = self.captioner.caption_store
+        options = {"read_caption": store.get, "save_caption": store.set} if store is not None else {}
+        self._start(
+            "Importing",
+            lambda progress: f"Imported {len(import_captions(input_path, folder, overwrite=overwrite, progress=progress, **options))} caption(s).",
+            reload=True,
+        )
+
+    def open_caption_store(self):
+        """Read and save the captions of the folder from one dataset file, instead of the .txt files."""
+        if not self.captioner.current_folder:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+        dataset_path = filedialog.asksaveasfilename(
+            title="Dataset file holding the captions (a new file starts empty)",
+            defaultextension=".jsonl",
+            filetypes=DATASET_FILE_TYPES,
+            confirmoverwrite=False,
+        )
+        if not dataset_path:
+            return
+        write_txt = messagebox.askyesno("Dataset file", "Also write a .txt file when a caption is saved?")
+        self.captioner.caption_editor.save_caption()
+        try:
+            store = DatasetCaptionStore(dataset_path, self.captioner.current_folder, write_txt=write_txt)
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot read {dataset_path}: {e}")
+            return
+        if self.captioner.caption_store is not None:
+            self.captioner.caption_store.flush()
+        self.captioner.caption_store = store
+        self._captions_source_changed()
+
+    def close_caption_store(self):
+        """Go back to the .txt files, after writing the pending edits to the dataset file."""
+        if self.captioner.caption_store is None:
+            return
+        self.captioner.caption_editor.save_caption()
+        self.captioner.caption_store.flush()
+        self.captioner.caption_store = None
+        self._captions_source_changed()
+
+    def _captions_source_changed(self):
+        self.captioner.image_manager.refresh_item_colors()
+        self.captioner.image_filter_bar.rebuild()
+        if self.captioner.current_image_path:
+            self.captioner.caption_editor.load_caption(self.captioner.current_image_path)
+        save_session(self.captioner)
+
+    def write_tar_shards(self):
+        """Ask for an output folder and pack the captioned images into tar shards."""
+        if not self.captioner.current_folder or not self.captioner.file_map:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+        output_dir = filedialog.askdirectory(title="Output folder for the shards")
+        if not output_dir:
+            return
+        max_side = simpledialog.askinteger(
+            "Tar shards",
+            "Downscale images larger than (pixels, 0 keeps the originals):",
+            initialvalue=0,
+            minvalue=0,
+        )
+        if max_side is None:
+            return
+        self.captioner.caption_editor.save_caption()
+        image_paths = list(self.captioner.file_map.values())
+        folder = self.captioner.current_folder
+        self._start(
+            "Packing",
+            lambda progress: f"Wrote {len(write_shards(image_paths, folder, output_dir, max_side=max_side, progress=progress))} shard(s).",
+        )
+
+    def _start(self, action, task, reload=False):
+        if self.task_thread and self.task_thread.is_alive():
+            messagebox.showinfo("Info", "An export is already running.")
+            return
+        self.task_queue = queue.Queue()
+
+        def run():
+            try:
+                message = task(lambda done, total: self.task_queue.put(("PROGRESS", done)))
+                self.task_queue.put(("COMPLETED", message))
+            except Exception as e:
+                self.task_queue.put(("ERROR", str(e)))
+
+        self.task_thread = threading.Thread(target=run, daemon=True)
+        self.task_thread.start()
+        self.captioner.model_controls.progress_label.config(text=f"{action} captions...")
+        self.captioner.root.after(100, lambda: self._process_task_queue(action, reload))
+
+    def _process_task_queue(self, action, reload):
+        """Process export/import progress from the queue."""
+        progress_label = self.captioner.model_controls.progress_label
+        try:
+            while True:
+                message_type, data = self.task_queue.get_nowait()
+                if message_type == "PROGRESS":
+                    progress_label.config(text=f"{action} captions... {data}")
+                elif message_type == "COMPLETED":
+                    progress_label.config(text="")
+                    if reload:
+                        self.captioner.image_manager.refresh_item_colors()
+                        if self.captioner.current_image_path:
+                            self.captioner.caption_editor.load_caption(self.captioner.current_image_path)
+                    messagebox.showinfo("Success", data)
+                    return
+                elif message_type == "ERROR":
+                    progress_label.config(text="")
+                    messagebox.showerror("Error", f"{action} failed: {data}")
+                    return
+        except queue.Empty:
+            pass
+        self.captioner.root.after(100, lambda: self._process_task_queue(action, reload))
@@ -0,0 +1,128 @@
+import queue
+import threading
+import tkinter as tk
+
+from src.services.image_table import SORT_COLUMNS, ImageTable, parse_filter
+
+# Typing in the filter box is applied once it pauses for this long
+FILTER_DELAY_MS = 150
+
+
+class ImageFilterBar:
+    """Filter and sort controls above the image list, backed by an ImageTable.
+
+    The table is built in the background once the list is loaded. Filters and
+    sorts are computed on the table and the list shows the matching items,
+    without creating or destroying any widget.
+    """
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.table = None
+        self.table_items = [] # Item of each table row
+        self.table_queue = queue.Queue()
+        self.table_thread = None
+        self.stop_building = threading.Event()
+        self.filter_var = None
+        self.sort_var = None
+        self.descending_var = None
+        self.count_label = None
+        self._apply_job = None
+
+    def setup_filter_bar(self, parent):
+        """Setup the filter entry, sort menu and match count above the list."""
+        self.filter_var = tk.StringVar()
+        self.sort_var = tk.StringVar(value="name")
+        self.descending_var = tk.BooleanVar(value=False)
+
+        frame = tk.Frame(parent)
+        frame.pack(side="top", fill="x")
+        entry = tk.Entry(frame, textvariable=self.filter_var, width=18)
+        entry.pack(side="left", padx=2, pady=2)
+        # e.g. "empty, width < 512, cat"
+        entry.bind("<KeyRelease>", self.schedule_apply)
+        entry.bind("<Return>", self.apply)
+        tk.OptionMenu(frame, self.sort_var, *SORT_COLUMNS, command=self.apply).pack(side="left")
+        tk.Checkbutton(frame, text="↓", variable=self.descending_var, command=self.apply).pack(side="left")
+        self.count_label = tk.Label(frame, text="", font=("Arial", 9))
+        self.count_label.pack(side="left", padx=2)
+
+    def reset(self):
+        """Drop the table while the list is being reloaded."""
+        self.stop_building.set()
+        self.table = None
+        self.table_items = []
+        if self.count_label is not None:
+            self.count_label.config(text="")
+
+    def rebuild(self):
+        """Build the table of the loaded items in the background, then apply the filter."""
+        self.stop_building.set()
+        self.stop_building = threading.Event()
+        items = list(self.captioner.image_manager.image_list.all_items)
+        image_paths = [item.image_path for item in items]
+        stop_event = self.stop_building
+        read_caption_length = self.captioner.image_manager.caption_length
+        self.table_queue = queue.Queue()
+        self.count_label.config(text="Indexing...")
+
+        def build():
+            try:
+                table = ImageTable.from_paths(image_paths, stop_event=stop_event, read_caption_length=read_caption_length)
+                self.table_queue.put(("COMPLETED", (table, items)))
+            except Exception as e:
+                self.table_queue.put(("ERROR", str(e)))
+
+        self.table_thread = threading.Thread(target=build, daemon=True)
+        self.table_thread.start()
+        self.captioner.root.after(100, lambda: self._process_table_queue(stop_event))
+
+    def _process_table_queue(self, stop_event):
+        """Install the table once built, unless a newer build replaced it."""
+        try:
+            message_type, data = self.table_queue.get_nowait()
+        except queue.Empty:
+            self.captioner.root.after(100, lambda: self._process_table_queue(stop_event))
+            return
+        if stop_event.is_set():
+            return
+        if message_type == "COMPLETED" and data[0] is not None:
+            self.table, self.table_items = data
+            self.apply()
+        elif message_type == "ERROR":
+            print(f"Error building the image table: {data}")
+            self.count_label.config(text="")
+
+    def clear_filter(self):
+        """Show every item again."""
+        if self.filter_var.get():
+            self.filter_var.set("")
+            self.apply()
+
+    def schedule_apply(self, event=None):
+        if self._apply_job is not None:
+            self.captioner.root.after_cancel(self._apply_job)
+        self._apply_job = self.captioner.root.after(FILTER_DELAY_MS, self.apply)
+
+    def apply(self, *args):
+        """Show the items matching the filter, in the selected order."""
+        self._apply_job = None
+        if self.table is None:
+            return
+        rows = self.table.query(self.filter_var.get(), self.sort_var.get(), self.descending_var.get())
+        image_list = self.captioner.image_manager.image_list
+        image_list.set_view([self.table_items[row] for row in rows.tolist()])
+        if image_list.selected_index is not None:
+            self.captioner.index = image_list.selected_index
+        self.count_label.config(text=f"{len(rows)}/{len(self.table)}")
+
+    def caption_changed(self, image_path, length):
+        """Keep the caption column in sync, re-filtering if the view depends on it."""
+        if self.table is None or not self.table.set_caption_length(image_path, length):
+            return
+        clauses = parse_filter(self.filter_var.get())
+        if self.sort_var.get() == "caption" or any(
+            clause[0] in ("empty", "captioned") or (clause[0] == "compare" and clause[1] == "caption")
+            for clause in clauses
+        ):
+            self.schedule_apply()
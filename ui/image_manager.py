@@ -6,13 +6,18 @@ from tkinter import filedialog, messagebox
 import threading
 import queue
 
-from PIL import Image, ImageTk
+from PIL import ImageTk
 
-from src.utils.rename_images import rename_files_to_numbers
+from src.utils.rename_images import RenameTransaction, rename_files_to_numbers
+from src.services.image_table import caption_length as get_caption_length
+from src.services.review_cache import load_display_image
 from src.services.session_file import save_session
 from src.utils.thumbnail import ThumbnailListbox
 from src.utils.utils import sort_by_name, sort_files
 
+# Images on each side of the displayed one that a running batch captions first
+NEIGHBOUR_RADIUS = 2
+
 
 class ImageManager:
     """Handles all image-related operations."""
@@ -26,9 +31,11 @@ class ImageManager:
         self.image_queue = queue.Queue()
         self.loading_thread = None
         self.stop_loading = threading.Event()
+        self.selected_files = None # Names of individually opened images, None for a whole folder
     
     def setup_image_list(self):
         """Setup the thumbnail image list."""
+        self.captioner.image_filter_bar.setup_filter_bar(self.frame_list)
         self.image_list = ThumbnailListbox(self.frame_list, self.captioner)
         self.image_list.pack(side="left", fill="both", expand=True)
         self.captioner.root.after(100, self._process_image_queue)
@@ -74,10 +81,12 @@ class ImageManager:
         if self.loading_thread and self.loading_thread.is_alive():
             self.loading_thread.join() # Wait for the thread to finish
 
-        for item in self.image_list.items:
-            item.destroy()
-        self.image_list.items = []
+        self.captioner.review_mode.reset()
+        self.close_caption_store(folder_path)
+        self.image_list.clear()
+        self.captioner.image_filter_bar.reset()
         self.captioner.file_map = {}
+        self.selected_files = None
         self.image_queue = queue.Queue()
         self.stop_loading.clear() # Reset the stop event
 
@@ -135,12 +144,14 @@ class ImageManager:
             if self.image_list.size() > 0:
                 self.image_list.select_set(0)
                 self.captioner.image_manager.display_image(None)
+            self.captioner.image_filter_bar.rebuild()
             self.captioner.hide_loading_indicator() # Hide loading indicator
         elif self.loading_thread and not self.loading_thread.is_alive() and self.image_queue.empty():
             print("Thread finished and queue empty - hiding indicator.")
             if self.image_list.size() > 0:
                 self.image_list.select_set(0)
                 self.captioner.image_manager.display_image(None)
+            self.captioner.image_filter_bar.rebuild()
             self.captioner.hide_loading_indicator() # Hide loading indicator
         else:
             # Continue processing if thread is alive or queue has items
@@ -157,32 +168,45 @@ class ImageManager:
             if file_paths:
                 self.captioner.current_folder = os.path.dirname(file_paths[0])
                 self.captioner.show_loading_indicator() # Show loading indicator
-                
-                # Clear existing items and reset state
-                self.stop_loading.set() # Signal any existing thread to stop
-                if self.loading_thread and self.loading_thread.is_alive():
-                    self.loading_thread.join() # Wait for the thread to finish
-
-                for item in self.image_list.items:
-                    item.destroy()
-                self.image_list.items = []
-                self.captioner.file_map = {}
-                self.image_queue = queue.Queue()
-                self.stop_loading.clear() # Reset the stop event
-
-                # Start background loading for selected files
-                self.loading_thread = threading.Thread(
-                    target=self._load_selected_images_in_background, args=(file_paths,)
-                )
-                self.loading_thread.daemon = True
-                self.loading_thread.start()
-                
-                # Schedule queue processing to start
-                self.captioner.root.after(100, self._process_image_queue)
+                self.load_image_files(file_paths)
                 save_session(self.captioner)
         except Exception as e:
             print(f"Error opening images: {e}")
 
+    def close_caption_store(self, folder_path):
+        """Write and close the dataset file holding the captions when another folder is loaded."""
+        store = self.captioner.caption_store
+        if store is not None and os.path.normpath(store.folder_path) != os.path.normpath(folder_path):
+            store.flush()
+            self.captioner.caption_store = None
+
+    def load_image_files(self, file_paths):
+        """Load the given image files (instead of a whole folder) in a background thread."""
+        # Clear existing items and reset state
+        self.stop_loading.set() # Signal any existing thread to stop
+        if self.loading_thread and self.loading_thread.is_alive():
+            self.loading_thread.join() # Wait for the thread to finish
+
+        self.captioner.review_mode.reset()
+        self.image_list.clear()
+        self.captioner.image_filter_bar.reset()
+        self.captioner.file_map = {}
+        self.selected_files = [
+            os.path.relpath(file_path, self.captioner.current_folder) for file_path in file_paths
+        ]
+        self.image_queue = queue.Queue()
+        self.stop_loading.clear() # Reset the stop event
+
+        # Start background loading for selected files
+        self.loading_thread = threading.Thread(
+            target=self._load_selected_images_in_background, args=(file_paths,)
+        )
+        self.loading_thread.daemon = True
+        self.loading_thread.start()
+
+        # Schedule queue processing to start
+        self.captioner.root.after(100, self._process_image_queue)
+
     def _load_selected_images_in_background(self, file_paths):
         """Load selected image files in a background thread."""
         for file_path in file_paths:
@@ -200,13 +224,68 @@ class ImageManager:
 
     def rename_images(self):
         """Rename all images in the current folder to numbers."""
-        self.captioner.show_loading_indicator() # Show loading indicator
-        rename_files_to_numbers(self.captioner.current_folder)
-        self.load_images_from_folder(self.captioner.current_folder)
+        folder_path = self.captioner.current_folder
+        if not folder_path:
+            return
+        self.captioner.caption_editor.save_caption()
+        try:
+            transaction = RenameTransaction(folder_path)
+            if transaction.is_pending():
+                if messagebox.askyesno(
+                    "Interrupted rename",
+                    "A previous rename of this folder was interrupted.\n\n"
+                    "Yes: finish it\nNo: roll it back to the original names",
+                ):
+                    transaction.resume()
+                else:
+                    transaction.rollback()
+                # The list may not match either state, rebuild it
+                self.captioner.show_loading_indicator()
+                self.load_images_from_folder(folder_path)
+                return
+            renamed = rename_files_to_numbers(folder_path)
+        except Exception as e:
+            print(f"Error renaming files: {e}")
+            messagebox.showerror("Error", f"Renaming failed: {e}\nRun it again to finish or roll back.")
+            return
+        self.apply_renames(renamed)
         save_session(self.captioner)
 
+    def apply_renames(self, renamed_paths):
+        """Update the list, file_map and current image after files were renamed, without reloading."""
+        if not renamed_paths:
+            return
+        renamed_paths = {os.path.normpath(old): new for old, new in renamed_paths.items()}
+        for item in list(self.image_list.all_items):
+            new_path = renamed_paths.get(os.path.normpath(item.image_path))
+            if new_path is not None:
+                self.image_list.set_item_path(item, new_path)
+        current_path = renamed_paths.get(os.path.normpath(self.captioner.current_image_path or ""))
+        if current_path is not None:
+            self.captioner.current_image_path = current_path
+            self.captioner.current_image = os.path.basename(current_path)
+
+        # Keep the order the folder loader would give, the filter is applied again on the new names
+        items = sorted(self.image_list.all_items, key=lambda item: os.path.basename(item.image_path).lower())
+        self.image_list.all_items = items
+        if items != self.image_list.items:
+            self.image_list.reorder(items)
+        self.captioner.image_filter_bar.rebuild()
+        self.captioner.file_map = {os.path.basename(item.image_path): item.image_path for item in items}
+        if self.image_list.selected_index is not None:
+            self.captioner.index = self.image_list.selected_index
+        if self.selected_files is not None:
+            self.selected_files = [
+                os.path.relpath(item.image_path, self.captioner.current_folder) for item in items
+            ]
+        if self.captioner.current_image_path:
+            self.captioner.root.title(f"Yofardev Captioner - {self.captioner.current_image_path}")
+
     def display_image(self, event):
         """Display the selected image."""
+        if self.captioner.review_mode.active:
+            self.captioner.review_mode.display_selected()
+            return
         try:
             self.captioner.caption_editor.save_caption()
             selection = self.image_list.curselection()
@@ -214,57 +293,77 @@ class ImageManager:
                 return
             self.captioner.caption_editor.clear_caption()
             self.captioner.index = selection[0]
-            file_name = self.image_list.get(self.captioner.index)
-            file_path = self.captioner.file_map[file_name]
+            item = self.image_list.items[self.captioner.index]
+            file_name, file_path = item.name, item.image_path
             self.captioner.current_image = file_name
             self.captioner.current_image_path = file_path
-            screen_width = self.captioner.root.winfo_screenwidth()
-            max_height = 500  # Fixed height limit
-
-            with Image.open(file_path) as image:
-                original_width, original_height = image.size
-                aspect_ratio = original_width / original_height
-                aspect_ratio_str = f"{aspect_ratio:.2f}"
-
-                new_width, new_height = original_width, original_height
-
-                # Scale down if image height is greater than max_height
-                if original_height > max_height:
-                    new_height = max_height
-                    new_width = int(new_height * aspect_ratio)
-
-                # If the new width exceeds the screen width, scale down proportionally
-                if new_width > screen_width:
-                    new_width = screen_width
-                    new_height = int(new_width / aspect_ratio)
-
-                image = image.resize((new_width, new_height), Image.LANCZOS)
-                image = ImageTk.PhotoImage(image)
-                self.image_label.config(image=image)
-                self.image_label.image = image
-                self.image_label.config(borderwidth=5, relief="groove")
-
-                # Get file size
-                file_size_bytes = os.path.getsize(file_path)
-                file_size_kb = file_size_bytes / 1024
-                file_size_mb = file_size_kb / 1024
-
-                if file_size_mb >= 1:
-                    file_size_str = f"{file_size_mb:.2f} MB"
-                else:
-                    file_size_str = f"{file_size_kb:.2f} KB"
-
-                # Update the resolution, aspect ratio, and file size label
-                resolution_text = f"{original_width}x{original_height} ({aspect_ratio_str}) - {file_size_str}"
-                self.resolution_label.config(text=resolution_text)
+            self.prioritize_neighbours(self.captioner.index)
+            self.show_display_entry(
+                load_display_image(file_path, self.captioner.root.winfo_screenwidth())
+            )
 
-                # Load caption if exists
-                self.captioner.caption_editor.load_caption(file_path)
-                self.captioner.root.title(f"Yofardev Captioner - {self.captioner.current_image_path}")
+            # Load caption if exists
+            self.captioner.caption_editor.load_caption(file_path)
+            self.captioner.root.title(f"Yofardev Captioner - {self.captioner.current_image_path}")
         except Exception as e:
             print(f"Error loading image: {e}")
             messagebox.showinfo("Error", f"There was an error loading the image: {e}")
 
+    def show_display_entry(self, entry):
+        """Show a decoded image (see load_display_image) and its resolution, aspect ratio and file size."""
+        image = ImageTk.PhotoImage(entry["image"])
+        self.image_label.config(image=image)
+        self.image_label.image = image
+        self.image_label.config(borderwidth=5, relief="groove")
+
+        aspect_ratio = entry["width"] / entry["height"]
+        file_size_kb = entry["file_size"] / 1024
+        file_size_mb = file_size_kb / 1024
+        if file_size_mb >= 1:
+            file_size_str = f"{file_size_mb:.2f} MB"
+        else:
+            file_size_str = f"{file_size_kb:.2f} KB"
+        resolution_text = f"{entry['width']}x{entry['height']} ({aspect_ratio:.2f}) - {file_size_str}"
+        self.resolution_label.config(text=resolution_text)
+
+    def prioritize_neighbours(self, index):
+        """Have a running batch caption the displayed image and its neighbours next."""
+        scheduler = self.captioner.batch_scheduler
+        if scheduler is None:
+            return
+        order = [index]
+        for distance in range(1, NEIGHBOUR_RADIUS + 1):
+            order += [index + distance, index - distance]
+        items = self.image_list.items
+        scheduler.promote([items[i].image_path for i in order if 0 <= i < len(items)])
+
+    def select_image(self, image_path):
+        """Select and display an image of the list."""
+        item = self.find_item(image_path)
+        if item is None:
+            return False
+        if item.index is None:
+            self.captioner.image_filter_bar.clear_filter() # The image is filtered out
+            if item.index is None:
+                return False
+        self.image_list.select_set(item.index)
+        self.image_list.see(item.index)
+        return True
+
+    def find_item(self, image_path):
+        """Return the list item of an image, shown or not, None if it is not loaded."""
+        return self.image_list.find_item(image_path)
+
+    def refresh_item(self, image_path):
+        """Recolor the item of an image after its caption was written."""
+        item = self.find_item(image_path)
+        if item is None:
+            return
+        if item is not self.image_list.selected_item:
+            self.check_and_color_item(item, image_path)
+        else:
+            self.captioner.image_filter_bar.caption_changed(image_path, self.caption_length(image_path))
+
     def open_current_image(self, event=None):
         """Open the currently displayed image with the default system application."""
         if self.captioner.current_image_path and os.path.exists(self.captioner.current_image_path):
@@ -273,10 +372,24 @@ class ImageManager:
             except Exception as e:
                 print(f"Error opening image: {e}")
 
-    def check_and_color_item(self, item, file_path):
-        """Check if caption exists and color the item accordingly."""
-        caption_file = os.path.splitext(file_path)[0] + ".txt"
-        if not os.path.exists(caption_file) or os.path.getsize(caption_file) == 0:
+    def refresh_item_colors(self):
+        """Recolor every item after captions were written outside the editor."""
+        for item in self.image_list.all_items:
+            if item is not self.image_list.selected_item:
+                self.check_and_color_item(item, item.image_path)
+
+    def caption_length(self, image_path):
+        """Size of the caption of an image, read from the dataset file holding the captions if one is open."""
+        if self.captioner.caption_store is not None:
+            return self.captioner.caption_store.caption_length(image_path)
+        return get_caption_length(image_path)
+
+    def check_and_color_item(self, item, file_path, caption_length=None):
+        """Check if caption exists and color the item accordingly, the length is read from the file if not given."""
+        if caption_length is None:
+            caption_length = self.caption_length(file_path)
+        if caption_length == 0:
             item.set_bg_color("gray15", fg="white")
         else:
             item.set_bg_color("gray25", fg="white")
+        self.captioner.image_filter_bar.caption_changed(file_path, caption_length)
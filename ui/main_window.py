@@ -1,13 +1,22 @@
 import tkinter as tk
 
 from src.utils import settings
-from src.services.session_file import load_session
+from src.services.caption_cleanup import DEFAULT_CLEANUP
+from src.services.session_file import flush_session, load_session
 
 from .caption_editor import CaptionEditor
+from .cleanup_dialog import CleanupDialog
+from .cost_dialog import CostDialog
+from .duplicates_dialog import DuplicatesDialog
+from .export_dialog import ExportDialog
+from .image_filter_bar import ImageFilterBar
 from .image_manager import ImageManager
 from .model_controls import ModelControls
+from .performance_panel import PerformancePanel
 from .prompt_dialog import PromptDialog
+from .review_mode import ReviewMode
 from .search_replace_dialog import SearchReplaceDialog
+from .stats_dialog import StatsDialog
 
 
 class Captioner:
@@ -23,13 +32,25 @@ class Captioner:
         self.current_image_path = ""
         self.index = 0
         self.loading_label = None # Added for loading indicator
+        self.duplicate_groups = [] # Near-duplicate groups, representative first, used by batch runs
+        self.batch_scheduler = None # Queue of the running batch, the displayed image is moved to its front
+        self.caption_cleanup = dict(DEFAULT_CLEANUP) # Post-processing rules of generated captions
+        self.caption_store = None # Dataset file holding the captions instead of the .txt files
         
         # Initialize components
         self.caption_editor = CaptionEditor(self)
         self.image_manager = ImageManager(self)
+        self.image_filter_bar = ImageFilterBar(self)
         self.model_controls = ModelControls(self)
         self.prompt_dialog = PromptDialog(self)
         self.search_replace_dialog = SearchReplaceDialog(self)
+        self.performance_panel = PerformancePanel(self)
+        self.duplicates_dialog = DuplicatesDialog(self)
+        self.stats_dialog = StatsDialog(self)
+        self.export_dialog = ExportDialog(self)
+        self.cleanup_dialog = CleanupDialog(self)
+        self.cost_dialog = CostDialog(self)
+        self.review_mode = ReviewMode(self)
         
         # Setup UI
         self.setup_ui()
@@ -78,6 +99,15 @@ class Captioner:
         self.root.title("Yofardev Captioner")
         self.center_window()
         self.root.resizable(False, False)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        """Write any pending caption and session change before quitting."""
+        self.review_mode.stop()
+        if self.caption_store is not None:
+            self.caption_store.flush()
+        flush_session()
+        self.root.destroy()
 
     def setup_frames(self):
         """Setup the main frames."""
@@ -122,6 +152,7 @@ class Captioner:
         """Bind keyboard shortcuts and events."""
         self.image_manager.image_list.bind("<<ListboxSelect>>", self.image_manager.display_image)
         self.root.bind("<Control-s>", self.caption_editor.save_caption)
+        self.root.bind("<F2>", self.review_mode.toggle)
         self.caption_editor.text_entry.bind("<Control-z>", self.caption_editor.undo_text)
         self.caption_editor.text_entry.bind("<Control-y>", self.caption_editor.redo_text)
     
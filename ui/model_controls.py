@@ -1,9 +1,14 @@
 import os
 import subprocess
+import time
 import tkinter as tk
 import threading
 import queue
 
+from src.services.cancellation import abandoned_calls
+from src.services.caption_packing import PACK_SIZES
+from src.services.caption_router import CaptionRoute
+from src.services.job_journal import JobJournal, format_eta
 from src.services.vision_service import on_run_pressed
 
 
@@ -14,16 +19,25 @@ class ModelControls:
         self.captioner = captioner
         self.caption_mode = tk.StringVar(value="single")
         self.selected_model = tk.StringVar(value="Gemini 2.5 Flash")
+        self.fallback_model = tk.StringVar(value="None")
+        self.race_models = tk.BooleanVar(value=False)
+        self.hedge_requests = tk.BooleanVar(value=False)
+        self.pack_size = tk.IntVar(value=1)
         self.gpt_last_used = None
         self.control_frame = None
         self.top_row_frame = None
         self.bottom_row_frame = None
         self.model_dropdown = None
+        self.fallback_dropdown = None
         self.llm_queue = queue.Queue()
         self.llm_thread = None
         self.stop_llm_generation = threading.Event()
         self.run_button = None # Added to disable during LLM generation
+        self.stop_button = None
+        self.stop_requested_at = None # When Stop was pressed, to measure stop-to-idle latency
+        self.pending_start = None # Run waiting for cancelled requests to finish
         self.progress_label = None # Added for LLM progress
+        self.failed_images = [] # Images that permanently failed during the last batch run
 
     def setup_control_frame(self):
         """Setup the main control frame with two rows."""
@@ -58,8 +72,52 @@ class ModelControls:
                 side="left", padx=5
             )
 
+        self.setup_tools_menu()
         self.setup_prompt_entry()
 
+    def setup_tools_menu(self):
+        """Setup the menu grouping the dataset tools."""
+        tools_button = tk.Menubutton(self.top_row_frame, text="Tools ▾", relief="raised")
+        tools_menu = tk.Menu(tools_button, tearoff=0)
+        tools_menu.add_command(
+            label="Dataset statistics", command=self.captioner.stats_dialog.open_stats_window
+        )
+        tools_menu.add_command(
+            label="Near-duplicates", command=self.captioner.duplicates_dialog.open_duplicates_window
+        )
+        tools_menu.add_command(
+            label="Performance", command=self.captioner.performance_panel.open_performance_window
+        )
+        tools_menu.add_command(
+            label="Cost estimate", command=self.captioner.cost_dialog.open_cost_window
+        )
+        tools_menu.add_command(
+            label="Caption cleanup...", command=self.captioner.cleanup_dialog.open_cleanup_window
+        )
+        tools_menu.add_checkbutton(
+            label="Review mode (F2)",
+            variable=self.captioner.review_mode.review_var,
+            command=self.captioner.review_mode.toggle,
+        )
+        tools_menu.add_separator()
+        tools_menu.add_command(
+            label="Export captions...", command=self.captioner.export_dialog.export_dataset
+        )
+        tools_menu.add_command(
+            label="Import captions...", command=self.captioner.export_dialog.import_dataset
+        )
+        tools_menu.add_command(
+            label="Keep captions in a dataset file...", command=self.captioner.export_dialog.open_caption_store
+        )
+        tools_menu.add_command(
+            label="Keep captions in .txt files", command=self.captioner.export_dialog.close_caption_store
+        )
+        tools_menu.add_command(
+            label="Write tar shards...", command=self.captioner.export_dialog.write_tar_shards
+        )
+        tools_button.config(menu=tools_menu)
+        tools_button.pack(side="left", padx=5)
+
     def setup_prompt_entry(self):
         """Setup the prompt editing button."""
         tk.Button(
@@ -85,11 +143,43 @@ class ModelControls:
         )
         self.model_dropdown.pack(side="left", padx=5)
 
+        # Stronger model used when the first one returns an empty, short or refused caption
+        tk.Label(self.bottom_row_frame, text="Fallback:").pack(side="left", padx=5)
+        self.fallback_dropdown = tk.OptionMenu(
+            self.bottom_row_frame, self.fallback_model, "None", *models
+        )
+        self.fallback_dropdown.pack(side="left", padx=5)
+        tk.Checkbutton(
+            self.bottom_row_frame,
+            text="Race",
+            variable=self.race_models,
+        ).pack(side="left", padx=5)
+        # Duplicate requests running past the model's p90 latency
+        tk.Checkbutton(
+            self.bottom_row_frame,
+            text="Hedge",
+            variable=self.hedge_requests,
+        ).pack(side="left", padx=5)
+        # Batch runs send this many images per request to the models that accept several
+        tk.Label(self.bottom_row_frame, text="Images/request:").pack(side="left", padx=5)
+        tk.OptionMenu(self.bottom_row_frame, self.pack_size, *PACK_SIZES).pack(side="left", padx=5)
+
+    def get_route(self):
+        """Build the caption route from the model and fallback selections."""
+        models = [self.selected_model.get()]
+        if self.fallback_model.get() != "None":
+            models.append(self.fallback_model.get())
+        return CaptionRoute(models, race=self.race_models.get(), hedge=self.hedge_requests.get())
+
     def setup_second_row(self):
         """Setup the second row of controls (model selection and run)."""
         self.setup_model_dropdown()
         self.run_button = tk.Button(self.bottom_row_frame, text="Run", command=self.run_model)
         self.run_button.pack(side="left", padx=5)
+        self.stop_button = tk.Button(
+            self.bottom_row_frame, text="Stop", command=self.stop_model, state=tk.DISABLED
+        )
+        self.stop_button.pack(side="left", padx=5)
         tk.Radiobutton(
             self.bottom_row_frame,
             text="For this image",
@@ -102,6 +192,12 @@ class ModelControls:
             variable=self.caption_mode,
             value="all",
         ).pack(side="left", padx=5)
+        tk.Radiobutton(
+            self.bottom_row_frame,
+            text="Retry failed",
+            variable=self.caption_mode,
+            value="failed",
+        ).pack(side="left", padx=5)
         self.progress_label = tk.Label(self.bottom_row_frame, text="", font=("Arial", 10), fg="green")
         self.progress_label.pack(side="left", padx=5)
         self.captioner.root.after(100, self._process_llm_queue)
@@ -121,13 +217,21 @@ class ModelControls:
     def run_model(self):
         """Execute the selected AI model for captioning in a background thread."""
         self.run_button.config(state=tk.DISABLED) # Disable button during processing
-        self.progress_label.config(text="Generating caption...")
-        self.stop_llm_generation.set() # Signal any existing thread to stop
-        if self.llm_thread and self.llm_thread.is_alive():
-            self.llm_thread.join() # Wait for the thread to finish
-
+        self.stop_button.config(state=tk.NORMAL)
+        # Requests cancelled by a stop cannot be interrupted, starting now would stack new ones on top
+        pending = abandoned_calls()
+        if pending:
+            self.progress_label.config(text=f"Waiting for {pending} cancelled request(s) to finish...", fg="green")
+            self.pending_start = self.captioner.root.after(500, self.run_model)
+            return
+        self.pending_start = None
+        self.progress_label.config(text="Generating caption...", fg="green")
+        # Any previous thread winds down on its own: it keeps its own queue and
+        # stop event, so nothing here waits for it and the UI never blocks
+        self.stop_llm_generation.set()
         self.llm_queue = queue.Queue()
-        self.stop_llm_generation.clear() # Reset the stop event
+        self.stop_llm_generation = threading.Event()
+        self.stop_requested_at = None
 
         model = self.selected_model.get()
         caption_mode = self.caption_mode.get()
@@ -135,13 +239,38 @@ class ModelControls:
         if caption_mode == "single":
             file_paths = [self.captioner.current_image_path]
             index = 0
+        elif caption_mode == "failed":
+            if not self.failed_images and self.captioner.current_folder:
+                # Failures of a run from a previous session are kept in the journal
+                self.failed_images = JobJournal(self.captioner.current_folder).failed_paths()
+            file_paths = list(self.failed_images)
+            if self.captioner.current_image_path in file_paths:
+                index = file_paths.index(self.captioner.current_image_path)
+            else:
+                index = -1
+            self.failed_images = []
         else:
             file_paths = list(self.captioner.file_map.values())
-            index = self.captioner.index
+            # captioner.index is a row of the filtered, sorted list, not a position in file_map
+            if self.captioner.current_image_path in file_paths:
+                index = file_paths.index(self.captioner.current_image_path)
+            else:
+                index = -1
+            self.failed_images = []
 
         self.llm_thread = threading.Thread(
             target=self._generate_captions_in_background,
-            args=(caption_mode, model, file_paths, index, self.captioner.prompt_dialog.prompt_text)
+            args=(
+                caption_mode,
+                model,
+                file_paths,
+                index,
+                self.captioner.prompt_dialog.prompt_text,
+                self.get_route(),
+                self.pack_size.get(),
+                self.llm_queue,
+                self.stop_llm_generation,
+            )
         )
         self.llm_thread.daemon = True
         self.llm_thread.start()
@@ -149,7 +278,9 @@ class ModelControls:
         # Schedule queue processing to start
         self.captioner.root.after(100, self._process_llm_queue)
 
-    def _generate_captions_in_background(self, caption_mode, model, file_paths, index, prompt):
+    def _generate_captions_in_background(
+        self, caption_mode, model, file_paths, index, prompt, route, pack_size, llm_queue, stop_event
+    ):
         """Generate captions in a background thread."""
         caption = on_run_pressed(
             self.captioner,
@@ -158,10 +289,38 @@ class ModelControls:
             file_paths,
             index,
             prompt,
-            self.llm_queue, # Pass the queue to the service
-            self.stop_llm_generation # Pass the stop event
+            llm_queue, # Pass the queue to the service
+            stop_event, # Pass the stop event
+            route,
+            pack_size,
         )
-        self.llm_queue.put(("COMPLETED", caption)) # Sentinel value for completion
+        llm_queue.put(("COMPLETED", caption)) # Sentinel value for completion
+
+    def stop_model(self):
+        """Cancel the running generation, in-flight requests included."""
+        if self.pending_start is not None:
+            self.captioner.root.after_cancel(self.pending_start)
+            self.pending_start = None
+            self.run_button.config(state=tk.NORMAL)
+            self.stop_button.config(state=tk.DISABLED)
+            self.progress_label.config(text="Run cancelled.", fg="green")
+            return
+        if not self.llm_thread or not self.llm_thread.is_alive() or self.stop_llm_generation.is_set():
+            return
+        self.stop_requested_at = time.perf_counter()
+        self.stop_llm_generation.set()
+        self.stop_button.config(state=tk.DISABLED)
+        self.progress_label.config(text="Stopping...", fg="green")
+
+    def _report_stop(self):
+        """Show how long the last stop took to bring the generation to idle. Returns False if there was no stop."""
+        if self.stop_requested_at is None:
+            return False
+        latency = time.perf_counter() - self.stop_requested_at
+        self.stop_requested_at = None
+        print(f"Caption generation stopped in {latency:.2f}s.")
+        self.progress_label.config(text=f"Stopped ({latency:.2f}s).", fg="green")
+        return True
 
     def _process_llm_queue(self):
         """Process LLM results from the queue and update the UI."""
@@ -173,22 +332,52 @@ class ModelControls:
                     final_caption = data
                     self.captioner.caption_editor.set_caption_text(final_caption)
                     self.run_button.config(state=tk.NORMAL) # Re-enable button
-                    self.progress_label.config(text="Caption generation complete.")
+                    self.stop_button.config(state=tk.DISABLED)
+                    if self._report_stop():
+                        pass
+                    elif self.failed_images:
+                        self.progress_label.config(
+                            text=f"Caption generation complete. {len(self.failed_images)} failed, use 'Retry failed'.",
+                            fg="red",
+                        )
+                    else:
+                        self.progress_label.config(text="Caption generation complete.", fg="green")
                     print("LLM caption generation complete.")
                     generation_complete = True
                 elif message_type == "PROGRESS":
-                    current, total = data
-                    self.progress_label.config(text=f"Generating caption... {current}/{total}")
+                    current, total, stats = data
+                    text = f"Generating caption... {current}/{total}"
+                    if stats["throughput"] > 0:
+                        text += f" ({stats['throughput'] * 60:.1f}/min, ETA {format_eta(stats['eta'])})"
+                    self.progress_label.config(text=text, fg="green")
+                elif message_type == "PARTIAL_CAPTION":
+                    file_path, text = data
+                    if self.captioner.current_image_path == file_path:
+                        if text is None:
+                            self.captioner.caption_editor.clear_caption()
+                        else:
+                            self.captioner.caption_editor.append_caption_text(text)
                 elif message_type == "UPDATE_CAPTION":
                     file_path, caption_text = data
+                    if self.captioner.caption_store is not None:
+                        # Batch runs write .txt files, the dataset file holding the captions gets them too
+                        self.captioner.caption_store.set(file_path, caption_text)
+                    self.captioner.image_manager.refresh_item(file_path)
                     # Update the UI for a specific image if it's currently displayed
                     if self.captioner.current_image_path == file_path:
                         self.captioner.caption_editor.set_caption_text(caption_text)
+                elif message_type == "FAILED":
+                    file_path, reason = data
+                    if file_path not in self.failed_images:
+                        self.failed_images.append(file_path)
+                    print(f"Caption failed for {os.path.basename(file_path)}: {reason}")
                 elif message_type == "ERROR":
                     error_message = data
-                    self.progress_label.config(text=f"Error: {error_message}", fg="red")
                     self.run_button.config(state=tk.NORMAL)
-                    print(f"LLM generation error: {error_message}")
+                    self.stop_button.config(state=tk.DISABLED)
+                    if not self._report_stop():
+                        self.progress_label.config(text=f"Error: {error_message}", fg="red")
+                        print(f"LLM generation error: {error_message}")
                     generation_complete = True
 
         except queue.Empty:
@@ -201,7 +390,9 @@ class ModelControls:
         elif self.llm_thread and not self.llm_thread.is_alive() and self.llm_queue.empty():
             print("Thread finished and queue empty - cleaning up.")
             self.run_button.config(state=tk.NORMAL)
-            self.progress_label.config(text="")
+            self.stop_button.config(state=tk.DISABLED)
+            if not self._report_stop():
+                self.progress_label.config(text="")
         else:
             # Continue processing if thread is alive or queue has items
             self.captioner.root.after(100, self._process_llm_queue) # Schedule next check
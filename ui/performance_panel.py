@@ -0,0 +1,95 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from src.services.metrics import STAGES, metrics_recorder
+
+
+class PerformancePanel:
+    """Small window showing live throughput and latency per stage and per model."""
+
+    REFRESH_MS = 1000
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.performance_window = None
+        self.summary_text = None
+
+    def open_performance_window(self):
+        """Open the performance panel."""
+        if self.performance_window is not None and self.performance_window.winfo_exists():
+            self.performance_window.focus()
+            return
+
+        self.performance_window = tk.Toplevel(self.captioner.root)
+        self.performance_window.title("Performance")
+        self.performance_window.geometry("640x420")
+
+        button_frame = tk.Frame(self.performance_window)
+        button_frame.pack(pady=10, side="top", fill="x")
+
+        tk.Button(button_frame, text="Export CSV", command=self.export_csv).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Export JSONL", command=self.export_jsonl).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Clear", command=self.clear).pack(side="left", padx=5)
+        tk.Button(
+            button_frame, text="Close", command=self.performance_window.destroy
+        ).pack(side="right", padx=5)
+
+        self.summary_text = tk.Text(self.performance_window, wrap="none", font=("Courier", 11))
+        self.summary_text.pack(expand=True, fill="both", padx=10, pady=10)
+
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the summary, then schedule the next refresh while the window is open."""
+        if self.performance_window is None or not self.performance_window.winfo_exists():
+            return
+        summary = metrics_recorder.summary()
+        lines = [
+            f"Images timed: {summary['count']}",
+            f"Throughput (last minute): {summary['throughput']:.1f} images/min",
+            "",
+            f"{'Stage':<10}{'p50 (s)':>10}{'p95 (s)':>10}",
+        ]
+        for name in STAGES:
+            p50, p95 = summary["stages"][name]
+            lines.append(f"{name:<10}{_format_seconds(p50):>10}{_format_seconds(p95):>10}")
+        lines += [
+            "",
+            f"{'Model':<20}{'n':>5}{'total p50':>11}{'p95':>8}{'network p50':>13}{'p95':>8}{'req':>6}{'failed':>8}",
+        ]
+        for model, stats in summary["models"].items():
+            lines.append(
+                f"{model:<20}{stats['count']:>5}"
+                f"{_format_seconds(stats['total'][0]):>11}{_format_seconds(stats['total'][1]):>8}"
+                f"{_format_seconds(stats['network'][0]):>13}{_format_seconds(stats['network'][1]):>8}"
+                f"{stats['attempts']:>6}{stats['failed_attempts']:>8}"
+            )
+
+        self.summary_text.config(state="normal")
+        self.summary_text.delete(1.0, "end")
+        self.summary_text.insert(1.0, "\n".join(lines))
+        self.summary_text.config(state="disabled")
+        self.performance_window.after(self.REFRESH_MS, self.refresh)
+
+    def export_csv(self):
+        file_path = filedialog.asksaveasfilename(
+            parent=self.performance_window, defaultextension=".csv", filetypes=[("CSV", "*.csv")]
+        )
+        if file_path:
+            count = metrics_recorder.export_csv(file_path)
+            messagebox.showinfo("Success", f"Exported {count} record(s).", parent=self.performance_window)
+
+    def export_jsonl(self):
+        file_path = filedialog.asksaveasfilename(
+            parent=self.performance_window, defaultextension=".jsonl", filetypes=[("JSON Lines", "*.jsonl")]
+        )
+        if file_path:
+            count = metrics_recorder.export_jsonl(file_path)
+            messagebox.showinfo("Success", f"Exported {count} record(s).", parent=self.performance_window)
+
+    def clear(self):
+        metrics_recorder.clear() # Picked up by the next refresh
+
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value:.2f}"
@@ -1,5 +1,7 @@
 import tkinter as tk
+from tkinter import messagebox
 
+from src.services.prompt_template import TEMPLATE_VARIABLES, compile_template
 from src.services.session_file import save_session
 
 
@@ -44,11 +46,30 @@ class PromptDialog:
         )
         default_button.pack(side="left", padx=5)
 
+        def preview_prompt():
+            image_path = self.captioner.current_image_path
+            if not image_path:
+                messagebox.showinfo("Preview", "Select an image to preview its prompt.", parent=self.prompt_window)
+                return
+            try:
+                rendered = compile_template(prompt_text.get(1.0, "end-1c")).render(image_path)
+            except Exception as e:
+                rendered = f"Error rendering the prompt: {e}"
+            messagebox.showinfo("Preview", rendered, parent=self.prompt_window)
+
+        preview_button = tk.Button(button_frame, text="Preview", command=preview_prompt)
+        preview_button.pack(side="left", padx=5)
+
         close_button = tk.Button(
             button_frame, text="Close", command=self.prompt_window.destroy
         )
         close_button.pack(side="right", padx=5)
 
+        variables = ", ".join("{" + name + "}" for name in TEMPLATE_VARIABLES)
+        tk.Label(
+            self.prompt_window, text=f"Per-image variables: {variables}", font=("Verdana", 9), wraplength=560, justify="left"
+        ).pack(side="bottom", padx=10, pady=(0, 10), anchor="w")
+
         prompt_text = tk.Text(self.prompt_window, wrap="word", font=("Verdana", 14))
         prompt_text.pack(expand=True, fill="both", padx=10, pady=10)
         prompt_text.insert(1.0, self.prompt_text)
@@ -0,0 +1,230 @@
+import queue
+import tkinter as tk
+from tkinter import messagebox
+
+from src.services.review_cache import CaptionWriteQueue, ReviewPreloader
+
+# Images preloaded after and before the reviewed one
+PRELOAD_AHEAD = 4
+PRELOAD_BEHIND = 2
+
+# Longest wait for pending captions to be written when leaving review mode
+FLUSH_TIMEOUT = 10
+
+REVIEW_KEYS = {
+    "<Next>": "next_image",
+    "<Prior>": "previous_image",
+    "<Control-Return>": "accept",
+    "<Control-BackSpace>": "reject",
+    "<Escape>": "stop",
+}
+HELP_TEXT = "PgDn next · PgUp previous · Ctrl+Enter accept · Ctrl+Backspace reject · Esc exit"
+
+
+class ReviewMode:
+    """Keyboard-driven review of the captions, one image after the other.
+
+    While active, images are shown from a preload cache filled in the background
+    with the neighbours of the reviewed image, and edited captions go through a
+    write-behind queue, so moving to the next image never waits on a decode or
+    a file write. Rejected images are added to the failed ones, for "Retry failed".
+    """
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.active = False
+        self.review_var = tk.BooleanVar(value=False)
+        self.preloader = None
+        self.write_queue = None
+        self.error_queue = queue.Queue()
+        self.status_label = None
+        self.shown_path = None
+        self.shown_caption = ""
+        self.accepted = 0
+        self.rejected = 0
+
+    def toggle(self, event=None):
+        """Enter or leave review mode (Tools menu and F2)."""
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+        return "break"
+
+    def start(self):
+        if not self.captioner.image_manager.image_list.size():
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            self.review_var.set(False)
+            return
+        if self.preloader is None:
+            self.preloader = ReviewPreloader(self.captioner.root.winfo_screenwidth())
+            self.write_queue = CaptionWriteQueue(
+                on_error=lambda image_path, error: self.error_queue.put((image_path, str(error)))
+            )
+        self.captioner.caption_editor.save_caption()
+        self.active = True
+        self.review_var.set(True)
+        self.accepted = self.rejected = 0
+        self.shown_path = None
+        for sequence, method in REVIEW_KEYS.items():
+            handler = getattr(self, method)
+            # The caption box has its own Page Up/Down bindings, these take over while reviewing
+            self.captioner.root.bind(sequence, lambda e, handler=handler: handler() or "break")
+            self.captioner.caption_editor.text_entry.bind(sequence, lambda e, handler=handler: handler() or "break")
+        if self.status_label is None:
+            self.status_label = tk.Label(self.captioner.root, text="", font=("Arial", 10), fg="blue")
+        self.status_label.place(relx=0.5, rely=0.0, y=10, anchor="n")
+        self.display_selected()
+        self._poll()
+
+    def stop(self):
+        """Leave review mode once the pending captions are written."""
+        if not self.active:
+            return
+        self.queue_shown_caption()
+        self.active = False
+        self.review_var.set(False)
+        for sequence in REVIEW_KEYS:
+            self.captioner.root.unbind(sequence)
+            self.captioner.caption_editor.text_entry.unbind(sequence)
+        if self.status_label is not None:
+            self.status_label.place_forget()
+        self.flush()
+        self.preloader.clear()
+        self.shown_path = None
+
+    def reset(self):
+        """Forget the preloaded images when another folder is loaded, pending captions are written first."""
+        if self.preloader is None:
+            return
+        if self.active:
+            self.queue_shown_caption()
+            self.shown_path = None
+        self.flush()
+        self.preloader.clear()
+
+    def flush(self):
+        """Write every pending caption now, e.g. before tools read the caption files."""
+        if self.write_queue is not None and not self.write_queue.flush(FLUSH_TIMEOUT):
+            messagebox.showwarning("Warning", "Some captions are still being written.")
+
+    def queue_shown_caption(self):
+        """Queue the caption of the reviewed image for writing if it was edited."""
+        image_path = self.shown_path
+        if image_path is None:
+            return
+        caption = self.captioner.caption_editor.get_caption_text()
+        if caption == "" or caption == self.shown_caption.strip():
+            return
+        if self.captioner.caption_store is not None:
+            self.captioner.caption_store.set(image_path, caption) # Kept in memory, the file is written later
+        else:
+            self.write_queue.put(image_path, caption)
+        self.preloader.set_caption(image_path, caption)
+        self.shown_caption = caption
+        caption_length = len(caption.encode("utf-8"))
+        item = self.captioner.image_manager.find_item(image_path)
+        if item is None:
+            return
+        if item is not self.captioner.image_manager.image_list.selected_item:
+            self.captioner.image_manager.check_and_color_item(item, image_path, caption_length)
+        else:
+            self.captioner.image_filter_bar.caption_changed(image_path, caption_length)
+
+    def display_selected(self):
+        """Show the selected image from the preload cache, and preload its neighbours."""
+        self.queue_shown_caption()
+        image_list = self.captioner.image_manager.image_list
+        selection = image_list.curselection()
+        if not selection:
+            return
+        index = selection[0]
+        item = image_list.items[index]
+        self.captioner.index = index
+        self.captioner.current_image = item.name
+        self.captioner.current_image_path = item.image_path
+        try:
+            entry = self.preloader.get(item.image_path)
+        except Exception as e:
+            print(f"Error loading image: {e}")
+            messagebox.showinfo("Error", f"There was an error loading the image: {e}")
+            self.shown_path = None
+            return
+        self.captioner.image_manager.show_display_entry(entry)
+
+        if self.captioner.caption_store is not None:
+            caption = self.captioner.caption_store.get(item.image_path)
+        else:
+            caption = self.write_queue.pending(item.image_path)
+            if caption is None:
+                caption = entry["caption"]
+        self.captioner.caption_editor.set_caption_text(caption)
+        self.shown_path, self.shown_caption = item.image_path, caption
+        self.captioner.image_manager.prioritize_neighbours(index)
+        self.captioner.root.title(f"Yofardev Captioner - {item.image_path}")
+
+        order = []
+        for distance in range(1, max(PRELOAD_AHEAD, PRELOAD_BEHIND) + 1):
+            if distance <= PRELOAD_AHEAD:
+                order.append(index + distance)
+            if distance <= PRELOAD_BEHIND:
+                order.append(index - distance)
+        items = image_list.items
+        self.preloader.request([items[i].image_path for i in order if 0 <= i < len(items)])
+        self._show_status()
+
+    def step(self, delta):
+        """Select the image delta rows away, returns False at either end of the list."""
+        image_list = self.captioner.image_manager.image_list
+        selection = image_list.curselection()
+        index = (selection[0] if selection else self.captioner.index) + delta
+        if not 0 <= index < image_list.size():
+            self.queue_shown_caption()
+            self._show_status("End of the list")
+            return False
+        image_list.select_set(index) # Selecting runs display_selected through <<ListboxSelect>>
+        image_list.see(index)
+        return True
+
+    def next_image(self):
+        self.step(1)
+
+    def previous_image(self):
+        self.step(-1)
+
+    def accept(self):
+        """Keep the caption (with any edit) and move on."""
+        self.accepted += 1
+        self.step(1)
+
+    def reject(self):
+        """Mark the image for re-captioning with "Retry failed" and move on."""
+        failed_images = self.captioner.model_controls.failed_images
+        if self.shown_path is not None and self.shown_path not in failed_images:
+            failed_images.append(self.shown_path)
+            self.rejected += 1
+        self.step(1)
+
+    def _show_status(self, message=None):
+        status = f"Review: {self.accepted} accepted, {self.rejected} rejected"
+        if len(self.write_queue):
+            status += f", {len(self.write_queue)} saving"
+        self.status_label.config(text=f"{message or status}  |  {HELP_TEXT}")
+
+    def _poll(self):
+        """Report write errors and refresh the status while review mode is on."""
+        if not self.active:
+            return
+        errors = []
+        try:
+            while True:
+                errors.append(self.error_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if errors:
+            image_path, error = errors[0]
+            messagebox.showerror(
+                "Error", f"{len(errors)} caption(s) could not be saved, e.g. {image_path}: {error}"
+            )
+        self._show_status()
+        self.captioner.root.after(500, self._poll)
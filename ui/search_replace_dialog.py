@@ -1,8 +1,12 @@
 import os
+import queue
 import re
+import threading
 import tkinter as tk
 from tkinter import messagebox
 
+from src.services.caption_search import get_caption_index
+
 
 class SearchReplaceDialog:
     """Handles search and replace functionality in caption files."""
@@ -10,6 +14,11 @@ class SearchReplaceDialog:
     def __init__(self, captioner):
         self.captioner = captioner
         self.search_replace_window = None
+        self.preview_text = None
+        self.status_label = None
+        self.index_queue = queue.Queue()
+        self.index_thread = None
+        self.pending_search = None # Search asked for while the index was busy
     
     def get_caption_files(self):
         """Get all caption txt files associated with loaded images."""
@@ -170,6 +179,90 @@ class SearchReplaceDialog:
                 messagebox.showinfo("Info", "No changes were made (no matches found).")
             return False
 
+    def start_similarity_search(self, query=None, image_path=None, related=False):
+        """
+        Bring the caption index up to date in the background, then search it for
+        captions close to a text or to the caption of an image. Without a query
+        the index is only built.
+        """
+        if self.index_thread and self.index_thread.is_alive():
+            if query is not None or image_path is not None:
+                self.pending_search = (query, image_path, related)
+            return
+        index = get_caption_index(self.captioner.current_folder)
+        image_paths = list(self.captioner.file_map.values())
+        self.index_queue = queue.Queue()
+
+        def run():
+            try:
+                index.update(
+                    image_paths,
+                    progress=lambda done, total: self.index_queue.put(("PROGRESS", (done, total))),
+                )
+                if image_path is not None:
+                    results = index.similar_to(image_path)
+                elif query is not None:
+                    results = index.search(query, related=related)
+                else:
+                    results = None
+                self.index_queue.put(("COMPLETED", results))
+            except Exception as e:
+                self.index_queue.put(("ERROR", str(e)))
+
+        self.index_thread = threading.Thread(target=run, daemon=True)
+        self.index_thread.start()
+        self.captioner.root.after(100, self._process_index_queue)
+
+    def _process_index_queue(self):
+        """Process index progress and search results from the queue."""
+        try:
+            while True:
+                message_type, data = self.index_queue.get_nowait()
+                if message_type == "PROGRESS":
+                    self._set_status(f"Indexing captions... {data[0]}/{data[1]}")
+                elif message_type == "COMPLETED":
+                    if data is not None:
+                        self.show_similar(data)
+                    if self.pending_search is not None:
+                        query, image_path, related = self.pending_search
+                        self.pending_search = None
+                        self.start_similarity_search(query, image_path, related)
+                    elif data is None:
+                        self._set_status("")
+                    return
+                elif message_type == "ERROR":
+                    self._set_status(f"Error searching captions: {data}")
+                    return
+        except queue.Empty:
+            pass
+        self.captioner.root.after(100, self._process_index_queue)
+
+    def _set_status(self, text):
+        if self.search_replace_window is not None and self.search_replace_window.winfo_exists():
+            self.status_label.config(text=text)
+
+    def show_similar(self, results):
+        """List similar captions in the preview, clicking a file name displays its image."""
+        if self.preview_text is None or not self.preview_text.winfo_exists():
+            return
+        self._set_status("")
+        preview_widget = self.preview_text
+        preview_widget.delete(1.0, "end")
+        if not results:
+            preview_widget.insert("end", "No similar caption found.\n")
+            return
+        for i, (image_path, score) in enumerate(results):
+            tag = f"result{i}"
+            preview_widget.insert("end", f"\n{os.path.basename(image_path)}", ("filename", tag))
+            preview_widget.insert("end", f"  {score:.2f}\n", "line_num")
+            preview_widget.insert("end", f"  {load_caption_preview(image_path)}\n", "preview")
+            preview_widget.tag_bind(
+                tag, "<Button-1>", lambda e, path=image_path: self.captioner.image_manager.select_image(path)
+            )
+        preview_widget.tag_config("filename", foreground="blue", font=("Verdana", 12, "bold"))
+        preview_widget.tag_config("line_num", foreground="green")
+        preview_widget.tag_config("preview", foreground="black")
+
     def open_search_replace_window(self):
         """Open the search and replace dialog window."""
         if not self.captioner.current_folder:
@@ -227,6 +320,7 @@ class SearchReplaceDialog:
         preview_text = tk.Text(
             preview_frame, wrap="word", font=("Verdana", 9), height=15
         )
+        self.preview_text = preview_text
         preview_scrollbar = tk.Scrollbar(preview_frame, command=preview_text.yview)
         preview_text.config(yscrollcommand=preview_scrollbar.set)
         preview_scrollbar.pack(side="right", fill="y")
@@ -257,6 +351,22 @@ class SearchReplaceDialog:
                     # Refresh preview after replacement
                     on_preview()
 
+        def on_similar_to_text():
+            search_text = search_entry.get()
+            if not search_text.strip():
+                messagebox.showwarning("Warning", "Please enter text to search for.")
+                return
+            self._set_status("Searching similar captions...")
+            self.start_similarity_search(query=search_text, related=related_var.get())
+
+        def on_similar_to_current():
+            if not self.captioner.current_image_path:
+                messagebox.showwarning("Warning", "Please select an image first.")
+                return
+            self.captioner.caption_editor.save_caption()
+            self._set_status("Searching similar captions...")
+            self.start_similarity_search(image_path=self.captioner.current_image_path)
+
         preview_button = tk.Button(
             button_frame, text="Preview", command=on_preview, font=("Verdana", 10)
         )
@@ -278,8 +388,35 @@ class SearchReplaceDialog:
         )
         close_button.pack(side="right", padx=5)
 
+        # Similarity search, on an index of the captions built in the background
+        similar_frame = tk.Frame(self.search_replace_window)
+        similar_frame.pack(pady=(0, 10), fill="x")
+        tk.Button(
+            similar_frame, text="Similar to search text", command=on_similar_to_text, font=("Verdana", 10)
+        ).pack(side="left", padx=5)
+        tk.Button(
+            similar_frame, text="Similar to current caption", command=on_similar_to_current, font=("Verdana", 10)
+        ).pack(side="left", padx=5)
+        related_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            similar_frame, text="Include related words", variable=related_var, font=("Verdana", 10)
+        ).pack(side="left", padx=5)
+        self.status_label = tk.Label(similar_frame, text="", font=("Verdana", 9), fg="green")
+        self.status_label.pack(side="left", padx=5)
+
         # Initial message
         preview_text.insert(
             "end",
             "Enter search text and click 'Preview' to see what will be changed.\n",
-        )
\ No newline at end of file
+        )
+        self.start_similarity_search()
+
+
+def load_caption_preview(image_path, max_length=200):
+    """First characters of a caption, for result lists."""
+    try:
+        with open(os.path.splitext(image_path)[0] + ".txt", "r", encoding="utf-8") as f:
+            caption = f.read(max_length + 1).strip()
+    except (OSError, UnicodeDecodeError):
+        return ""
+    return caption if len(caption) <= max_length else caption[:max_length] + "..."
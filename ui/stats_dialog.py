@@ -0,0 +1,131 @@
+import queue
+import threading
+import tkinter as tk
+from tkinter import messagebox
+
+from src.services.dataset_stats import (
+    ASPECT_RATIO_BINS,
+    CAPTION_WORD_BINS,
+    SHORT_SIDE_BINS,
+    get_dataset_stats,
+)
+
+BAR_WIDTH = 40
+
+
+class StatsDialog:
+    """Shows dataset-wide statistics on image sizes and captions."""
+
+    def __init__(self, captioner):
+        self.captioner = captioner
+        self.stats_window = None
+        self.stats_text = None
+        self.stats_queue = queue.Queue()
+        self.stats_thread = None
+
+    def open_stats_window(self):
+        """Open the statistics window and refresh the statistics in the background."""
+        if not self.captioner.current_folder or not self.captioner.file_map:
+            messagebox.showwarning("Warning", "Please open a folder first.")
+            return
+
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            self.stats_window = tk.Toplevel(self.captioner.root)
+            self.stats_window.title("Dataset Statistics")
+            self.stats_window.geometry("700x600")
+
+            button_frame = tk.Frame(self.stats_window)
+            button_frame.pack(pady=10, side="top", fill="x")
+            tk.Button(button_frame, text="Refresh", command=self.start_update).pack(side="left", padx=5)
+            tk.Button(
+                button_frame, text="Close", command=self.stats_window.destroy
+            ).pack(side="right", padx=5)
+
+            self.stats_text = tk.Text(self.stats_window, wrap="none", font=("Courier", 11))
+            scrollbar = tk.Scrollbar(self.stats_window, command=self.stats_text.yview)
+            self.stats_text.config(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side="right", fill="y")
+            self.stats_text.pack(side="left", expand=True, fill="both", padx=10, pady=10)
+        else:
+            self.stats_window.focus()
+
+        self.start_update()
+
+    def start_update(self):
+        """Update the statistics in a background thread."""
+        if self.stats_thread and self.stats_thread.is_alive():
+            return
+        engine = get_dataset_stats(self.captioner.current_folder)
+        image_paths = list(self.captioner.file_map.values())
+        self.stats_queue = queue.Queue()
+        self._show_text("Computing statistics...")
+
+        def update():
+            try:
+                summary = engine.update(
+                    image_paths,
+                    progress=lambda done, total: self.stats_queue.put(("PROGRESS", (done, total))),
+                )
+                self.stats_queue.put(("COMPLETED", summary))
+            except Exception as e:
+                self.stats_queue.put(("ERROR", str(e)))
+
+        self.stats_thread = threading.Thread(target=update, daemon=True)
+        self.stats_thread.start()
+        self.captioner.root.after(100, self._process_stats_queue)
+
+    def _process_stats_queue(self):
+        """Process statistics results from the queue and update the window."""
+        try:
+            while True:
+                message_type, data = self.stats_queue.get_nowait()
+                if message_type == "PROGRESS":
+                    done, total = data
+                    self._show_text(f"Computing statistics... {done}/{total}")
+                elif message_type == "COMPLETED":
+                    self._show_text(format_summary(data))
+                    return
+                elif message_type == "ERROR":
+                    self._show_text(f"Error computing statistics: {data}")
+                    return
+        except queue.Empty:
+            pass
+        self.captioner.root.after(100, self._process_stats_queue)
+
+    def _show_text(self, text):
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            return
+        self.stats_text.config(state="normal")
+        self.stats_text.delete(1.0, "end")
+        self.stats_text.insert(1.0, text)
+        self.stats_text.config(state="disabled")
+
+
+def format_histogram(title, bins, counts, unit=""):
+    """Render a histogram as text bars."""
+    lines = [title]
+    peak = max(counts) if counts and max(counts) > 0 else 1
+    for i, count in enumerate(counts):
+        upper = f"{bins[i + 1]}{unit}" if i + 1 < len(bins) else "+"
+        label = f"{bins[i]}{unit} - {upper}" if upper != "+" else f">= {bins[i]}{unit}"
+        lines.append(f"  {label:<18}{count:>7}  {'#' * round(BAR_WIDTH * count / peak)}")
+    return lines
+
+
+def format_summary(summary):
+    """Render the statistics summary as text."""
+    lines = [
+        f"Images: {summary['images']}",
+        f"Empty captions: {summary['empty_captions']}",
+        f"Caption words: mean {summary['mean_words']:.1f}, median {summary['median_words']}",
+        "",
+    ]
+    lines += format_histogram("Short side (px)", SHORT_SIDE_BINS, summary["short_side_histogram"])
+    lines.append("")
+    lines += format_histogram("Aspect ratio (w/h)", ASPECT_RATIO_BINS, summary["aspect_ratio_histogram"])
+    lines.append("")
+    lines += format_histogram("Caption length (words)", CAPTION_WORD_BINS, summary["caption_word_histogram"])
+    lines += ["", "Most frequent words"]
+    for token, count in summary["top_tokens"]:
+        lines.append(f"  {token:<24}{count:>7}")
+    return "\n".join(lines)